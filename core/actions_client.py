@@ -1,8 +1,9 @@
 # core/actions_client.py
 import os
-import httpx
 from typing import Any, Dict, Optional
 
+from core.http_pool import http_clients
+
 ACTIONS_BASE = os.environ.get("ACTIONS_BASE_URL", "https://YOUR-TAILSCALE-HOST:8000")
 PRIMARY_DEVICE_ID = os.environ.get("JARVIS_PRIMARY_DEVICE_ID", "mi13pro")
 TIMEOUT = float(os.environ.get("ACTIONS_TIMEOUT", "12"))
@@ -11,15 +12,16 @@ VERIFY = os.environ.get("ACTIONS_SSL_VERIFY", "true").lower() != "false"
 def _url(p: str) -> str:
     return f"{ACTIONS_BASE.rstrip('/')}{p}"
 
+def _client():
+    return http_clients.get(ACTIONS_BASE, verify=VERIFY, timeout=TIMEOUT)
+
 async def _get(path: str, params: Optional[Dict[str, Any]] = None):
-    async with httpx.AsyncClient(timeout=TIMEOUT, verify=VERIFY) as c:
-        r = await c.get(_url(path), params=params)
-        return r.json()
+    r = await _client().get(_url(path), params=params, timeout=TIMEOUT)
+    return r.json()
 
 async def _post(path: str, json: Optional[Dict[str, Any]] = None):
-    async with httpx.AsyncClient(timeout=TIMEOUT, verify=VERIFY) as c:
-        r = await c.post(_url(path), json=json or {})
-        return r.json()
+    r = await _client().post(_url(path), json=json or {}, timeout=TIMEOUT)
+    return r.json()
 
 # Device
 async def device_battery(device_id: str = PRIMARY_DEVICE_ID):
@@ -68,6 +70,9 @@ async def device_camera_shot(device_id: str):
 async def wx_current(city: str = None, lat: float = None, lon: float = None, units: str = "metric"):
     return await _get("/api/weather/current", {"city": city, "lat": lat, "lon": lon, "units": units})
 
+async def wx_batch(cities, units: str = "metric"):
+    return await _get("/api/weather/batch", {"cities": ",".join(cities), "units": units})
+
 async def wx_hourly(city: str = None, hours: int = 12, units: str = "metric"):
     return await _get("/api/weather/hourly", {"city": city, "hours": hours, "units": units})
 
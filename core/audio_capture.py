@@ -0,0 +1,156 @@
+"""core/audio_capture.py - Cattura continua dal microfono in un ring buffer int16 preallocato (viste NumPy senza copie)"""
+
+import os
+import logging
+import threading
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("JARVIS.AudioCapture")
+
+# Audio trattenuto in memoria: limite alla lunghezza di un comando e al ritardo dei consumatori
+CAPTURE_BUFFER_SECONDS = float(os.environ.get("CAPTURE_BUFFER_SECONDS", "30"))
+# Audio precedente all'inizio del comando (PTT o fine wake word) incluso nella registrazione
+CAPTURE_PREROLL_MS = int(os.environ.get("CAPTURE_PREROLL_MS", "300"))
+
+
+class AudioRing:
+    """
+    Ring buffer int16 a scrittore singolo. Ogni campione è scritto due volte
+    (posizione i e i + capacità), così qualsiasi finestra lunga fino alla
+    capacità è contigua e read() ritorna una vista senza copie. Le posizioni
+    sono assolute (campioni scritti dall'avvio): i consumatori tengono il
+    proprio cursore e attendono i nuovi dati con wait()
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=np.int16)
+        self._written = 0
+        self._cond = threading.Condition()
+
+    @property
+    def position(self) -> int:
+        return self._written
+
+    @property
+    def oldest(self) -> int:
+        return max(0, self._written - self.capacity)
+
+    def write(self, samples: np.ndarray):
+        # Chunk più lungo del buffer: conta solo la coda
+        if len(samples) > self.capacity:
+            self._written += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        count = len(samples)
+        start = self._written % self.capacity
+        first = min(count, self.capacity - start)
+        for offset in (0, self.capacity):
+            self._data[offset + start:offset + start + first] = samples[:first]
+        if first < count:
+            for offset in (0, self.capacity):
+                self._data[offset:offset + count - first] = samples[first:]
+        with self._cond:
+            self._written += count
+            self._cond.notify_all()
+
+    def wait(self, position: int, timeout: Optional[float] = None) -> bool:
+        """Blocca finché il buffer arriva a position; False allo scadere del timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._written >= position, timeout)
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """
+        Vista (read-only, senza copie) sui campioni [start, end). Valida finché lo
+        scrittore non li sovrascrive: chi li conserva a lungo deve copiarli
+        """
+        if end > self._written:
+            raise ValueError(f"Campioni non ancora catturati: {end} > {self._written}")
+        if start < self.oldest or end - start > self.capacity:
+            raise ValueError(f"Campioni già sovrascritti: {start} < {self.oldest}")
+        offset = start % self.capacity
+        view = self._data[offset:offset + end - start]
+        view.flags.writeable = False
+        return view
+
+    def latest(self, count: int) -> np.ndarray:
+        end = self._written
+        return self.read(max(self.oldest, end - count), end)
+
+
+class AudioCapture:
+    """
+    Thread dedicato che legge il microfono (PyAudio, bloccante) e scrive nel
+    ring buffer: la cattura non si ferma mentre wake word, VAD o registrazione
+    del comando elaborano l'audio, e l'audio appena precedente resta
+    disponibile come pre-roll
+    """
+
+    def __init__(self, pa, rate: int = 16000, chunk: int = 2048,
+                 seconds: float = CAPTURE_BUFFER_SECONDS):
+        self.pa = pa
+        self.rate = rate
+        self.chunk = chunk
+        self.ring = AudioRing(int(rate * seconds))
+        self.stream = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.stream = self.pa.open(
+            format=self.pa.get_format_from_width(2),
+            channels=1,
+            rate=self.rate,
+            input=True,
+            frames_per_buffer=self.chunk
+        )
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="audio-capture", daemon=True)
+        self._thread.start()
+        logger.info(f"[CAPTURE] Cattura avviata ({self.rate} Hz, buffer {self.ring.capacity / self.rate:.0f} s)")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                data = self.stream.read(self.chunk, exception_on_overflow=False)
+            except Exception as e:
+                if not self._stopped.is_set():
+                    logger.error(f"[CAPTURE] Errore lettura: {e}")
+                    self._stopped.wait(0.1)
+                continue
+            self.ring.write(np.frombuffer(data, dtype=np.int16))
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+
+    # ============== CONSUMATORI ==============
+
+    @property
+    def position(self) -> int:
+        return self.ring.position
+
+    def preroll_start(self, position: Optional[int] = None, preroll_ms: int = CAPTURE_PREROLL_MS) -> int:
+        """Cursore da cui registrare un comando che inizia a position, pre-roll incluso"""
+        position = self.ring.position if position is None else position
+        return max(self.ring.oldest, position - self.rate * preroll_ms // 1000)
+
+    def next_chunk(self, cursor: int, size: Optional[int] = None, timeout: float = 0.5) -> Optional[np.ndarray]:
+        """
+        Vista sui size campioni da cursor, attendendo che siano catturati;
+        None allo scadere del timeout. Se il consumatore è rimasto indietro oltre
+        la capacità del buffer, il chiamante deve ripartire da ring.oldest
+        """
+        size = size or self.chunk
+        if not self.ring.wait(cursor + size, timeout):
+            return None
+        return self.ring.read(cursor, cursor + size)
@@ -0,0 +1,58 @@
+"""core/audio_encoder.py - Codifica del parlato prima dell'upload a Whisper (Ogg/Opus via PyAV, fallback WAV)"""
+
+import io
+import os
+import logging
+import importlib.util
+from typing import Tuple
+
+import numpy as np
+
+from core.audio_preprocess import TARGET_RATE, pcm16_to_wav
+
+logger = logging.getLogger("JARVIS.AudioEncoder")
+
+# "opus" (default se PyAV è installato) oppure "wav"
+STT_UPLOAD_CODEC = os.environ.get("STT_UPLOAD_CODEC", "opus").lower()
+# 24 kbps bastano al riconoscimento vocale (voce a 16 kHz, mono)
+STT_OPUS_BITRATE = int(os.environ.get("STT_OPUS_BITRATE", "24000"))
+
+AV_AVAILABLE = importlib.util.find_spec("av") is not None
+# Frequenze supportate dall'encoder Opus
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def encode_opus(pcm: bytes, rate: int = TARGET_RATE, bitrate: int = STT_OPUS_BITRATE) -> bytes:
+    """PCM16 mono -> Ogg/Opus in memoria (solleva eccezione se l'encoder non è disponibile)"""
+    import av
+
+    if rate not in OPUS_RATES:
+        raise ValueError(f"Sample rate non supportato da Opus: {rate}")
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=rate)
+        stream.bit_rate = bitrate
+        stream.layout = "mono"
+        # Opus lavora in frame da 20 ms: l'encoder accumula internamente
+        frame = av.AudioFrame.from_ndarray(
+            np.frombuffer(pcm, dtype="<i2").reshape(1, -1), format="s16", layout="mono"
+        )
+        frame.sample_rate = rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def encode_upload(pcm: bytes, rate: int = TARGET_RATE) -> Tuple[bytes, str]:
+    """
+    Audio da inviare a Whisper: (byte, nome file con l'estensione del formato).
+    Ogg/Opus se configurato e disponibile, altrimenti WAV
+    """
+    if STT_UPLOAD_CODEC == "opus" and AV_AVAILABLE:
+        try:
+            return encode_opus(pcm, rate), "audio.ogg"
+        except Exception as e:
+            logger.warning(f"[ENCODER] Opus non disponibile, invio WAV: {e}")
+    return pcm16_to_wav(pcm, rate), "audio.wav"
@@ -0,0 +1,184 @@
+"""core/audio_preprocess.py - Preprocessing audio prima di Whisper: mono, 16 kHz, silenzio tagliato (NumPy)"""
+
+import io
+import os
+import wave
+import logging
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("JARVIS.AudioPreprocess")
+
+TARGET_RATE = 16000
+FRAME_MS = 20
+# Parlato: energia sopra il rumore di fondo, oppure energia moderata con molti
+# passaggi per lo zero (fricative come "s", "f", "z" hanno poca energia)
+TRIM_SPEECH_RATIO = float(os.environ.get("TRIM_SPEECH_RATIO", "3.0"))
+TRIM_MIN_RMS = float(os.environ.get("TRIM_MIN_RMS", "0.01"))
+TRIM_ZCR = float(os.environ.get("TRIM_ZCR", "0.25"))
+# Margine lasciato prima e dopo il parlato
+TRIM_PADDING_MS = int(os.environ.get("TRIM_PADDING_MS", "150"))
+# Sotto questa quantità di parlato la clip è considerata silenzio e non va a Whisper
+MIN_SPEECH_MS = int(os.environ.get("MIN_SPEECH_MS", "200"))
+
+
+class Clip(NamedTuple):
+    wav: bytes        # WAV PCM16 mono 16 kHz, pronto per l'upload
+    pcm: bytes        # stesso audio, PCM16 grezzo
+    duration_ms: int
+    original_ms: int
+    speech_ms: int
+
+
+# ============== DECODIFICA ==============
+
+def pcm_to_float(frames: bytes, sample_width: int, channels: int) -> np.ndarray:
+    """PCM intero (8/16/24/32 bit) -> float32 in [-1, 1], forma (campioni, canali)"""
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        samples = ints.astype(np.float32) / float(1 << 23)
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise ValueError(f"Sample width non supportata: {sample_width}")
+    usable = len(samples) - len(samples) % channels
+    return samples[:usable].reshape(-1, channels)
+
+
+def decode_wav(data: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """WAV -> (campioni float, sample rate); None se non è un WAV"""
+    if data[:4] != b"RIFF":
+        return None
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        params = wav.getparams()
+        frames = wav.readframes(params.nframes)
+    return pcm_to_float(frames, params.sampwidth, params.nchannels), params.framerate
+
+
+def decode_compressed(data: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """WebM/Ogg/MP4 di MediaRecorder via PyAV; None se av manca o il formato non è leggibile"""
+    try:
+        import av
+    except ImportError:
+        return None
+    try:
+        with av.open(io.BytesIO(data)) as container:
+            stream = container.streams.audio[0]
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=TARGET_RATE)
+            chunks = []
+            for frame in container.decode(stream):
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+            for out in resampler.resample(None):
+                chunks.append(out.to_ndarray().reshape(-1))
+    except Exception as e:
+        logger.debug(f"[AUDIO] Decodifica fallita: {e}")
+        return None
+    if not chunks:
+        return None
+    return (np.concatenate(chunks).astype(np.float32) / 32768.0).reshape(-1, 1), TARGET_RATE
+
+
+# ============== TRASFORMAZIONI ==============
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def resample(samples: np.ndarray, rate: int, target: int = TARGET_RATE) -> np.ndarray:
+    """Ricampionamento lineare, con filtro passa-basso (sinc finestrata) se si scende di frequenza"""
+    if rate == target or len(samples) == 0:
+        return samples
+    if target < rate:
+        cutoff = 0.5 * target / rate
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, kernel / kernel.sum(), mode="same")
+    length = int(round(len(samples) * target / rate))
+    positions = np.arange(length) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def speech_frames(samples: np.ndarray, rate: int = TARGET_RATE) -> np.ndarray:
+    """Maschera booleana per frame da 20 ms: energia RMS + zero-crossing rate"""
+    size = rate * FRAME_MS // 1000
+    count = len(samples) // size
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = samples[:count * size].reshape(count, size)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    zcr = np.mean(np.abs(np.diff(np.signbit(frames), axis=1)), axis=1)
+    # Rumore di fondo: i frame più quieti della clip, al massimo TRIM_MIN_RMS.
+    # Una clip di solo parlato (PTT rilasciato subito, audio già tagliato dal
+    # client) avrebbe altrimenti il "rumore di fondo" al livello della voce
+    floor = min(np.percentile(rms, 10), TRIM_MIN_RMS)
+    loud = rms > max(floor * TRIM_SPEECH_RATIO, TRIM_MIN_RMS)
+    fricative = (rms > max(floor * 1.5, TRIM_MIN_RMS / 3)) & (zcr > TRIM_ZCR)
+    speech = loud | fricative
+    if not speech.any() and (rms > TRIM_MIN_RMS).any():
+        # Nessun frame spicca ma la clip non è silenziosa: si tiene intera
+        return np.ones(count, dtype=bool)
+    return speech
+
+
+def to_pcm16(samples: np.ndarray) -> bytes:
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def pcm16_to_wav(pcm: bytes, rate: int = TARGET_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+# ============== PIPELINE ==============
+
+def prepare(samples: np.ndarray, rate: int) -> Optional[Clip]:
+    """Mono -> 16 kHz -> taglio del silenzio; None se non c'è parlato"""
+    original_ms = len(samples) * 1000 // rate
+    mono = resample(downmix(samples).astype(np.float32), rate)
+
+    speech = speech_frames(mono)
+    speech_ms = int(speech.sum()) * FRAME_MS
+    if speech_ms < MIN_SPEECH_MS:
+        logger.info(f"[AUDIO] Clip di {original_ms} ms senza parlato: scartata")
+        return None
+
+    size = TARGET_RATE * FRAME_MS // 1000
+    padding = TRIM_PADDING_MS // FRAME_MS
+    active = np.flatnonzero(speech)
+    start = max(0, active[0] - padding) * size
+    end = min(len(speech), active[-1] + 1 + padding) * size
+    pcm = to_pcm16(mono[start:end])
+    duration_ms = (end - start) * 1000 // TARGET_RATE
+    logger.info(f"[AUDIO] {original_ms} ms -> {duration_ms} ms ({speech_ms} ms di parlato)")
+    return Clip(pcm16_to_wav(pcm), pcm, duration_ms, original_ms, speech_ms)
+
+
+def preprocess_audio(data: bytes) -> Optional[Clip]:
+    """
+    Audio ricevuto dal client (WAV o compresso) pronto per Whisper.
+    None se la clip è solo silenzio; se il formato non si decodifica
+    viene sollevato ValueError e il chiamante può inviare l'originale
+    """
+    decoded = decode_wav(data) or decode_compressed(data)
+    if decoded is None:
+        raise ValueError("Formato audio non riconosciuto")
+    samples, rate = decoded
+    return prepare(samples, rate)
+
+
+def preprocess_pcm(frames: bytes, rate: int, sample_width: int = 2, channels: int = 1) -> Optional[Clip]:
+    """Come preprocess_audio, per PCM grezzo (microfono locale, wav_to_pcm)"""
+    return prepare(pcm_to_float(frames, sample_width, channels), rate)
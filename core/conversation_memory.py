@@ -0,0 +1,248 @@
+"""core/conversation_memory.py - Memoria di conversazione per device, con budget di token e riassunti in background"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+from core.llm_gateway import llm_gateway, DEFAULT_MODEL, Messages
+from core.intent_engine import normalize_text
+
+logger = logging.getLogger("JARVIS.ConversationMemory")
+
+# Token massimi di contesto (riassunto + turni) aggiunti a ogni chiamata
+CONV_TOKEN_BUDGET = int(os.environ.get("CONV_TOKEN_BUDGET", "600"))
+CONV_MAX_TURNS = int(os.environ.get("CONV_MAX_TURNS", "24"))
+CONV_TURN_MAX_CHARS = int(os.environ.get("CONV_TURN_MAX_CHARS", "600"))
+CONV_MAX_SESSIONS = int(os.environ.get("CONV_MAX_SESSIONS", "256"))
+CONV_IDLE_TTL = float(os.environ.get("CONV_IDLE_TTL", "1800"))
+CONV_SUMMARY_MODEL = os.environ.get("CONV_SUMMARY_MODEL", DEFAULT_MODEL)
+CONV_SUMMARY_MAX_TOKENS = int(os.environ.get("CONV_SUMMARY_MAX_TOKENS", "120"))
+
+SUMMARY_PROMPT = (
+    "Riassumi in italiano, in poche frasi, la conversazione tra utente e assistente: "
+    "conserva nomi, luoghi, date e richieste ancora aperte. Solo il riassunto."
+)
+
+
+# Una domanda di seguito si appoggia ai turni precedenti: è corta ("e domani?"),
+# apre con una congiunzione o rimanda a qualcosa di già detto
+FOLLOW_UP_MAX_WORDS = int(os.environ.get("FOLLOW_UP_MAX_WORDS", "3"))
+FOLLOW_UP_OPENERS = {"e", "ma", "anche", "invece", "allora", "quindi", "perche", "cioe", "pure", "poi"}
+FOLLOW_UP_REFERENCES = {
+    "lui", "lei", "loro", "esso", "essa", "quello", "quella", "quelli", "quelle",
+    "questo", "questa", "questi", "queste", "cio", "stesso", "stessa",
+    "altro", "altra", "altri", "altre", "ancora"
+}
+
+
+def depends_on_context(messages: Messages) -> bool:
+    """
+    Vero se la risposta all'ultimo messaggio può dipendere dalla conversazione:
+    ci sono turni o riassunto precedenti e la domanda è un seguito ("e domani?",
+    "quanto è alto lui?"). Solo queste saltano la cache delle risposte; le
+    domande autonome restano condivisibili anche a conversazione avviata
+    """
+    if len(messages) <= 2:
+        return False
+    words = [w.strip(".,;:!?\"'()") for w in normalize_text(str(messages[-1].get("content", ""))).split()]
+    words = [w for w in words if w]
+    if len(words) <= FOLLOW_UP_MAX_WORDS or words[0] in FOLLOW_UP_OPENERS:
+        return True
+    return any(w in FOLLOW_UP_REFERENCES for w in words)
+
+
+def estimate_tokens(text: str) -> int:
+    """Stima economica (~4 caratteri per token): basta per rispettare il budget"""
+    return max(1, (len(text) + 3) // 4)
+
+
+class Turn(NamedTuple):
+    role: str  # "user" | "assistant"
+    text: str
+    tokens: int
+    ts: float
+
+
+class Session:
+    __slots__ = ("turns", "summary", "summary_tokens", "last_used", "summarizing")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.summary = ""
+        self.summary_tokens = 0
+        self.last_used = time.monotonic()
+        self.summarizing: Optional[asyncio.Task] = None
+
+    def tokens(self) -> int:
+        return self.summary_tokens + sum(t.tokens for t in self.turns)
+
+
+class ConversationMemory:
+    """
+    Per ogni device un ring limitato di turni compatti (testo troncato e
+    token stimati). Il contesto di una chiamata è il riassunto più i turni
+    recenti che stanno nel budget: il costo per chiamata resta costante
+    anche in conversazioni lunghe. Quando i turni superano il budget, i più
+    vecchi vengono fusi nel riassunto in background; le sessioni inattive
+    scadono e oltre il limite di sessioni si scarta la meno recente
+    """
+
+    def __init__(self, token_budget: int = CONV_TOKEN_BUDGET, max_turns: int = CONV_MAX_TURNS,
+                 max_sessions: int = CONV_MAX_SESSIONS, idle_ttl: float = CONV_IDLE_TTL):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.counters = {
+            "turns": 0,
+            "summaries": 0,
+            "summary_failures": 0,
+            "evicted_idle": 0,
+            "evicted_lru": 0,
+            "dropped_turns": 0
+        }
+
+    # ============== SESSIONI ==============
+
+    def _evict(self, now: float):
+        # OrderedDict in ordine di uso: le inattive sono in testa
+        while self._sessions:
+            device_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used > self.idle_ttl:
+                self.counters["evicted_idle"] += 1
+            elif len(self._sessions) > self.max_sessions:
+                self.counters["evicted_lru"] += 1
+            else:
+                break
+            self._drop(device_id)
+
+    def _drop(self, device_id: str):
+        session = self._sessions.pop(device_id, None)
+        if session and session.summarizing and not session.summarizing.done():
+            session.summarizing.cancel()
+
+    def _session(self, device_id: str) -> Session:
+        now = time.monotonic()
+        session = self._sessions.get(device_id)
+        if session is None:
+            session = self._sessions[device_id] = Session(self.max_turns)
+        self._sessions.move_to_end(device_id)
+        session.last_used = now
+        self._evict(now)
+        return session
+
+    def forget(self, device_id: str):
+        self._drop(device_id)
+
+    # ============== TURNI ==============
+
+    def add_turn(self, device_id: str, role: str, text: str):
+        text = " ".join((text or "").split())[:CONV_TURN_MAX_CHARS]
+        if not text:
+            return
+        session = self._session(device_id)
+        if len(session.turns) == session.turns.maxlen:
+            # Il ring è pieno prima che il riassunto arrivasse: il turno più vecchio si perde
+            self.counters["dropped_turns"] += 1
+        session.turns.append(Turn(role, text, estimate_tokens(text), time.monotonic()))
+        self.counters["turns"] += 1
+        if session.tokens() > self.token_budget:
+            self._schedule_summary(device_id, session)
+
+    def add_exchange(self, device_id: str, user_text: str, reply: str):
+        self.add_turn(device_id, "user", user_text)
+        self.add_turn(device_id, "assistant", reply)
+
+    def build_messages(self, device_id: str, system_prompt: str, text: str) -> Messages:
+        """System prompt, riassunto, turni recenti nel budget, domanda corrente"""
+        session = self._session(device_id)
+        budget = self.token_budget - session.summary_tokens
+        recent: List[Turn] = []
+        for turn in reversed(session.turns):
+            if turn.tokens > budget:
+                break
+            budget -= turn.tokens
+            recent.append(turn)
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if session.summary:
+            messages.append({"role": "system", "content": f"Conversazione precedente: {session.summary}"})
+        messages.extend({"role": t.role, "content": t.text} for t in reversed(recent))
+        messages.append({"role": "user", "content": text})
+        return messages
+
+    # ============== RIASSUNTI ==============
+
+    def _schedule_summary(self, device_id: str, session: Session):
+        if session.summarizing and not session.summarizing.done():
+            return
+        try:
+            session.summarizing = asyncio.get_running_loop().create_task(self._summarize(device_id, session))
+        except RuntimeError:
+            # Nessun event loop (uso sincrono): il ring resta comunque limitato
+            pass
+
+    async def _summarize(self, device_id: str, session: Session):
+        """Fonde nel riassunto i turni più vecchi, lasciando metà budget ai recenti"""
+        keep_budget = self.token_budget // 2
+        kept = 0
+        for keep, turn in enumerate(reversed(session.turns)):
+            if kept + turn.tokens > keep_budget:
+                break
+            kept += turn.tokens
+        else:
+            return
+        old = list(session.turns)[:len(session.turns) - keep]
+        if not old:
+            return
+
+        transcript = "\n".join(f"{'Utente' if t.role == 'user' else 'JARVIS'}: {t.text}" for t in old)
+        if session.summary:
+            transcript = f"Riassunto finora: {session.summary}\n{transcript}"
+        try:
+            summary = await llm_gateway.complete(
+                [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+                model=CONV_SUMMARY_MODEL,
+                max_tokens=CONV_SUMMARY_MAX_TOKENS,
+                temperature=0.2
+            )
+        except Exception as e:
+            self.counters["summary_failures"] += 1
+            logger.warning(f"[CONV_MEMORY] Riassunto {device_id} fallito: {e}")
+            return
+
+        summary = " ".join(summary.split())
+        if not summary:
+            return
+        # Nel frattempo il ring può essere avanzato: rimuove solo i turni riassunti ancora presenti
+        summarized = set(old)
+        while session.turns and session.turns[0] in summarized:
+            session.turns.popleft()
+        session.summary = summary
+        session.summary_tokens = estimate_tokens(summary)
+        self.counters["summaries"] += 1
+        logger.debug(f"[CONV_MEMORY] {device_id}: {len(old)} turni riassunti ({session.summary_tokens} token)")
+
+    # ============== SHUTDOWN / STATS ==============
+
+    async def aclose(self):
+        tasks = [s.summarizing for s in self._sessions.values() if s.summarizing and not s.summarizing.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "sessions": len(self._sessions),
+            "token_budget": self.token_budget
+        }
+
+
+# Istanza condivisa
+conversation_memory = ConversationMemory()
@@ -0,0 +1,132 @@
+"""core/http_pool.py - Client HTTP condivisi per host (keep-alive, HTTP/2, prewarm)"""
+
+import os
+import time
+import asyncio
+import logging
+import importlib.util
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger("JARVIS.HTTPPool")
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_REWARM_AFTER = float(os.environ.get("HTTP_REWARM_AFTER", "60"))
+
+# HTTP/2 solo se il pacchetto h2 è installato (pip install h2)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+OPENAI_ORIGIN = "https://api.openai.com"
+
+
+def origin_of(url: str) -> str:
+    """scheme://host[:port] di un URL"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class HTTPClientRegistry:
+    """
+    Un httpx.AsyncClient per host, condiviso da tutto il processo:
+    le richieste riusano le connessioni TCP+TLS invece di rifarle ogni volta
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, bool], httpx.AsyncClient] = {}
+        self._last_used: Dict[str, float] = {}
+        self._warm_origins: Dict[str, bool] = {}
+        self._openai = None
+        self._rewarm_task: Optional[asyncio.Task] = None
+
+    def get(self, url: str, verify: bool = True, timeout: float = 10.0) -> httpx.AsyncClient:
+        """Client condiviso per l'host di url (creato al primo uso)"""
+        origin = origin_of(url)
+        key = (origin, verify)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            async def touch(request: httpx.Request):
+                self._last_used[origin] = time.monotonic()
+
+            client = httpx.AsyncClient(
+                verify=verify,
+                timeout=timeout,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                ),
+                event_hooks={"request": [touch]}
+            )
+            self._clients[key] = client
+            logger.debug(f"[HTTP_POOL] Nuovo client per {origin} (http2={HTTP2_AVAILABLE})")
+        return client
+
+    def openai(self):
+        """AsyncOpenAI condiviso, sul client pooled di api.openai.com"""
+        if self._openai is None:
+            from openai import AsyncOpenAI
+            self._openai = AsyncOpenAI(
+                api_key=os.environ.get("OPENAI_API_KEY"),
+                http_client=self.get(OPENAI_ORIGIN, timeout=60.0)
+            )
+        return self._openai
+
+    # ============== PREWARM ==============
+
+    async def _warm(self, origin: str, verify: bool):
+        """Apre la connessione (TCP+TLS) con una HEAD: lo status non importa"""
+        try:
+            started = time.perf_counter()
+            await self.get(origin, verify=verify).head(origin, timeout=5.0)
+            logger.info(f"[HTTP_POOL] 🔥 {origin} pronto ({(time.perf_counter() - started) * 1000:.0f} ms)")
+        except Exception as e:
+            logger.debug(f"[HTTP_POOL] Prewarm {origin} fallito: {e}")
+
+    async def prewarm(self, urls: Iterable[str], verify: bool = True):
+        """Connette in anticipo agli host indicati e li tiene caldi"""
+        origins = []
+        for url in urls:
+            if not url or "YOUR-" in url:
+                continue
+            origin = origin_of(url)
+            self._warm_origins[origin] = verify
+            origins.append(origin)
+        await asyncio.gather(*(self._warm(o, verify) for o in origins))
+
+    async def _rewarm_loop(self):
+        """Riscalda gli host inattivi prima che il keep-alive scada"""
+        while True:
+            await asyncio.sleep(HTTP_REWARM_AFTER / 2)
+            now = time.monotonic()
+            idle = [
+                (origin, verify) for origin, verify in self._warm_origins.items()
+                if now - self._last_used.get(origin, 0) > HTTP_REWARM_AFTER
+            ]
+            await asyncio.gather(*(self._warm(o, v) for o, v in idle))
+
+    def start_rewarm(self):
+        """Avvia il task di rewarm (dentro l'event loop dell'app)"""
+        if self._rewarm_task is None or self._rewarm_task.done():
+            self._rewarm_task = asyncio.create_task(self._rewarm_loop())
+
+    # ============== SHUTDOWN ==============
+
+    async def aclose(self):
+        """Chiude tutti i client (da chiamare allo shutdown dell'app)"""
+        if self._rewarm_task:
+            self._rewarm_task.cancel()
+            self._rewarm_task = None
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._openai = None
+        await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
+        logger.info(f"[HTTP_POOL] {len(clients)} client chiusi")
+
+
+# Registry globale del processo
+http_clients = HTTPClientRegistry()
@@ -0,0 +1,246 @@
+"""core/intent_classifier.py - Classificatore di intent locale (n-grammi hashed + modello lineare NumPy)"""
+
+import os
+import zlib
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.intent_engine import normalize_text
+
+logger = logging.getLogger("JARVIS.IntentClassifier")
+
+BASE_DIR = Path(__file__).parent.parent
+INTENT_TRAINING_FILE = Path(os.environ.get(
+    "INTENT_TRAINING_FILE", str(Path(__file__).parent / "data" / "intent_utterances.tsv")
+))
+INTENT_MODEL_PATH = Path(os.environ.get(
+    "INTENT_MODEL_PATH", str(BASE_DIR / ".cache" / "intent_model.npz")
+))
+# Sotto questa probabilità la frase va all'LLM
+INTENT_MIN_CONFIDENCE = float(os.environ.get("INTENT_MIN_CONFIDENCE", "0.6"))
+
+FEATURE_DIM = 1 << 13
+NGRAM_RANGE = (2, 4)
+GENERAL_INTENT = "general_query"
+# Cambia quando cambia il modo di addestrare: i modelli salvati prima vengono riaddestrati
+MODEL_VERSION = 2
+
+
+def featurize(text: str, dim: int = FEATURE_DIM) -> np.ndarray:
+    """
+    Vettore normalizzato di n-grammi di caratteri (2-4) e parole, hashed in dim
+    colonne: robusto a refusi e flessioni ("accendimi", "accendi")
+    """
+    padded = f" {normalize_text(text)} "
+    grams = [padded[i:i + n] for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1)
+             for i in range(len(padded) - n + 1)]
+    grams += ["w:" + word for word in padded.split()]
+    if not grams:
+        return np.zeros(dim, dtype=np.float32)
+
+    index = np.fromiter((zlib.crc32(g.encode("utf-8")) % dim for g in grams), dtype=np.int64, count=len(grams))
+    vector = np.log1p(np.bincount(index, minlength=dim).astype(np.float32))
+    return vector / np.linalg.norm(vector)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def load_utterances(path: Path = INTENT_TRAINING_FILE) -> List[Tuple[str, str]]:
+    """Righe "intent<TAB>frase" (# per i commenti)"""
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or "\t" not in line:
+                continue
+            intent, text = line.rstrip("\n").split("\t", 1)
+            if intent.strip() and text.strip():
+                samples.append((intent.strip(), text.strip()))
+    return samples
+
+
+class IntentClassifier:
+    """
+    Regressione logistica multiclasse su feature hashed. I pesi vengono
+    addestrati dal file di esempi e salvati in .cache: i caricamenti
+    successivi leggono solo il file .npz. Le probabilità sono calibrate
+    con temperature scaling su una parte degli esempi tenuta da parte: il
+    modello servito è quello addestrato senza quegli esempi, lo stesso su cui
+    è stata stimata la temperatura. Le frasi quasi identiche agli esempi
+    restano vicine a 1, quelle lontane scendono sotto la soglia
+    """
+
+    def __init__(self, training_file: Path = INTENT_TRAINING_FILE, model_path: Path = INTENT_MODEL_PATH,
+                 dim: int = FEATURE_DIM):
+        self.training_file = Path(training_file)
+        self.model_path = Path(model_path)
+        self.dim = dim
+
+        self.labels: List[str] = []
+        self.weights: Optional[np.ndarray] = None  # (dim, classi)
+        self.bias: Optional[np.ndarray] = None
+        self.temperature = 1.0
+        self._lock = threading.Lock()
+        # Solo per avviare il thread di caricamento: mai tenuto durante l'addestramento
+        self._loader_lock = threading.Lock()
+        self._loader: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.weights is not None
+
+    # ============== ADDESTRAMENTO ==============
+
+    @staticmethod
+    def _fit(X: np.ndarray, y: np.ndarray, classes: int, epochs: int = 1000,
+             lr: float = 5.0, l2: float = 1e-4) -> Tuple[np.ndarray, np.ndarray]:
+        """Discesa del gradiente full-batch sulla cross-entropy"""
+        W = np.zeros((X.shape[1], classes), dtype=np.float32)
+        b = np.zeros(classes, dtype=np.float32)
+        target = np.eye(classes, dtype=np.float32)[y]
+        for _ in range(epochs):
+            grad = (_softmax(X @ W + b) - target) / len(X)
+            W -= lr * (X.T @ grad + l2 * W)
+            b -= lr * grad.sum(axis=0)
+        return W, b
+
+    @staticmethod
+    def _fit_temperature(logits: np.ndarray, y: np.ndarray) -> float:
+        """Temperatura che minimizza la NLL sugli esempi tenuti da parte"""
+        best_t, best_nll = 1.0, float("inf")
+        for t in np.linspace(0.2, 5.0, 49):
+            probs = _softmax(logits / t)
+            nll = -np.log(probs[np.arange(len(y)), y] + 1e-9).mean()
+            if nll < best_nll:
+                best_t, best_nll = float(t), nll
+        return best_t
+
+    def train(self, holdout: float = 0.25, seed: int = 7) -> Dict[str, float]:
+        """Addestra dal file di esempi; ritorna accuratezza, confidenza media e temperatura sull'holdout"""
+        samples = load_utterances(self.training_file)
+        labels = sorted({intent for intent, _ in samples})
+        X = np.stack([featurize(text, self.dim) for _, text in samples])
+        y = np.array([labels.index(intent) for intent, _ in samples])
+
+        # Holdout stratificato per la calibrazione
+        rng = np.random.default_rng(seed)
+        held = np.zeros(len(y), dtype=bool)
+        for c in range(len(labels)):
+            members = np.flatnonzero(y == c)
+            rng.shuffle(members)
+            held[members[:max(1, int(len(members) * holdout))]] = True
+
+        W, b = self._fit(X[~held], y[~held], len(labels))
+        logits = X[held] @ W + b
+        temperature = self._fit_temperature(logits, y[held])
+        accuracy = float((logits.argmax(axis=1) == y[held]).mean())
+        confidence = float(_softmax(logits / temperature).max(axis=1).mean())
+
+        # Niente riaddestramento su tutti gli esempi: un modello diverso (più sicuro
+        # sui propri dati) renderebbe la temperatura stimata qui non più valida
+        # (pesi assegnati per ultimi: ready diventa vero a modello completo)
+        self.labels = labels
+        self.temperature = temperature
+        self.bias = b
+        self.weights = W
+        logger.info(f"[INTENT_CLF] Addestrato su {len(samples)} esempi, {len(labels)} intent "
+                    f"(holdout acc {accuracy:.2f}, confidenza {confidence:.2f}, T={temperature:.2f})")
+        return {"samples": len(samples), "holdout_accuracy": accuracy,
+                "holdout_confidence": confidence, "temperature": temperature}
+
+    # ============== PERSISTENZA ==============
+
+    def _data_signature(self) -> str:
+        digest = hashlib.sha256(self.training_file.read_bytes())
+        digest.update(f"{self.dim}:{NGRAM_RANGE}:{MODEL_VERSION}".encode())
+        return digest.hexdigest()[:16]
+
+    def save(self):
+        self.model_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.model_path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp,
+            weights=self.weights.astype(np.float16),
+            bias=self.bias,
+            labels=np.array(self.labels),
+            temperature=np.array(self.temperature),
+            signature=np.array(self._data_signature())
+        )
+        os.replace(tmp, self.model_path)
+
+    def load(self) -> bool:
+        """Carica i pesi salvati; riaddestra se mancano o se gli esempi sono cambiati"""
+        with self._lock:
+            if self.ready:
+                return True
+            try:
+                signature = self._data_signature()
+                if self.model_path.exists():
+                    with np.load(self.model_path) as data:
+                        if str(data["signature"]) == signature:
+                            self.labels = [str(label) for label in data["labels"]]
+                            self.temperature = float(data["temperature"])
+                            self.bias = data["bias"]
+                            self.weights = data["weights"].astype(np.float32)
+                            return True
+                self.train()
+                self.save()
+                return True
+            except Exception as e:
+                logger.error(f"[INTENT_CLF] Modello non disponibile: {e}")
+                return False
+
+    def load_in_background(self):
+        """
+        Avvia load() in un thread, una volta sola: chi non può attendere un addestramento
+        controlla ready. Non prende _lock (tenuto da load() per tutto l'addestramento):
+        chiamarla dall'event loop durante un caricamento non blocca
+        """
+        with self._loader_lock:
+            if self.ready or self._loader is not None:
+                return
+            self._loader = threading.Thread(target=self.load, name="intent-classifier-load", daemon=True)
+        self._loader.start()
+
+    # ============== PREDIZIONE ==============
+
+    def probabilities(self, text: str) -> Dict[str, float]:
+        """Probabilità calibrate per ogni intent"""
+        if not self.ready and not self.load():
+            return {}
+        logits = featurize(text, self.dim) @ self.weights + self.bias
+        probs = _softmax(logits / self.temperature)
+        return {label: float(p) for label, p in zip(self.labels, probs)}
+
+    def predict(self, text: str, min_confidence: float = INTENT_MIN_CONFIDENCE) -> Optional[Tuple[str, float]]:
+        """
+        (intent, probabilità) se la frase è un comando riconosciuto con
+        abbastanza confidenza; None se è una domanda aperta o incerta
+        """
+        probs = self.probabilities(text)
+        if not probs:
+            return None
+        intent = max(probs, key=probs.get)
+        if intent == GENERAL_INTENT or probs[intent] < min_confidence:
+            return None
+        return intent, probs[intent]
+
+
+# Istanza condivisa (pesi caricati al primo uso)
+intent_classifier = IntentClassifier()
+
+
+if __name__ == "__main__":
+    # python -m core.intent_classifier  → riaddestra e salva il modello
+    logging.basicConfig(level=logging.INFO)
+    stats = intent_classifier.train()
+    intent_classifier.save()
+    print(stats)
@@ -0,0 +1,183 @@
+"""core/intent_engine.py - Motore di intent: tutte le keyword in un solo automa Aho-Corasick"""
+
+import logging
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("JARVIS.IntentEngine")
+
+
+def normalize_text(text: str) -> str:
+    """Minuscolo, senza accenti, spazi compattati ("Città" -> "citta")"""
+    if not text:
+        return ""
+    if text.isascii():
+        return " ".join(text.lower().split())
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+class IntentEngine:
+    """
+    Le keyword di tutti gli intent compilate in un unico automa: una sola
+    passata sul testo trova ogni occorrenza (a parola intera, o a inizio parola
+    per le keyword "chiam*") e assegna un punteggio a tutti gli intent. Registrare un intent aggiunge i suoi
+    pattern al trie; link di fallimento e transizioni si ricalcolano al primo match
+    """
+
+    def __init__(self, count_bonus: bool = False, default_confidence: float = 0.9):
+        """
+        Args:
+            count_bonus: più occorrenze alzano la confidenza (+5% ciascuna)
+            default_confidence: confidenza degli intent registrati senza valore
+        """
+        self.count_bonus = count_bonus
+        self.default_confidence = default_confidence
+
+        self._intents: Dict[str, Dict[str, Any]] = {}  # ordine = priorità a parità di punteggio
+        self._patterns: List[Tuple[str, str, bool]] = []  # (keyword normalizzata, intent, prefisso)
+        self._known = set()
+
+        # Automa: transizioni, link di fallimento, pattern che terminano in ogni stato
+        self._goto: List[Dict[str, int]] = [{}]
+        self._own: List[List[int]] = [[]]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._delta: List[Dict[str, int]] = [{}]
+        self._dirty = False
+
+    # ============== REGISTRAZIONE ==============
+
+    def register(self, intent: str, keywords: Iterable[str], confidence: Optional[float] = None,
+                 **metadata):
+        """
+        Aggiunge (o estende) un intent; metadata viene restituito nei match.
+        Una keyword che termina con "*" è un prefisso: "chiam*" copre chiama,
+        chiamami, chiamare (le forme flesse che il vecchio match per sottostringa prendeva)
+        """
+        entry = self._intents.setdefault(intent, {
+            "confidence": self.default_confidence,
+            "keywords": [],
+            "metadata": {}
+        })
+        if confidence is not None:
+            entry["confidence"] = confidence
+        entry["metadata"].update(metadata)
+
+        for keyword in keywords:
+            prefix = keyword.endswith("*")
+            pattern = normalize_text(keyword.rstrip("*"))
+            if not pattern or (pattern, intent, prefix) in self._known:
+                continue
+            self._known.add((pattern, intent, prefix))
+            entry["keywords"].append(keyword)
+            self._insert(pattern, intent, prefix)
+
+    def _insert(self, pattern: str, intent: str, prefix: bool = False):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._own.append([])
+            state = nxt
+        self._own[state].append(len(self._patterns))
+        self._patterns.append((pattern, intent, prefix))
+        self._dirty = True
+
+    def _build(self):
+        """Link di fallimento, output e transizioni complete (BFS sul trie)"""
+        fail = [0] * len(self._goto)
+        out = [list(own) for own in self._own]
+        # delta: transizione diretta per ogni carattere noto, niente risalita dei fail a runtime
+        delta: List[Dict[str, int]] = [{} for _ in self._goto]
+        delta[0] = dict(self._goto[0])
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            if state:
+                delta[state] = {**delta[fail[state]], **self._goto[state]}
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state:
+                    f = fail[state]
+                    while f and ch not in self._goto[f]:
+                        f = fail[f]
+                    fail[nxt] = self._goto[f].get(ch, 0)
+                out[nxt].extend(out[fail[nxt]])
+        self._fail = fail
+        self._out = out
+        self._delta = delta
+        self._dirty = False
+
+    # ============== MATCH ==============
+
+    def _hits(self, text: str) -> Dict[str, Dict[str, Any]]:
+        """Una passata: per intent, numero di occorrenze e prima keyword trovata"""
+        if self._dirty:
+            self._build()
+
+        normalized = normalize_text(text)
+        hits: Dict[str, Dict[str, Any]] = {}
+        delta, out = self._delta, self._out
+        state = 0
+        for i, ch in enumerate(normalized):
+            state = delta[state].get(ch, 0)
+            if not out[state]:
+                continue
+            for pid in out[state]:
+                pattern, intent, prefix = self._patterns[pid]
+                start = i - len(pattern) + 1
+                # Solo parole intere: "ora" non deve scattare dentro "ancora"
+                # (i prefissi solo a inizio parola)
+                if start > 0 and normalized[start - 1].isalnum():
+                    continue
+                if not prefix and i + 1 < len(normalized) and normalized[i + 1].isalnum():
+                    continue
+                hit = hits.get(intent)
+                if hit is None:
+                    # Il primo output di uno stato è il pattern più lungo
+                    hits[intent] = {"matched_keyword": pattern + "*" * prefix, "match_count": 1, "_end": i}
+                elif hit["_end"] != i:
+                    # "che ora" e "ora" finiscono nello stesso punto: una sola occorrenza
+                    hit["match_count"] += 1
+                    hit["_end"] = i
+        for hit in hits.values():
+            del hit["_end"]
+        return hits
+
+    def scores(self, text: str) -> Dict[str, Dict[str, Any]]:
+        """Tutti gli intent trovati nel testo, con confidenza e dettagli del match"""
+        result = {}
+        for intent, hit in self._hits(text).items():
+            entry = self._intents[intent]
+            confidence = entry["confidence"]
+            if self.count_bonus:
+                confidence *= 0.9 + (hit["match_count"] - 1) * 0.05
+            result[intent] = {**entry["metadata"], **hit, "confidence": confidence}
+        return result
+
+    def match(self, text: str) -> Optional[Tuple[str, float, Dict[str, Any]]]:
+        """
+        Intent migliore: (nome, confidenza, dettagli) oppure None
+
+        A parità di confidenza vince l'intent registrato per primo
+        """
+        scored = self.scores(text)
+        best = None
+        for intent in self._intents:
+            details = scored.get(intent)
+            if details and (best is None or details["confidence"] > best[1]):
+                best = (intent, details["confidence"], details)
+        return best
+
+    def metadata(self, intent: str) -> Dict[str, Any]:
+        entry = self._intents.get(intent)
+        return dict(entry["metadata"]) if entry else {}
+
+    def __contains__(self, intent: str) -> bool:
+        return intent in self._intents
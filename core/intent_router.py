@@ -1,24 +1,27 @@
 import logging
-from typing import Dict, Tuple, Any
+from typing import Dict, Tuple, Any, List
+
+from core.intent_engine import IntentEngine
+from core.intent_classifier import intent_classifier
 
 logger = logging.getLogger("JARVIS-IntentRouter")
 
 class IntentRouter:
     """
     Routes user intents to appropriate handlers
-    Uses keyword matching with confidence scoring
+    Uses keyword matching with confidence scoring (one automaton for all keywords)
     """
     
     # Define all intents with keywords and confidence thresholds
     intents = {
         # ========== DEVICE ACTIONS ==========
         "call": {
-            "keywords": ["chiama", "telefono", "numero", "call", "chiamare"],
+            "keywords": ["chiam*", "telefon*", "numero", "call"],
             "confidence": 0.90,
             "type": "device"
         },
         "whatsapp_send": {
-            "keywords": ["whatsapp", "invia", "messaggio", "chat", "wp"],
+            "keywords": ["whatsapp", "invia*", "messaggio", "chat", "wp"],
             "confidence": 0.85,
             "type": "device"
         },
@@ -32,6 +35,31 @@ class IntentRouter:
             "confidence": 0.80,
             "type": "device"
         },
+        "flashlight": {
+            "keywords": ["torcia", "flash"],
+            "confidence": 0.85,
+            "type": "device"
+        },
+        "wifi": {
+            "keywords": ["wifi", "wi-fi"],
+            "confidence": 0.85,
+            "type": "device"
+        },
+        "bluetooth": {
+            "keywords": ["bluetooth"],
+            "confidence": 0.85,
+            "type": "device"
+        },
+        "volume": {
+            "keywords": ["volume", "silenzioso"],
+            "confidence": 0.85,
+            "type": "device"
+        },
+        "battery": {
+            "keywords": ["batteria"],
+            "confidence": 0.85,
+            "type": "device"
+        },
         
         # ========== WEATHER ==========
         "get_weather": {
@@ -63,6 +91,17 @@ class IntentRouter:
         },
     }
     
+    _engine = IntentEngine(count_bonus=True)
+    
+    @staticmethod
+    def register_intent(name: str, keywords: List[str], confidence: float = 0.85, intent_type: str = "ai"):
+        """Add (or extend) an intent; the automaton picks it up on the next match"""
+        intent_data = IntentRouter.intents.setdefault(name, {"keywords": [], "confidence": confidence, "type": intent_type})
+        intent_data["keywords"] = intent_data["keywords"] + [k for k in keywords if k not in intent_data["keywords"]]
+        intent_data["confidence"] = confidence
+        intent_data["type"] = intent_type
+        IntentRouter._engine.register(name, keywords, confidence, type=intent_type)
+    
     @staticmethod
     def route_intent(user_input: str) -> Tuple[str, Dict[str, Any], float]:
         """
@@ -75,36 +114,36 @@ class IntentRouter:
             Tuple of (intent_name, metadata, confidence_score)
         """
         try:
-            text_lower = user_input.lower()
             best_intent = None
             best_confidence = 0.0
             best_metadata = {}
             
             logger.debug(f"🔍 Routing intent for: {user_input}")
             
-            # Check each intent
-            for intent_name, intent_data in IntentRouter.intents.items():
-                keywords = intent_data.get("keywords", [])
-                intent_confidence = intent_data.get("confidence", 0.5)
-                
-                # Check if any keyword matches
-                for keyword in keywords:
-                    if keyword in text_lower:
-                        # Calculate actual confidence based on match position
-                        match_count = text_lower.count(keyword)
-                        actual_confidence = intent_confidence * (0.9 + (match_count - 1) * 0.05)
-                        
-                        logger.debug(f"  ✓ {intent_name}: {actual_confidence:.2f}")
-                        
-                        if actual_confidence > best_confidence:
-                            best_confidence = actual_confidence
-                            best_intent = intent_name
-                            best_metadata = {
-                                "type": intent_data.get("type", "unknown"),
-                                "matched_keyword": keyword,
-                                "match_count": match_count
-                            }
-                        break
+            # Single pass over the text scores every intent
+            match = IntentRouter._engine.match(user_input)
+            if match:
+                best_intent, best_confidence, details = match
+                best_metadata = {
+                    "type": details.get("type", "unknown"),
+                    "matched_keyword": details["matched_keyword"],
+                    "match_count": details["match_count"]
+                }
+            
+            # Local classifier: catches what the keywords miss (instead of the LLM)
+            # and overrides a weaker keyword hit ("telefono" in "accendi la luce del telefono")
+            # (only once loaded: the first load may retrain for seconds, never inline here)
+            predicted = None
+            if intent_classifier.ready:
+                predicted = intent_classifier.predict(user_input)
+            else:
+                intent_classifier.load_in_background()
+            if predicted and predicted[0] != best_intent and predicted[1] > best_confidence:
+                best_intent, best_confidence = predicted
+                best_metadata = {
+                    "type": IntentRouter.get_intent_type(best_intent),
+                    "source": "classifier"
+                }
             
             # If no intent matched, return generic
             if not best_intent:
@@ -135,6 +174,10 @@ class IntentRouter:
         """Check if intent is weather related"""
         return IntentRouter.get_intent_type(intent) == "weather"
 
+# Compile the built-in table
+for _name, _data in IntentRouter.intents.items():
+    IntentRouter._engine.register(_name, _data["keywords"], _data.get("confidence", 0.5), type=_data.get("type", "unknown"))
+
 # Public routing function
 def route(user_input: str) -> Tuple[str, Dict[str, Any], float]:
     """Public API for intent routing"""
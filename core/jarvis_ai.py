@@ -1,17 +1,46 @@
 import os
+import time
 import asyncio
 import json
 import logging
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, AsyncIterator
 from datetime import datetime
-import openai
 from device_handlers import DeviceCommandHandler
+from core.llm_gateway import llm_gateway, llm_stream, DEFAULT_MODEL, DEFAULT_SYSTEM_PROMPT
+from core.conversation_memory import conversation_memory, depends_on_context
+from core.speculation import speculator
+from core.intent_engine import IntentEngine
+from core.response_cache import response_cache
+from services.geolocation.gazetteer import gazetteer, Place
+from services.weather.weather_api import WeatherAPI
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("JARVIS-AI")
 
-# OpenAI Configuration
-openai.api_key = os.getenv("OPENAI_API_KEY", "your-api-key-here")
+# Simple rule-based intent table (registration order breaks ties; "*" = word prefix)
+INTENT_KEYWORDS = {
+    "call": ["chiam*", "telefon*", "numero", "call"],
+    "whatsapp_send": ["whatsapp", "invia*", "messaggio", "chat"],
+    "sms_send": ["sms", "messaggio testo"],
+    "read_notifications": ["notifiche", "notification", "avvisi"],
+    "get_weather": ["meteo", "temperature", "pioggia", "neve"],
+    "get_location_weather": ["meteo", "tempo", "città"],
+    "greeting": ["ciao", "salve", "hey", "hello"],
+    "time": ["ora", "time", "quando"],
+}
+
+# Speculative fetches each intent can use (the rest are cancelled)
+SPECULATION_KINDS = {
+    "call": ("contact",),
+    "whatsapp_send": ("contact",),
+    "sms_send": ("contact",),
+    "get_weather": ("weather",),
+    "get_location_weather": ("weather",)
+}
+
+_intent_engine = IntentEngine(default_confidence=0.9)
+for _intent, _keywords in INTENT_KEYWORDS.items():
+    _intent_engine.register(_intent, _keywords)
 
 class JarvisAI:
     """
@@ -19,8 +48,9 @@ class JarvisAI:
     """
     
     def __init__(self):
-        self.model = "gpt-3.5-turbo"
+        self.model = DEFAULT_MODEL
         self.device_hub = None
+        self.weather = WeatherAPI()
         logger.info("✅ JARVIS AI initialized")
     
     def set_device_hub(self, device_hub):
@@ -28,59 +58,84 @@ class JarvisAI:
         self.device_hub = device_hub
         logger.info("✅ DeviceHub reference set")
     
-    async def process_input(self, text: str, websocket=None) -> str:
+    @staticmethod
+    def session_for(device_id: Optional[str]) -> str:
+        """Sessione di memoria/speculazione per dispositivo (assistente locale senza device_id)"""
+        return f"jarvis_ai:{device_id}" if device_id else "jarvis_ai"
+    
+    async def process_input(self, text: str, websocket=None, device_id: Optional[str] = None) -> str:
         """
         Main processing function
         1. Parse intent
         2. Extract entities
         3. Route to appropriate handler
         """
+        parts = [delta async for delta in self.process_input_stream(text, websocket, device_id)]
+        return "".join(parts)
+    
+    async def process_input_stream(self, text: str, websocket=None,
+                                   device_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Come process_input, ma produce la risposta a frammenti:
+        le risposte locali arrivano in un unico frammento,
+        il fallback GPT token per token. Memoria di conversazione e
+        speculazioni sono separate per device_id
+        """
+        session_id = self.session_for(device_id)
         try:
             logger.info(f"📨 Processing: {text}")
             
+            # Start likely fetches (contact, weather) while the intent is resolved
+            speculator.observe(session_id, text, {
+                "device_hub": self.device_hub,
+                "device_id": device_id,
+                "weather_api_key": self.weather.api_key
+            })
+            
             # Parse intent and entities
             intent, entities, confidence = await self._parse_intent(text)
+            speculator.resolve(session_id, SPECULATION_KINDS.get(intent, ()))
             
             if confidence < 0.5:
-                return "Non ho capito bene. Puoi ripetere?"
+                yield "Non ho capito bene. Puoi ripetere?"
+                return
             
             logger.info(f"🎯 Intent: {intent} (confidence: {confidence:.2f})")
             
             # ============== DEVICE ACTIONS ==============
             if intent in ["call", "whatsapp_send", "sms_send", "read_notifications"]:
-                response = await self._handle_device_action(intent, entities)
-                return response
+                yield await self._handle_device_action(intent, entities, session_id)
             
             # ============== WEATHER ==============
+            elif intent in ["get_weather", "get_location_weather"] and entities.get("city"):
+                yield await self._handle_location_weather(entities["city"], entities.get("place"))
+            
             elif intent == "get_weather":
-                response = await self._handle_weather()
-                return response
+                yield await self._handle_weather()
             
             elif intent == "get_location_weather":
-                city = entities.get("city", "Rome")
-                response = await self._handle_location_weather(city)
-                return response
+                yield "Di quale città vuoi sapere il meteo?"
             
             # ============== GENERAL AI ==============
             elif intent == "greeting":
-                return "Ciao! Sono JARVIS, il tuo assistente vocale. Come posso aiutarti?"
+                yield "Ciao! Sono JARVIS, il tuo assistente vocale. Come posso aiutarti?"
             
             elif intent == "time":
                 current_time = datetime.now().strftime("%H:%M:%S")
-                return f"Sono le {current_time}"
+                yield f"Sono le {current_time}"
             
             else:
                 # Fall back to GPT for general queries
-                response = await self._query_gpt(text)
-                return response
+                async for delta in self._stream_gpt(text, session_id):
+                    yield delta
         
         except Exception as e:
             logger.error(f"❌ Processing error: {e}", exc_info=True)
-            return f"Errore durante l'elaborazione: {str(e)}"
+            yield f"Errore durante l'elaborazione: {str(e)}"
     
     # ============== DEVICE ACTION HANDLER ==============
     
-    async def _handle_device_action(self, intent: str, entities: Dict[str, Any]) -> str:
+    async def _handle_device_action(self, intent: str, entities: Dict[str, Any], session_id: str) -> str:
         """
         Route device commands to appropriate handlers
         """
@@ -91,7 +146,7 @@ class JarvisAI:
             
             if intent == "call":
                 contact = entities.get("contact_name", "")
-                phone = entities.get("phone_number")
+                phone = entities.get("phone_number") or await speculator.take(session_id, "contact", contact)
                 
                 if not contact:
                     return "Dimmi a chi vuoi chiamare"
@@ -104,7 +159,7 @@ class JarvisAI:
             elif intent == "whatsapp_send":
                 contact = entities.get("contact_name", "")
                 message = entities.get("message_content", "")
-                phone = entities.get("phone_number")
+                phone = entities.get("phone_number") or await speculator.take(session_id, "contact", contact)
                 
                 if not contact or not message:
                     return "Dimmi a chi inviare e cosa scrivere"
@@ -117,7 +172,7 @@ class JarvisAI:
             elif intent == "sms_send":
                 contact = entities.get("contact_name", "")
                 message = entities.get("message_content", "")
-                phone = entities.get("phone_number")
+                phone = entities.get("phone_number") or await speculator.take(session_id, "contact", contact)
                 
                 if not contact or not message:
                     return "Dimmi a chi inviare l'SMS e cosa scrivere"
@@ -151,12 +206,20 @@ class JarvisAI:
             logger.error(f"❌ Weather error: {e}")
             return "Non riesco a recuperare le informazioni meteo"
     
-    async def _handle_location_weather(self, city: str) -> str:
-        """Get weather for specific city"""
+    async def _handle_location_weather(self, city: str, place: Optional[Place] = None) -> str:
+        """Get weather for specific city (by coordinates when resolved by the gazetteer)"""
         try:
             logger.info(f"🌍 Fetching weather for {city}...")
-            # TODO: Implement location weather API call
-            return f"A {city} la temperatura è di 15 gradi"
+            if place:
+                result = await self.weather.get_weather_at(place.lat, place.lon, label=place.name)
+            else:
+                result = await self.weather.get_weather(city)
+            
+            if result["status"] != "success":
+                return result["response"]
+            
+            data = result["data"]
+            return f"A {city}: {data['details']}, {round(data['temperature'])} gradi, umidità {data['humidity']}%"
         except Exception as e:
             logger.error(f"❌ Location weather error: {e}")
             return f"Non riesco a recuperare il meteo di {city}"
@@ -169,31 +232,12 @@ class JarvisAI:
         Returns: (intent, entities, confidence)
         """
         try:
-            text_lower = text.lower()
-            
-            # Simple rule-based intent matching
-            intents_keywords = {
-                "call": ["chiama", "telefono", "numero", "call"],
-                "whatsapp_send": ["whatsapp", "invia", "messaggio", "chat"],
-                "sms_send": ["sms", "messaggio testo"],
-                "read_notifications": ["notifiche", "notification", "avvisi"],
-                "get_weather": ["meteo", "temperature", "pioggia", "neve"],
-                "get_location_weather": ["meteo", "tempo", "città"],
-                "greeting": ["ciao", "salve", "hey", "hello"],
-                "time": ["ora", "time", "quando"],
-            }
-            
             best_intent = None
             best_confidence = 0.0
             
-            for intent, keywords in intents_keywords.items():
-                for keyword in keywords:
-                    if keyword in text_lower:
-                        confidence = 0.9
-                        if confidence > best_confidence:
-                            best_confidence = confidence
-                            best_intent = intent
-                        break
+            match = _intent_engine.match(text)
+            if match:
+                best_intent, best_confidence, _ = match
             
             if not best_intent:
                 best_intent = "general_query"
@@ -213,20 +257,13 @@ class JarvisAI:
         Extract entities from user input based on intent
         """
         entities = {}
-        text_lower = text.lower()
         
         try:
             if intent in ["call", "whatsapp_send", "sms_send"]:
-                # Extract contact name (simple extraction)
-                words = text_lower.split()
-                
-                # Look for prepositions
-                for i, word in enumerate(words):
-                    if word in ["a", "di", "per"] and i + 1 < len(words):
-                        contact = words[i + 1]
-                        if contact not in ["whatsapp", "sms", "chiama"]:
-                            entities["contact_name"] = contact.capitalize()
-                            break
+                # Extract contact name (simple extraction, shared with the speculative lookup)
+                contact = DeviceCommandHandler.extract_contact_name(text)
+                if contact:
+                    entities["contact_name"] = contact
                 
                 # Extract message content for WhatsApp/SMS
                 if intent in ["whatsapp_send", "sms_send"]:
@@ -234,6 +271,13 @@ class JarvisAI:
                         message_part = text.split(":", 1)[1].strip()
                         entities["message_content"] = message_part
             
+            elif intent in ["get_weather", "get_location_weather"]:
+                # City span + canonical coordinates from the offline gazetteer
+                place = gazetteer.extract(text)
+                if place:
+                    entities["city"] = place.name
+                    entities["place"] = place
+            
             return entities
         
         except Exception as e:
@@ -242,41 +286,61 @@ class JarvisAI:
     
     # ============== GPT FALLBACK ==============
     
-    async def _query_gpt(self, text: str) -> str:
+    async def _query_gpt(self, text: str, session_id: str = "jarvis_ai") -> str:
         """
         Fallback to GPT for general queries
         """
+        parts = [delta async for delta in self._stream_gpt(text, session_id)]
+        return "".join(parts)
+    
+    async def _stream_gpt(self, text: str, session_id: str = "jarvis_ai") -> AsyncIterator[str]:
+        """
+        Fallback GPT in streaming: produce i token man mano che arrivano
+        (le domande già viste escono intere dalla cache semantica; con turni
+        precedenti nel contesto si va sempre al modello e non si salva in cache)
+        """
+        messages = conversation_memory.build_messages(session_id, DEFAULT_SYSTEM_PROMPT, text)
+        contextual = depends_on_context(messages)
+        cached = None if contextual else response_cache.get(text, scope=f"jarvis_ai:{self.model}")
+        if cached:
+            logger.info("⚡ GPT reply from response cache")
+            conversation_memory.add_exchange(session_id, text, cached)
+            yield cached
+            return
+        
+        streamed = False
         try:
-            logger.info("🤖 Querying GPT...")
+            logger.info("🤖 Querying GPT (stream)...")
             
-            response = await asyncio.to_thread(
-                openai.ChatCompletion.create,
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are JARVIS, a helpful AI assistant. Answer in Italian."
-                    },
-                    {"role": "user", "content": text}
-                ],
-                max_tokens=200,
-                temperature=0.7
-            )
-            
-            reply = response.choices[0].message.content
-            logger.info(f"✅ GPT reply: {reply}")
-            return reply
+            started = time.perf_counter()
+            async for msg_type, content in llm_gateway.stream(messages, model=self.model, max_tokens=200):
+                if msg_type == "delta":
+                    streamed = True
+                    yield content
+                elif msg_type == "done":
+                    logger.info(f"✅ GPT reply: {content}")
+                    conversation_memory.add_exchange(session_id, text, content)
+                    if not contextual:
+                        response_cache.put(text, content.strip(), (time.perf_counter() - started) * 1000,
+                                           scope=f"jarvis_ai:{self.model}")
         
         except Exception as e:
             logger.error(f"❌ GPT query error: {e}")
-            return "Scusa, non riesco a elaborare la tua richiesta"
+            if not streamed:
+                yield "Scusa, non riesco a elaborare la tua richiesta"
 
 # Global instance
 jarvis = JarvisAI()
 
-async def process_user_input(text: str, websocket=None) -> str:
+async def process_user_input(text: str, websocket=None, device_id: Optional[str] = None) -> str:
     """Public API for processing user input"""
-    return await jarvis.process_input(text, websocket)
+    return await jarvis.process_input(text, websocket, device_id)
+
+async def process_user_input_stream(text: str, websocket=None,
+                                    device_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Public API for streaming user input processing"""
+    async for delta in jarvis.process_input_stream(text, websocket, device_id):
+        yield delta
 
 def init_jarvis(device_hub):
     """Initialize JARVIS with DeviceHub"""
@@ -0,0 +1,350 @@
+"""core/llm_gateway.py - Gateway asincrono unico per le chiamate LLM (concorrenza, deadline, retry, metriche)"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import openai
+
+from core.http_pool import http_clients
+
+logger = logging.getLogger("JARVIS.LLMGateway")
+
+DEFAULT_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+DEFAULT_SYSTEM_PROMPT = "You are JARVIS, a helpful AI assistant. Answer in Italian."
+
+# Richieste contemporanee per modello; override per modello: "gpt-4o=2,gpt-4o-mini=8"
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_MODEL_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, _, limit in (item.partition("=") for item in os.environ.get("LLM_MODEL_CONCURRENCY", "").split(","))
+    if name.strip() and limit.strip().isdigit()
+}
+# Tempo massimo per l'intera richiesta (attesa del semaforo e retry compresi)
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE", "20"))
+# Tempo massimo per il primo token di uno stream
+LLM_FIRST_TOKEN_TIMEOUT = float(os.environ.get("LLM_FIRST_TOKEN_TIMEOUT", "8"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE = float(os.environ.get("LLM_RETRY_BASE", "0.5"))
+# Giri massimi di function calling prima della risposta finale
+LLM_TOOL_ROUNDS = int(os.environ.get("LLM_TOOL_ROUNDS", "3"))
+
+Messages = List[Dict[str, str]]
+
+
+class LLMDeadlineExceeded(asyncio.TimeoutError):
+    """La richiesta non si è conclusa entro la deadline"""
+
+
+def _retryable(error: Exception) -> bool:
+    """429, 5xx, timeout ed errori di connessione; mai 400/401/404"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Secondi suggeriti dall'header Retry-After, se presente"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class LLMGateway:
+    """
+    Tutte le chiamate chat passano da qui: un solo AsyncOpenAI pooled
+    (core.http_pool), un semaforo per modello, una deadline per chiamata e
+    retry con backoff esponenziale e jitter su 429/5xx. Uno stream viene
+    ritentato solo finché non ha prodotto token: dopo, l'errore risale al
+    chiamante. Ogni richiesta registra token, latenza e tempo al primo token
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, deadline: float = LLM_DEADLINE,
+                 max_retries: int = LLM_MAX_RETRIES, first_token_timeout: float = LLM_FIRST_TOKEN_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.first_token_timeout = first_token_timeout
+
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._models: Dict[str, Dict[str, float]] = {}
+        self.recent: deque = deque(maxlen=50)
+
+    def _client(self):
+        # I retry li fa il gateway, non l'SDK (altrimenti si moltiplicano)
+        return http_clients.openai().with_options(max_retries=0)
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(model)
+        if semaphore is None:
+            limit = LLM_MODEL_CONCURRENCY.get(model, self.max_concurrency)
+            semaphore = self._semaphores[model] = asyncio.Semaphore(limit)
+        return semaphore
+
+    # ============== METRICHE ==============
+
+    def _totals(self, model: str) -> Dict[str, float]:
+        return self._models.setdefault(model, {
+            "requests": 0,
+            "errors": 0,
+            "aborted": 0,
+            "retries": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency_ms_total": 0.0,
+            "inflight": 0
+        })
+
+    def _record(self, record: Dict[str, Any]):
+        totals = self._totals(record["model"])
+        totals["requests"] += 1
+        totals["errors"] += record["status"] == "error"
+        totals["aborted"] += record["status"] == "aborted"
+        totals["retries"] += max(record["attempts"] - 1, 0)
+        totals["prompt_tokens"] += record["prompt_tokens"]
+        totals["completion_tokens"] += record["completion_tokens"]
+        totals["latency_ms_total"] += record["latency_ms"]
+        self.recent.append(record)
+
+        ttft = f", primo token {record['ttft_ms']:.0f} ms" if record["ttft_ms"] is not None else ""
+        logger.info(f"[LLM] {record['model']} {record['status']} in {record['latency_ms']:.0f} ms{ttft} "
+                    f"({record['prompt_tokens']}+{record['completion_tokens']} token, "
+                    f"{record['attempts']} tentativi)")
+
+    def stats(self) -> Dict[str, Any]:
+        models = {}
+        for model, totals in self._models.items():
+            requests = totals["requests"] or 1
+            models[model] = {
+                **{k: v for k, v in totals.items() if k != "latency_ms_total"},
+                "avg_latency_ms": round(totals["latency_ms_total"] / requests, 1)
+            }
+        return {"models": models, "max_concurrency": self.max_concurrency, "deadline": self.deadline}
+
+    # ============== RETRY ==============
+
+    async def _backoff(self, attempt: int, error: Exception, deadline_at: float) -> bool:
+        """Attende prima del prossimo tentativo; False se non c'è più tempo o tentativi"""
+        if attempt >= self.max_retries or not _retryable(error):
+            return False
+        delay = _retry_after(error) or LLM_RETRY_BASE * (2 ** attempt)
+        delay *= random.uniform(0.5, 1.5)
+        if time.monotonic() + delay >= deadline_at:
+            return False
+        logger.warning(f"[LLM] {type(error).__name__}, nuovo tentativo tra {delay:.2f}s")
+        await asyncio.sleep(delay)
+        return True
+
+    @staticmethod
+    def _remaining(deadline_at: float) -> float:
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineExceeded("LLM deadline exceeded")
+        return remaining
+
+    # ============== CHIAMATE ==============
+
+    @staticmethod
+    def _new_record(model: str, mode: str) -> Dict[str, Any]:
+        return {"model": model, "mode": mode, "status": "error", "attempts": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "ttft_ms": None}
+
+    async def complete(self, messages: Messages, model: str = DEFAULT_MODEL, max_tokens: int = 200,
+                       temperature: float = 0.7, deadline: Optional[float] = None, **params) -> str:
+        """Risposta completa (non streaming)"""
+        message = await self.complete_message(messages, model, max_tokens, temperature, deadline, **params)
+        return message.content or ""
+
+    async def complete_message(self, messages: Messages, model: str = DEFAULT_MODEL, max_tokens: int = 200,
+                               temperature: float = 0.7, deadline: Optional[float] = None, **params):
+        """Messaggio completo del modello (contenuto ed eventuali tool_calls)"""
+        record = self._new_record(model, "complete")
+        started = time.monotonic()
+        deadline_at = started + (deadline or self.deadline)
+        totals = self._totals(model)
+        try:
+            async with self._semaphore(model):
+                totals["inflight"] += 1
+                try:
+                    while True:
+                        record["attempts"] += 1
+                        try:
+                            timeout = self._remaining(deadline_at)
+                            response = await asyncio.wait_for(
+                                self._client().chat.completions.create(
+                                    model=model, messages=messages, max_tokens=max_tokens,
+                                    temperature=temperature, **params
+                                ),
+                                timeout
+                            )
+                            break
+                        except Exception as e:
+                            if not await self._backoff(record["attempts"] - 1, e, deadline_at):
+                                if isinstance(e, asyncio.TimeoutError):
+                                    raise LLMDeadlineExceeded("LLM deadline exceeded") from e
+                                raise
+                finally:
+                    totals["inflight"] -= 1
+
+            if response.usage:
+                record["prompt_tokens"] = response.usage.prompt_tokens
+                record["completion_tokens"] = response.usage.completion_tokens
+            record["status"] = "ok"
+            return response.choices[0].message
+        except asyncio.CancelledError:
+            record["status"] = "aborted"
+            raise
+        finally:
+            record["latency_ms"] = (time.monotonic() - started) * 1000
+            self._record(record)
+
+    async def stream(self, messages: Messages, model: str = DEFAULT_MODEL, max_tokens: int = 200,
+                     temperature: float = 0.7, deadline: Optional[float] = None,
+                     **params) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Streaming: ("delta", frammento) per ogni token, poi ("done", testo completo)
+
+        Gli errori (dopo i retry) vengono propagati al chiamante.
+        """
+        record = self._new_record(model, "stream")
+        started = time.monotonic()
+        deadline_at = started + (deadline or self.deadline)
+        totals = self._totals(model)
+        parts: List[str] = []
+        try:
+            async with self._semaphore(model):
+                totals["inflight"] += 1
+                try:
+                    while True:
+                        record["attempts"] += 1
+                        stream = None
+                        try:
+                            timeout = self._remaining(deadline_at)
+                            stream = await asyncio.wait_for(
+                                self._client().chat.completions.create(
+                                    model=model, messages=messages, max_tokens=max_tokens,
+                                    temperature=temperature, stream=True,
+                                    stream_options={"include_usage": True}, **params
+                                ),
+                                timeout
+                            )
+                            chunks = stream.__aiter__()
+                            while True:
+                                timeout = self._remaining(deadline_at)
+                                if not parts:
+                                    timeout = min(timeout, self.first_token_timeout)
+                                try:
+                                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                                except StopAsyncIteration:
+                                    break
+                                if chunk.usage:
+                                    record["prompt_tokens"] = chunk.usage.prompt_tokens
+                                    record["completion_tokens"] = chunk.usage.completion_tokens
+                                if not chunk.choices:
+                                    continue
+                                delta = chunk.choices[0].delta.content
+                                if delta:
+                                    if not parts:
+                                        record["ttft_ms"] = (time.monotonic() - started) * 1000
+                                    parts.append(delta)
+                                    yield "delta", delta
+                            break
+                        except Exception as e:
+                            # Dopo il primo token niente retry: il chiamante ha già parte della risposta
+                            if parts or not await self._backoff(record["attempts"] - 1, e, deadline_at):
+                                if isinstance(e, asyncio.TimeoutError):
+                                    raise LLMDeadlineExceeded("LLM deadline exceeded") from e
+                                raise
+                        finally:
+                            if stream is not None:
+                                # Chiude la connessione anche se il client abbandona lo stream
+                                await stream.close()
+                finally:
+                    totals["inflight"] -= 1
+
+            record["status"] = "ok"
+            yield "done", "".join(parts)
+        except (GeneratorExit, asyncio.CancelledError):
+            record["status"] = "aborted"
+            raise
+        finally:
+            record["latency_ms"] = (time.monotonic() - started) * 1000
+            self._record(record)
+
+
+    # ============== TOOL CALLING ==============
+
+    async def run_tools(self, messages: Messages, registry, model: str = DEFAULT_MODEL, max_tokens: int = 200,
+                        context: Optional[Dict[str, Any]] = None, max_rounds: int = LLM_TOOL_ROUNDS) -> str:
+        """
+        Loop di function calling: a ogni giro il modello può chiedere più
+        tool, eseguiti tutti in parallelo (timeout per tool nel registry) e
+        restituiti insieme nel giro successivo. Termina con la risposta testuale
+        """
+        messages = list(messages)
+        tools = registry.definitions()
+        deadline_at = time.monotonic() + self.deadline
+        for _ in range(max_rounds):
+            message = await self.complete_message(
+                messages, model=model, max_tokens=max_tokens,
+                deadline=self._remaining(deadline_at), tools=tools
+            )
+            if not message.tool_calls:
+                return message.content or ""
+            messages.append({
+                "role": "assistant",
+                "content": message.content,
+                "tool_calls": [
+                    {"id": c.id, "type": "function", "function": {"name": c.function.name, "arguments": c.function.arguments}}
+                    for c in message.tool_calls
+                ]
+            })
+            messages.extend(await registry.run_calls(message.tool_calls, context))
+
+        # Giri esauriti: risposta finale senza altri tool
+        return await self.complete(messages, model=model, max_tokens=max_tokens,
+                                   deadline=self._remaining(deadline_at), tools=tools, tool_choice="none")
+
+
+# Gateway condiviso del processo
+llm_gateway = LLMGateway()
+
+
+def build_messages(text: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT) -> Messages:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text}
+    ]
+
+
+async def llm_stream(
+    text: str,
+    system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 200,
+    temperature: float = 0.7
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Streaming GPT di una singola domanda tramite il gateway
+
+    Yields:
+        ("delta", frammento) per ogni token ricevuto,
+        poi ("done", testo completo)
+    """
+    async for item in llm_gateway.stream(build_messages(text, system_prompt), model=model,
+                                         max_tokens=max_tokens, temperature=temperature):
+        yield item
+
+
+async def llm_complete(text: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT, model: str = DEFAULT_MODEL,
+                       max_tokens: int = 200, temperature: float = 0.7) -> str:
+    """Risposta completa (non streaming) di una singola domanda tramite il gateway"""
+    return await llm_gateway.complete(build_messages(text, system_prompt), model=model,
+                                      max_tokens=max_tokens, temperature=temperature)
@@ -0,0 +1,197 @@
+"""core/phrase_bank.py - Banca audio pre-renderizzata per le frasi fisse"""
+
+import os
+import mmap
+import json
+import struct
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("JARVIS.PhraseBank")
+
+BASE_DIR = Path(__file__).parent.parent
+PHRASE_BANK_DIR = Path(os.environ.get("PHRASE_BANK_DIR", str(BASE_DIR / ".cache" / "phrases")))
+
+# Formato file: MAGIC | uint32 lunghezza header | header JSON | audio concatenato
+_MAGIC = b"JPB1"
+_LEN = struct.Struct("<I")
+
+# ============== REGISTRO FRASI ==============
+
+_PHRASES: Dict[str, str] = {}
+
+
+def normalize_phrase(text: str) -> str:
+    """Forma canonica per il confronto (spazi e maiuscole ignorati)"""
+    return " ".join(text.split()).casefold()
+
+
+def _phrase_key(text: str) -> str:
+    return hashlib.sha256(normalize_phrase(text).encode("utf-8")).hexdigest()[:32]
+
+
+def register_phrases(*texts: str):
+    """I moduli dichiarano qui le loro risposte costanti"""
+    for text in texts:
+        if text and text.strip():
+            _PHRASES.setdefault(_phrase_key(text), text.strip())
+
+
+def registered_phrases() -> List[str]:
+    """Elenco delle frasi registrate"""
+    return list(_PHRASES.values())
+
+
+# ============== BANCA AUDIO ==============
+
+class PhraseBank:
+    """
+    Audio delle frasi registrate, renderizzato una volta e servito da un
+    file mappato in memoria (nessuna latenza TTS a runtime)
+    """
+
+    def __init__(self, name: str, synthesize: Callable[[str], Awaitable[Optional[bytes]]],
+                 signature: str = "", concurrency: int = 2):
+        """
+        Args:
+            name: nome del file asset (<name>.bank)
+            synthesize: funzione TTS usata per il rendering
+            signature: voce/parametri TTS; se cambia l'asset viene rigenerato
+            concurrency: sintesi parallele durante il rendering
+        """
+        self.name = name
+        self.synthesize = synthesize
+        self.signature = signature
+        self.concurrency = concurrency
+        self.path = PHRASE_BANK_DIR / f"{name}.bank"
+
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self.hits = 0
+
+    # ============== LETTURA ==============
+
+    def load(self) -> bool:
+        """Mappa in memoria l'asset esistente (False se assente o non valido)"""
+        self.close()
+        f = mm = None
+        try:
+            if not self.path.exists() or self.path.stat().st_size < len(_MAGIC) + _LEN.size:
+                return False
+
+            f = open(self.path, "rb")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mm[:len(_MAGIC)] != _MAGIC:
+                raise ValueError("magic non valido")
+
+            (header_len,) = _LEN.unpack_from(mm, len(_MAGIC))
+            data_start = len(_MAGIC) + _LEN.size + header_len
+            header = json.loads(mm[len(_MAGIC) + _LEN.size:data_start].decode("utf-8"))
+
+            if header.get("signature") != self.signature:
+                raise ValueError("voce cambiata")
+
+            self._file = f
+            self._mmap = mm
+            self._index = {
+                key: (data_start + offset, length)
+                for key, (offset, length) in header["index"].items()
+            }
+            logger.info(f"[PHRASES] {self.name}: {len(self._index)} frasi caricate")
+            return True
+
+        except Exception as e:
+            logger.warning(f"[PHRASES] {self.name}: asset da rigenerare ({e})")
+            if mm is not None:
+                mm.close()
+            if f is not None:
+                f.close()
+            return False
+
+    def get(self, text: str) -> Optional[bytes]:
+        """Audio pre-renderizzato per la frase, se registrata"""
+        audio = self._read(_phrase_key(text))
+        if audio is not None:
+            self.hits += 1
+        return audio
+
+    def _read(self, key: str) -> Optional[bytes]:
+        entry = self._index.get(key)
+        if entry is None or self._mmap is None:
+            return None
+        offset, length = entry
+        try:
+            return self._mmap[offset:offset + length]
+        except ValueError:
+            # Asset in fase di sostituzione
+            return None
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._index = {}
+
+    # ============== RENDERING ==============
+
+    async def warm(self):
+        """Carica l'asset e renderizza le frasi registrate mancanti"""
+        await asyncio.to_thread(self.load)
+
+        missing = {key: text for key, text in _PHRASES.items() if key not in self._index}
+        if not missing:
+            return
+
+        logger.info(f"[PHRASES] {self.name}: rendering {len(missing)} frasi...")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def render(key: str, text: str):
+            async with semaphore:
+                try:
+                    return key, await self.synthesize(text)
+                except Exception as e:
+                    logger.warning(f"[PHRASES] Rendering fallito '{text}': {e}")
+                    return key, None
+
+        rendered = await asyncio.gather(*(render(k, t) for k, t in missing.items()))
+        audio = {key: data for key, data in rendered if data}
+
+        # Conserva le frasi già presenti nell'asset
+        for key in list(self._index):
+            existing = self._read(key)
+            if existing:
+                audio.setdefault(key, existing)
+
+        await asyncio.to_thread(self._write, audio)
+        await asyncio.to_thread(self.load)
+
+    def _write(self, audio: Dict[str, bytes]):
+        """Scrive l'asset in modo atomico"""
+        index = {}
+        offset = 0
+        for key, data in audio.items():
+            index[key] = (offset, len(data))
+            offset += len(data)
+
+        header = json.dumps({"signature": self.signature, "index": index}).encode("utf-8")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_LEN.pack(len(header)))
+            f.write(header)
+            for data in audio.values():
+                f.write(data)
+
+        # Su Windows il file mappato non può essere sostituito
+        self.close()
+        os.replace(tmp, self.path)
+        logger.info(f"[PHRASES] {self.name}: asset salvato ({len(audio)} frasi, {offset} byte)")
@@ -0,0 +1,214 @@
+"""core/push_to_talk.py - Push-To-Talk a eventi: sorgenti intercambiabili (tastiera, evdev, WebSocket/GPIO), zero CPU a riposo"""
+
+import os
+import logging
+import threading
+from typing import Callable, Iterable, List, Optional
+
+logger = logging.getLogger("JARVIS.PTT")
+
+# keyboard (hook di sistema), evdev (Linux senza desktop), none (solo eventi esterni)
+PTT_SOURCE = os.environ.get("PTT_SOURCE", "keyboard").lower()
+PTT_KEY = os.environ.get("PTT_KEY", "space")
+PTT_EVDEV_DEVICE = os.environ.get("PTT_EVDEV_DEVICE", "/dev/input/event0")
+PTT_EVDEV_KEY = os.environ.get("PTT_EVDEV_KEY", "KEY_SPACE")
+
+PRESS_VALUES = {"down", "press", "pressed", "1", "on", "true"}
+RELEASE_VALUES = {"up", "release", "released", "0", "off", "false"}
+
+
+class PushToTalk:
+    """
+    Stato del tasto PTT alimentato da eventi premuto/rilasciato. Le sorgenti
+    chiamano press()/release() dai propri hook o thread bloccanti: nessun
+    polling, i consumatori attendono con wait_pressed()/wait_released().
+    Con più sorgenti il PTT resta attivo finché almeno una è premuta
+    """
+
+    def __init__(self):
+        self.active = threading.Event()
+        self.released = threading.Event()
+        self.released.set()
+        self._held = set()
+        self._lock = threading.Lock()
+        self._sources: List["PTTSource"] = []
+
+    # ============== EVENTI ==============
+
+    def press(self, source: str = "external"):
+        with self._lock:
+            first = not self._held
+            self._held.add(source)
+            if first:
+                # L'autorepeat della tastiera ripete il press: solo il primo conta
+                self.released.clear()
+                self.active.set()
+        if first:
+            logger.info(f"[PTT] ✅ Premuto ({source}) - registrazione avviata")
+
+    def release(self, source: str = "external"):
+        with self._lock:
+            if source not in self._held:
+                return
+            self._held.discard(source)
+            last = not self._held
+            if last:
+                self.active.clear()
+                self.released.set()
+        if last:
+            logger.info(f"[PTT] Rilasciato ({source}) - registrazione completata")
+
+    def handle(self, value, source: str = "external") -> bool:
+        """Evento testuale da WebSocket/GPIO/pipe ("down"/"up", 1/0...); False se non riconosciuto"""
+        value = str(value).strip().lower()
+        if value in PRESS_VALUES:
+            self.press(source)
+        elif value in RELEASE_VALUES:
+            self.release(source)
+        else:
+            return False
+        return True
+
+    # ============== CONSUMATORI ==============
+
+    def is_active(self) -> bool:
+        return self.active.is_set()
+
+    def wait_pressed(self, timeout: Optional[float] = None) -> bool:
+        return self.active.wait(timeout)
+
+    def wait_released(self, timeout: Optional[float] = None) -> bool:
+        return self.released.wait(timeout)
+
+    # ============== SORGENTI ==============
+
+    def add_source(self, source: "PTTSource") -> bool:
+        """Avvia una sorgente; False (con warning) se la sua dipendenza non è disponibile"""
+        try:
+            source.start(self)
+        except Exception as e:
+            logger.warning(f"[PTT] Sorgente {source.name} non disponibile: {e}")
+            return False
+        self._sources.append(source)
+        logger.info(f"[PTT] Sorgente attiva: {source.name}")
+        return True
+
+    def stop(self):
+        for source in self._sources:
+            try:
+                source.stop()
+            except Exception as e:
+                logger.debug(f"[PTT] Stop {source.name}: {e}")
+        self._sources.clear()
+        with self._lock:
+            self._held.clear()
+            self.active.clear()
+            self.released.set()
+
+
+class PTTSource:
+    """Sorgente di eventi PTT: start() registra hook o avvia un thread bloccante"""
+
+    name = "source"
+
+    def start(self, ptt: PushToTalk):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class KeyboardSource(PTTSource):
+    """Hook key-down/key-up della libreria keyboard (richiede root su Linux)"""
+
+    def __init__(self, key: str = PTT_KEY):
+        self.key = key
+        self.name = f"keyboard:{key}"
+        self._hooks = []
+
+    def start(self, ptt: PushToTalk):
+        import keyboard
+
+        self._hooks = [
+            keyboard.on_press_key(self.key, lambda _: ptt.press(self.name)),
+            keyboard.on_release_key(self.key, lambda _: ptt.release(self.name)),
+        ]
+
+    def stop(self):
+        import keyboard
+
+        for hook in self._hooks:
+            keyboard.unhook(hook)
+        self._hooks = []
+
+
+class EventStreamSource(PTTSource):
+    """
+    Thread che consuma un iteratore bloccante di eventi ("down"/"up", 1/0):
+    linee GPIO, pipe, seriale. Il thread dorme dentro la lettura
+    """
+
+    def __init__(self, events: Callable[[], Iterable], name: str = "stream"):
+        self.events = events
+        self.name = name
+        self._stopped = threading.Event()
+
+    def _run(self, ptt: PushToTalk):
+        try:
+            for event in self.events():
+                if self._stopped.is_set():
+                    break
+                ptt.handle(event, self.name)
+        except Exception as e:
+            if not self._stopped.is_set():
+                logger.error(f"[PTT] Sorgente {self.name} interrotta: {e}")
+        finally:
+            ptt.release(self.name)
+
+    def start(self, ptt: PushToTalk):
+        threading.Thread(target=self._run, args=(ptt,), name=f"ptt-{self.name}", daemon=True).start()
+
+    def stop(self):
+        # La lettura bloccante termina al prossimo evento o alla chiusura del device (thread daemon)
+        self._stopped.set()
+
+
+class EvdevSource(EventStreamSource):
+    """Tasto di un device /dev/input (Linux headless, niente X/Wayland)"""
+
+    def __init__(self, device_path: str = PTT_EVDEV_DEVICE, key: str = PTT_EVDEV_KEY):
+        super().__init__(self._read_events, f"evdev:{key}")
+        self.device_path = device_path
+        self.key = key
+        self._device = None
+
+    def _read_events(self):
+        from evdev import ecodes
+
+        code = ecodes.ecodes[self.key]
+        for event in self._device.read_loop():
+            # value: 1 premuto, 0 rilasciato, 2 autorepeat (ignorato)
+            if event.type == ecodes.EV_KEY and event.code == code and event.value in (0, 1):
+                yield event.value
+
+    def start(self, ptt: PushToTalk):
+        from evdev import InputDevice
+
+        self._device = InputDevice(self.device_path)
+        super().start(ptt)
+
+    def stop(self):
+        super().stop()
+        if self._device is not None:
+            self._device.close()
+
+
+def build_source(kind: str = PTT_SOURCE) -> Optional[PTTSource]:
+    """Sorgente configurata da PTT_SOURCE; None per "none" (eventi solo via handle())"""
+    if kind == "keyboard":
+        return KeyboardSource()
+    if kind == "evdev":
+        return EvdevSource()
+    if kind != "none":
+        logger.warning(f"[PTT] PTT_SOURCE sconosciuta: {kind}")
+    return None
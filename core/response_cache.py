@@ -0,0 +1,235 @@
+"""core/response_cache.py - Cache semantica delle risposte LLM (testo esatto + vicini per similarità)"""
+
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+import numpy as np
+
+from core.intent_engine import IntentEngine, normalize_text
+from core.intent_classifier import featurize, FEATURE_DIM
+
+logger = logging.getLogger("JARVIS.ResponseCache")
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_MAX = int(os.environ.get("RESPONSE_CACHE_MAX", "512"))
+# Similarità coseno minima per riusare la risposta di una domanda diversa
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_THRESHOLD", "0.8"))
+# Sovrapposizione minima (Jaccard) tra le parole di contenuto delle due domande
+RESPONSE_CACHE_MIN_OVERLAP = float(os.environ.get("RESPONSE_CACHE_MIN_OVERLAP", "0.6"))
+# Radice delle parole di contenuto: "spieghi"/"spiegami", "capitale"/"capitali" coincidono
+STEM_CHARS = 5
+
+# Domande la cui risposta dipende dal momento o dal device: mai in cache
+VOLATILE_KEYWORDS = [
+    "ora", "ore", "orario", "adesso", "oggi", "domani", "ieri", "stasera", "stanotte",
+    "giorno", "data", "settimana", "mese", "anno", "ultime", "ultimo", "notizie", "news",
+    "meteo", "tempo", "pioggia", "temperatura", "gradi",
+    "chiama", "chiamata", "messaggio", "whatsapp", "sms", "notifiche", "notifica",
+    "batteria", "torcia", "wifi", "bluetooth", "volume", "telefono", "posizione", "dove sono",
+    "qui", "qua", "vicino"
+]
+
+# Parole lunghe ma senza contenuto: non devono far somigliare due domande diverse
+STOPWORDS = {
+    "qual", "quale", "quali", "come", "cosa", "quanto", "quanta", "quanti", "quante", "quando",
+    "perche", "della", "dello", "delle", "degli", "dalla", "dalle", "nella", "nello", "nelle",
+    "negli", "sulla", "sullo", "sulle", "sugli", "alla", "allo", "alle", "agli", "questo",
+    "questa", "quello", "quella", "sono", "fare", "essere", "avere", "anche", "molto", "tutto",
+    "tutti", "dimmi", "puoi", "potresti", "vorrei", "sapere", "ecco", "stato", "stata",
+    "favore", "grazie", "prego"
+}
+
+_volatile = IntentEngine()
+_volatile.register("volatile", VOLATILE_KEYWORDS)
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def is_volatile(text: str) -> bool:
+    """Vero se la risposta cambierebbe con l'ora, il giorno o lo stato del device"""
+    return _volatile.match(text) is not None
+
+
+def cache_key(text: str) -> str:
+    """Testo normalizzato senza punteggiatura: "Chi sei?" e "chi sei" coincidono"""
+    return " ".join(_PUNCTUATION.sub(" ", normalize_text(text)).split())
+
+
+def content_words(key: str) -> FrozenSet[str]:
+    """Radici delle parole lunghe (stopword escluse): il tema della domanda"""
+    return frozenset(w[:STEM_CHARS] for w in key.split()
+                     if len(w) >= 4 and w not in STOPWORDS and not w.isdigit())
+
+
+def anchors(text: str) -> FrozenSet[str]:
+    """
+    Numeri e nomi propri (maiuscola non a inizio frase): due domande simili
+    sono la stessa solo se coincidono ("2 più 2" / "2 più 3", "Francia" / "Spagna")
+    """
+    words = re.findall(r"\w+", text)
+    return frozenset(normalize_text(w) for i, w in enumerate(words)
+                     if any(c.isdigit() for c in w) or (i > 0 and w[0].isupper()))
+
+
+def overlap(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Indice di Jaccard tra due insiemi di parole (1.0 se entrambi vuoti)"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class SemanticResponseCache:
+    """
+    Risposte dell'LLM indicizzate per testo normalizzato e per vettore di
+    n-grammi (gli stessi del classificatore di intent). Il lookup prova prima
+    la chiave esatta, poi il vicino più simile nella matrice: sopra la soglia,
+    con parole di contenuto in buona parte comuni e gli stessi numeri e nomi
+    propri (i vettori a n-grammi non distinguono "2 più 2" da "2 più 3"), la
+    risposta viene riusata. TTL per voce ed eviction LRU a capienza piena;
+    lo scope separa le risposte generate con prompt o modelli diversi
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX, ttl: float = RESPONSE_CACHE_TTL,
+                 threshold: float = RESPONSE_CACHE_THRESHOLD, min_overlap: float = RESPONSE_CACHE_MIN_OVERLAP,
+                 dim: int = FEATURE_DIM):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.dim = dim
+
+        # Matrice preallocata: una riga per slot, righe libere a zero
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._slot_scope = np.full(max_entries, -1, dtype=np.int32)
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._scopes: Dict[str, int] = {}
+        # (scope, testo normalizzato) -> slot, in ordine LRU
+        self._index: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._entries: Dict[int, Dict[str, Any]] = {}
+
+        self.counters = {
+            "hits_exact": 0,
+            "hits_semantic": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stored": 0,
+            "evicted": 0,
+            "expired": 0
+        }
+        self.saved_ms = 0.0
+
+    # ============== SLOT ==============
+
+    def _scope_id(self, scope: str) -> int:
+        return self._scopes.setdefault(scope, len(self._scopes))
+
+    def _release(self, slot: int):
+        entry = self._entries.pop(slot)
+        self._index.pop((entry["scope"], entry["key"]), None)
+        self._vectors[slot] = 0.0
+        self._slot_scope[slot] = -1
+        self._free.append(slot)
+
+    def _expired(self, slot: int, now: float) -> bool:
+        if now - self._entries[slot]["stored_at"] <= self.ttl:
+            return False
+        self._release(slot)
+        self.counters["expired"] += 1
+        return True
+
+    def _hit(self, slot: int, kind: str) -> str:
+        entry = self._entries[slot]
+        self._index.move_to_end((entry["scope"], entry["key"]))
+        entry["hits"] += 1
+        self.counters[kind] += 1
+        self.saved_ms += entry["latency_ms"]
+        return entry["reply"]
+
+    # ============== LOOKUP / STORE ==============
+
+    def cacheable(self, text: str) -> bool:
+        return RESPONSE_CACHE_ENABLED and bool(cache_key(text)) and not is_volatile(text)
+
+    def get(self, text: str, scope: str = "default") -> Optional[str]:
+        """Risposta già generata per questa domanda (o una quasi identica), altrimenti None"""
+        if not self.cacheable(text):
+            self.counters["bypassed"] += 1
+            return None
+
+        now = time.monotonic()
+        key = cache_key(text)
+        slot = self._index.get((scope, key))
+        if slot is not None and not self._expired(slot, now):
+            return self._hit(slot, "hits_exact")
+
+        scope_id = self._scopes.get(scope)
+        if scope_id is not None and self._entries:
+            similarity = self._vectors @ featurize(key, self.dim)
+            similarity[self._slot_scope != scope_id] = -1.0
+            slot = int(similarity.argmax())
+            if (similarity[slot] >= self.threshold
+                    and self._same_question(self._entries[slot], key, text)
+                    and not self._expired(slot, now)):
+                logger.debug(f"[RESPONSE_CACHE] {text!r} ~ {self._entries[slot]['key']!r} "
+                             f"({similarity[slot]:.2f})")
+                return self._hit(slot, "hits_semantic")
+
+        self.counters["misses"] += 1
+        return None
+
+    def _same_question(self, entry: Dict[str, Any], key: str, text: str) -> bool:
+        """Il vicino più simile è una parafrasi, non una domanda diversa con le stesse parole"""
+        return (entry["anchors"] == anchors(text)
+                and overlap(entry["words"], content_words(key)) >= self.min_overlap)
+
+    def put(self, text: str, reply: str, latency_ms: float, scope: str = "default"):
+        """Salva la risposta completa dell'LLM e quanto è costato generarla"""
+        if not reply or not self.cacheable(text):
+            return
+
+        key = cache_key(text)
+        slot = self._index.get((scope, key))
+        if slot is not None:
+            self._release(slot)
+        if not self._free:
+            _, oldest = self._index.popitem(last=False)
+            self._release(oldest)
+            self.counters["evicted"] += 1
+
+        slot = self._free.pop()
+        self._vectors[slot] = featurize(key, self.dim)
+        self._slot_scope[slot] = self._scope_id(scope)
+        self._entries[slot] = {
+            "scope": scope,
+            "key": key,
+            "words": content_words(key),
+            "anchors": anchors(text),
+            "reply": reply,
+            "latency_ms": latency_ms,
+            "stored_at": time.monotonic(),
+            "hits": 0
+        }
+        self._index[(scope, key)] = slot
+        self.counters["stored"] += 1
+
+    def clear(self):
+        for slot in list(self._entries):
+            self._release(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["hits_exact"] + self.counters["hits_semantic"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "saved_ms": round(self.saved_ms, 1)
+        }
+
+
+# Istanza condivisa
+response_cache = SemanticResponseCache()
@@ -1,47 +1,100 @@
-"""core/speak_edge.py - TTS Edge con fix async"""
+"""core/speak_edge.py - TTS Edge in memoria (stream async, nessun file temporaneo)"""
 import asyncio
-import os
 import tempfile
-import base64
+import threading
 import edge_tts
-from pathlib import Path
+from typing import AsyncIterator, Optional
 
-async def generate_tts_async(text: str, voice: str = "it-IT-DiegoNeural", rate: str = "+0%", pitch: str = "-12Hz"):
-    """Genera TTS async"""
+from core.tts_cache import tts_cache, make_key
+
+DEFAULT_VOICE = "it-IT-DiegoNeural"
+DEFAULT_RATE = "+0%"
+DEFAULT_PITCH = "-12Hz"
+
+
+async def stream_tts(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, pitch: str = DEFAULT_PITCH) -> AsyncIterator[bytes]:
+    """Produce i chunk audio (MP3) man mano che Edge li invia"""
+    communicate = edge_tts.Communicate(text, voice=voice, rate=rate, pitch=pitch)
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio" and chunk["data"]:
+            yield chunk["data"]
+
+
+async def _synthesize(text: str, voice: str, rate: str, pitch: str) -> Optional[bytes]:
     try:
-        output_file = tempfile.NamedTemporaryFile(suffix=".wav", delete=False).name
-        
-        # Genera audio
-        communicate = edge_tts.Communicate(text, voice=voice, rate=rate, pitch=pitch)
-        await communicate.save(output_file)
-        
-        return output_file
+        chunks = [chunk async for chunk in stream_tts(text, voice, rate, pitch)]
+        return b"".join(chunks) or None
     except Exception as e:
         print(f"[TTS] Errore: {e}")
         return None
 
 
-def speak_edge_sync(text: str, voice: str = "it-IT-DiegoNeural", rate: str = "+0%", pitch: str = "-12Hz"):
-    """Wrapper sync per TTS"""
+async def generate_tts_bytes(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, pitch: str = DEFAULT_PITCH) -> Optional[bytes]:
+    """Genera TTS async e ritorna i byte audio (con cache)"""
+    key = make_key(text, "edge", voice, rate, pitch, fmt="mp3")
+    return await tts_cache.get_or_create(key, lambda: _synthesize(text, voice, rate, pitch))
+
+
+async def stream_tts_cached(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, pitch: str = DEFAULT_PITCH) -> AsyncIterator[bytes]:
+    """
+    Come stream_tts, ma serve dalla cache se possibile e a fine stream
+    salva l'audio completo (per inoltrare i chunk subito al client)
+    """
+    key = make_key(text, "edge", voice, rate, pitch, fmt="mp3")
+    cached = await tts_cache.lookup(key)
+    if cached:
+        yield cached
+        return
+
+    chunks = []
+    async for chunk in stream_tts(text, voice, rate, pitch):
+        chunks.append(chunk)
+        yield chunk
+    if chunks:
+        await asyncio.to_thread(tts_cache.put, key, b"".join(chunks))
+
+
+async def generate_tts_async(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, pitch: str = DEFAULT_PITCH):
+    """Genera TTS async su file (compatibilità): ritorna il path"""
+    audio = await generate_tts_bytes(text, voice, rate, pitch)
+    if not audio:
+        return None
+    return await asyncio.to_thread(_write_temp, audio)
+
+
+def _write_temp(audio: bytes) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
+        f.write(audio)
+        return f.name
+
+
+# ============== WRAPPER SINCRONO ==============
+
+# Un solo event loop in background per i chiamanti sincroni,
+# invece di un loop/thread nuovo a ogni frase
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="edge-tts", daemon=True).start()
+        return _loop
+
+
+def speak_edge_sync(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE, pitch: str = DEFAULT_PITCH):
+    """Wrapper sync per TTS: ritorna il path di un file temporaneo (compatibilità)"""
     try:
-        # Crea nuovo event loop se necessario
-        try:
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            return loop.run_until_complete(generate_tts_async(text, voice, rate, pitch))
-        else:
-            # Se loop è già in esecuzione, crea task in thread
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                future = pool.submit(asyncio.run, generate_tts_async(text, voice, rate, pitch))
-                return future.result()
+        future = asyncio.run_coroutine_threadsafe(generate_tts_async(text, voice, rate, pitch), _background_loop())
+        return future.result()
     except Exception as e:
         print(f"[TTS] Errore sync: {e}")
         return None
 
 
-async def speak_edge(text: str):
-    """Main function - usa la versione corretta"""
-    return speak_edge_sync(text)
+async def speak_edge(text: str) -> Optional[bytes]:
+    """Main function - audio in memoria, senza bloccare l'event loop"""
+    return await generate_tts_bytes(text)
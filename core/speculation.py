@@ -0,0 +1,201 @@
+"""core/speculation.py - Prefetch speculativo dei dati dei tool mentre l'intent si sta ancora risolvendo"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from core.intent_engine import IntentEngine
+
+logger = logging.getLogger("JARVIS.Speculation")
+
+SPECULATION_ENABLED = os.environ.get("SPECULATION_ENABLED", "true").lower() == "true"
+# Un risultato speculativo non usato entro questo tempo viene scartato
+SPECULATION_TTL = float(os.environ.get("SPECULATION_TTL", "15"))
+
+# builder(testo, contesto) -> (argomento, coroutine) oppure None se l'argomento non è ancora noto
+SpeculationBuilder = Callable[[str, Dict[str, Any]], Optional[Tuple[str, Awaitable[Any]]]]
+
+
+class Speculation(NamedTuple):
+    arg: str
+    task: asyncio.Task
+    started_at: float
+
+
+class Speculator:
+    """
+    Segnali economici (keyword sul testo, anche parziale) avviano in anticipo
+    le fetch che l'intent finale probabilmente richiederà: meteo, numero di
+    un contatto, batteria. Una speculazione per tipo e sessione: se il testo
+    cambia argomento ("chiama Mar" -> "chiama Marco") quella vecchia viene
+    cancellata. Quando l'intent è deciso, resolve() cancella i tipi che non
+    servono; take() consegna il risultato a chi lo usa. Le speculazioni
+    "warm_only" riempiono una cache condivisa (meteo) e contano come hit
+    quando l'intent le conferma e la fetch termina senza errori
+    """
+
+    def __init__(self, ttl: float = SPECULATION_TTL):
+        self.ttl = ttl
+        self._signals = IntentEngine()
+        self._builders: Dict[str, SpeculationBuilder] = {}
+        self._warm_only: Dict[str, bool] = {}
+        self._sessions: Dict[str, Dict[str, Speculation]] = {}
+
+        self.counters = {
+            "started": 0,
+            "hits": 0,
+            "misses": 0,
+            "cancelled": 0,
+            "expired": 0
+        }
+
+    # ============== REGISTRAZIONE ==============
+
+    def register(self, kind: str, keywords: Iterable[str], builder: SpeculationBuilder, warm_only: bool = False):
+        """Tipo di speculazione: keyword che la fanno scattare e builder della fetch"""
+        self._signals.register(kind, keywords)
+        self._builders[kind] = builder
+        self._warm_only[kind] = warm_only
+
+    # ============== CICLO DI VITA ==============
+
+    def _cancel(self, session_id: str, kind: str, counter: str = "cancelled"):
+        spec = self._sessions.get(session_id, {}).pop(kind, None)
+        if spec is None:
+            return
+        if not spec.task.done():
+            spec.task.cancel()
+        self.counters[counter] += 1
+        self.counters["misses"] += 1
+        logger.debug(f"[SPECULATION] {session_id}: {kind}({spec.arg}) scartata ({counter})")
+
+    def _expire(self, now: float):
+        for session_id, specs in list(self._sessions.items()):
+            for kind, spec in list(specs.items()):
+                if now - spec.started_at > self.ttl:
+                    self._cancel(session_id, kind, "expired")
+            if not specs:
+                del self._sessions[session_id]
+
+    @staticmethod
+    def _consume_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.debug(f"[SPECULATION] Fetch fallita: {task.exception()}")
+
+    def _count_warm(self, task: asyncio.Task):
+        ok = not task.cancelled() and task.exception() is None
+        self.counters["hits" if ok else "misses"] += 1
+
+    def observe(self, session_id: str, text: str, context: Optional[Dict[str, Any]] = None):
+        """
+        Testo parziale o completo di una richiesta: avvia le fetch segnalate
+        dalle keyword (non blocca, va chiamato dentro l'event loop)
+        """
+        if not SPECULATION_ENABLED or not text:
+            return
+        now = time.monotonic()
+        self._expire(now)
+        context = context or {}
+
+        for kind in self._signals.scores(text):
+            try:
+                built = self._builders[kind](text, context)
+            except Exception as e:
+                logger.debug(f"[SPECULATION] Builder {kind} fallito: {e}")
+                continue
+            if built is None:
+                continue
+            arg, coro = built
+            specs = self._sessions.setdefault(session_id, {})
+            current = specs.get(kind)
+            if current is not None and current.arg == arg:
+                coro.close()
+                continue
+            if current is not None:
+                self._cancel(session_id, kind)
+
+            task = asyncio.ensure_future(coro)
+            task.add_done_callback(self._consume_error)
+            specs[kind] = Speculation(arg, task, now)
+            self.counters["started"] += 1
+            logger.debug(f"[SPECULATION] {session_id}: avviata {kind}({arg})")
+
+    def resolve(self, session_id: str, kinds: Iterable[str]):
+        """Intent deciso: tiene le speculazioni dei tipi indicati, cancella le altre"""
+        keep = set(kinds)
+        for kind in list(self._sessions.get(session_id, {})):
+            if kind not in keep:
+                self._cancel(session_id, kind)
+            elif self._warm_only[kind]:
+                # Il consumatore legge la cache condivisa: hit solo se la fetch va a buon fine
+                spec = self._sessions[session_id].pop(kind)
+                spec.task.add_done_callback(self._count_warm)
+
+    async def take(self, session_id: str, kind: str, arg: Optional[str] = None) -> Any:
+        """
+        Risultato della speculazione (attendendo la fetch se è ancora in corso),
+        oppure None se non c'è o riguardava un altro argomento
+        """
+        spec = self._sessions.get(session_id, {}).get(kind)
+        if spec is None:
+            return None
+        if arg is not None and spec.arg.casefold() != arg.casefold():
+            self._cancel(session_id, kind)
+            return None
+        self._sessions[session_id].pop(kind)
+        # wait() non propaga né errori né cancellazioni della fetch
+        await asyncio.wait({spec.task})
+        if spec.task.cancelled() or spec.task.exception():
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return spec.task.result()
+
+    def stats(self) -> Dict[str, Any]:
+        decided = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "pending": sum(len(specs) for specs in self._sessions.values()),
+            "hit_rate": round(self.counters["hits"] / decided, 3) if decided else 0.0
+        }
+
+
+# ============== SPECULAZIONI PREDEFINITE ==============
+
+def _weather_builder(text: str, context: Dict[str, Any]):
+    from services.geolocation.gazetteer import gazetteer
+    from services.weather.weather_cache import fetch_weather_at
+
+    api_key = context.get("weather_api_key")
+    place = gazetteer.extract(text)
+    if not api_key or place is None:
+        return None
+    return place.name, fetch_weather_at(place.lat, place.lon, api_key)
+
+
+def _contact_builder(text: str, context: Dict[str, Any]):
+    from device_handlers import DeviceCommandHandler
+
+    device_hub = context.get("device_hub")
+    contact = DeviceCommandHandler.extract_contact_name(text)
+    if device_hub is None or not contact:
+        return None
+    return contact, DeviceCommandHandler._find_contact_phone(contact, device_hub)
+
+
+def _battery_builder(text: str, context: Dict[str, Any]):
+    from core.actions_client import device_battery
+
+    device_id = context.get("device_id")
+    if not device_id:
+        return None
+    return device_id, device_battery(device_id)
+
+
+# Istanza condivisa
+speculator = Speculator()
+speculator.register("weather", ["meteo", "tempo", "pioggia", "temperatura", "gradi"], _weather_builder, warm_only=True)
+speculator.register("contact", ["chiama", "telefona", "whatsapp", "sms", "messaggio", "scrivi"], _contact_builder)
+speculator.register("battery", ["batteria", "carica"], _battery_builder)
@@ -0,0 +1,240 @@
+"""core/streaming_stt.py - Trascrizione in streaming: VAD locale a segmenti + Whisper per segmento"""
+
+import io
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.http_pool import http_clients
+from core.audio_preprocess import TARGET_RATE, resample, to_pcm16
+from core.audio_encoder import encode_upload
+
+logger = logging.getLogger("JARVIS.StreamingSTT")
+
+STT_MODEL = os.environ.get("STT_MODEL", "whisper-1")
+STT_LANGUAGE = os.environ.get("STT_LANGUAGE", "it")
+STT_PROMPT = "JARVIS Assistant"
+
+# VAD: frame da 20 ms su PCM16 mono
+VAD_FRAME_MS = 20
+# Parlato se l'energia supera il rumore di fondo di questo fattore (e la soglia minima)
+VAD_SPEECH_RATIO = float(os.environ.get("VAD_SPEECH_RATIO", "3.0"))
+VAD_MIN_RMS = float(os.environ.get("VAD_MIN_RMS", "300"))
+# Pausa che chiude un segmento (fine frase) e pausa che chiude l'enunciato
+VAD_SEGMENT_SILENCE_MS = int(os.environ.get("VAD_SEGMENT_SILENCE_MS", "300"))
+VAD_END_SILENCE_MS = int(os.environ.get("VAD_END_SILENCE_MS", "800"))
+VAD_MAX_SEGMENT_MS = int(os.environ.get("VAD_MAX_SEGMENT_MS", "6000"))
+VAD_PREROLL_MS = int(os.environ.get("VAD_PREROLL_MS", "200"))
+VAD_START_FRAMES = 3
+
+# ("segment", pcm) quando un segmento si chiude, ("end", b"") a fine enunciato
+VADEvent = Tuple[str, bytes]
+
+
+async def transcribe_upload(data: bytes, filename: str, prompt: str = STT_PROMPT) -> str:
+    """Whisper su un file audio (formato dedotto dall'estensione), sul client OpenAI condiviso"""
+    audio_file = io.BytesIO(data)
+    audio_file.name = filename
+    transcript = await http_clients.openai().audio.transcriptions.create(
+        model=STT_MODEL,
+        file=audio_file,
+        language=STT_LANGUAGE,
+        prompt=prompt
+    )
+    return transcript.text.strip()
+
+
+async def transcribe_wav(wav_bytes: bytes, prompt: str = STT_PROMPT) -> str:
+    return await transcribe_upload(wav_bytes, "audio.wav", prompt)
+
+
+async def transcribe_pcm(pcm: bytes, prompt: str = STT_PROMPT) -> str:
+    """PCM16 mono 16 kHz: codificato (Ogg/Opus se disponibile) prima dell'upload"""
+    data, filename = await asyncio.to_thread(encode_upload, pcm)
+    return await transcribe_upload(data, filename, prompt)
+
+
+class VADSegmenter:
+    """
+    VAD a energia con rumore di fondo adattivo. Taglia il parlato in
+    segmenti alle pause brevi (o alla lunghezza massima) e segnala la fine
+    dell'enunciato dopo una pausa lunga. Ogni segmento parte con un po' di
+    pre-roll, per non perdere l'attacco della prima sillaba
+    """
+
+    def __init__(self, sample_rate: int = 16000):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * VAD_FRAME_MS // 1000
+        self.frame_bytes = self.frame_samples * 2
+
+        self._pending = b""
+        self._preroll: Deque[bytes] = deque(maxlen=max(1, VAD_PREROLL_MS // VAD_FRAME_MS))
+        self._segment: List[bytes] = []
+        self._noise_floor: Optional[float] = None
+        self._speech_run = 0
+        self._silence_ms = 0
+        self._heard_speech = False
+        self._ended = False
+
+    @property
+    def in_speech(self) -> bool:
+        """Segmento di parlato aperto (non ancora chiuso da una pausa)"""
+        return bool(self._segment)
+
+    def _is_speech(self, frame: bytes) -> bool:
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        if self._noise_floor is None:
+            self._noise_floor = rms
+        speech = rms > max(self._noise_floor * VAD_SPEECH_RATIO, VAD_MIN_RMS)
+        if not speech:
+            # Il rumore di fondo segue l'ambiente solo nelle pause
+            self._noise_floor = 0.95 * self._noise_floor + 0.05 * rms
+        return speech
+
+    def _close_segment(self, events: List[VADEvent]):
+        if self._segment:
+            events.append(("segment", b"".join(self._segment)))
+            self._segment = []
+
+    def feed(self, pcm: bytes) -> List[VADEvent]:
+        events: List[VADEvent] = []
+        data = self._pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+
+        for offset in range(0, usable, self.frame_bytes):
+            frame = data[offset:offset + self.frame_bytes]
+            speech = self._is_speech(frame)
+
+            if not self._segment:
+                self._speech_run = self._speech_run + 1 if speech else 0
+                if self._speech_run < VAD_START_FRAMES:
+                    self._preroll.append(frame)
+                    if not speech and self._heard_speech and not self._ended:
+                        self._silence_ms += VAD_FRAME_MS
+                        if self._silence_ms >= VAD_END_SILENCE_MS:
+                            self._ended = True
+                            events.append(("end", b""))
+                    continue
+                # Inizio del parlato: il pre-roll contiene già i primi frame
+                self._segment = list(self._preroll) + [frame]
+                self._preroll.clear()
+                self._heard_speech = True
+                self._ended = False
+                self._silence_ms = 0
+                continue
+
+            self._segment.append(frame)
+            self._silence_ms = 0 if speech else self._silence_ms + VAD_FRAME_MS
+            if self._silence_ms >= VAD_SEGMENT_SILENCE_MS:
+                self._close_segment(events)
+                self._speech_run = 0
+            elif len(self._segment) * VAD_FRAME_MS >= VAD_MAX_SEGMENT_MS:
+                # Frase senza pause: taglio forzato, il parlato continua nel segmento successivo
+                self._close_segment(events)
+                self._speech_run = VAD_START_FRAMES
+                self._segment = []
+        return events
+
+    def flush(self) -> List[VADEvent]:
+        """Chiude il segmento aperto (fine stream dal client)"""
+        events: List[VADEvent] = []
+        # Il resto di meno di un frame completa solo un segmento già aperto:
+        # da solo sarebbe una clip minuscola per Whisper
+        if self._pending and self._segment:
+            self._segment.append(self._pending)
+        self._pending = b""
+        self._close_segment(events)
+        return events
+
+
+class StreamingTranscriber:
+    """
+    Riceve PCM16 in streaming: ogni segmento chiuso dal VAD viene trascritto
+    subito (in parallelo agli altri), e la trascrizione parziale in ordine
+    viene notificata a ogni nuovo segmento pronto. A fine parlato resta da
+    attendere solo l'ultimo segmento
+    """
+
+    def __init__(self, sample_rate: int = 16000,
+                 transcribe: Callable[[bytes], Awaitable[str]] = transcribe_pcm,
+                 on_partial: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.sample_rate = sample_rate
+        self.transcribe = transcribe
+        self.on_partial = on_partial
+
+        self.vad = VADSegmenter(sample_rate)
+        self._tasks: List[asyncio.Task] = []
+        self._texts: Dict[int, str] = {}
+        self._published = 0
+        self._ended_at: Optional[float] = None
+        self.stats = {"segments": 0, "audio_ms": 0, "final_delay_ms": None}
+
+    async def _transcribe(self, index: int, pcm: bytes):
+        if self.sample_rate != TARGET_RATE:
+            # Whisper lavora a 16 kHz: upload più piccolo a parità di contenuto
+            pcm = to_pcm16(resample(np.frombuffer(pcm, dtype="<i2") / 32768.0, self.sample_rate))
+        try:
+            text = await self.transcribe(pcm)
+        except Exception as e:
+            logger.warning(f"[STT] Segmento {index} non trascritto: {e}")
+            text = ""
+        self._texts[index] = text
+        await self._publish()
+
+    async def _publish(self):
+        # Solo il prefisso contiguo di segmenti pronti: il parziale non salta parole
+        ready = self._published
+        while ready in self._texts:
+            ready += 1
+        if ready == self._published:
+            return
+        self._published = ready
+        if self.on_partial:
+            await self.on_partial(self.text())
+
+    def _start(self, events: List[VADEvent]) -> bool:
+        ended = False
+        for kind, pcm in events:
+            if kind == "segment":
+                index = self.stats["segments"]
+                self.stats["segments"] += 1
+                self.stats["audio_ms"] += len(pcm) * 1000 // (2 * self.sample_rate)
+                self._tasks.append(asyncio.create_task(self._transcribe(index, pcm)))
+            elif kind == "end":
+                self._ended_at = time.perf_counter()
+                ended = True
+        return ended
+
+    def feed(self, pcm: bytes) -> bool:
+        """Nuovo audio; True quando il VAD rileva la fine dell'enunciato"""
+        return self._start(self.vad.feed(pcm))
+
+    @property
+    def has_speech(self) -> bool:
+        """False se non c'è nulla da trascrivere (es. stop arrivato dopo la fine rilevata dal VAD)"""
+        return self.stats["segments"] > 0 or self.vad.in_speech
+
+    def text(self) -> str:
+        return " ".join(t for i, t in sorted(self._texts.items()) if i < self._published and t)
+
+    async def finish(self) -> str:
+        """Chiude l'ultimo segmento, attende le trascrizioni e ritorna il testo finale"""
+        self._start(self.vad.flush())
+        ended_at = self._ended_at or time.perf_counter()
+        await asyncio.gather(*self._tasks)
+        self.stats["final_delay_ms"] = round((time.perf_counter() - ended_at) * 1000)
+        logger.info(f"[STT] {self.stats['segments']} segmenti, {self.stats['audio_ms']} ms di audio, "
+                    f"finale {self.stats['final_delay_ms']} ms dopo la fine del parlato")
+        return self.text()
+
+    async def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
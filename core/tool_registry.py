@@ -0,0 +1,124 @@
+"""core/tool_registry.py - Registro dei tool per il function calling (definizioni + handler)"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import importlib
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("JARVIS.ToolRegistry")
+
+TOOL_TIMEOUT = float(os.environ.get("TOOL_TIMEOUT", "5"))
+# Moduli dei servizi che espongono register_tools(registry)
+TOOL_MODULES = [
+    m.strip() for m in os.environ.get(
+        "TOOL_MODULES", "services.weather.weather_functions,services.device_control.device_functions"
+    ).split(",") if m.strip()
+]
+
+# handler(context, **argomenti) -> risultato serializzabile in JSON
+ToolHandler = Callable[..., Awaitable[Any]]
+
+
+class ToolRegistry:
+    """
+    Tool disponibili al modello: definizione in formato OpenAI, handler
+    async e timeout per tool. Ogni pacchetto di servizi registra i propri
+    tool con register_tools(registry); le chiamate di un turno vengono
+    eseguite in parallelo e ogni errore diventa un risultato per il modello
+    """
+
+    def __init__(self, default_timeout: float = TOOL_TIMEOUT):
+        self.default_timeout = default_timeout
+        self._tools: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self.counters = {"calls": 0, "errors": 0, "timeouts": 0}
+
+    # ============== REGISTRAZIONE ==============
+
+    def register(self, definition: Dict[str, Any], handler: ToolHandler, timeout: Optional[float] = None):
+        """Aggiunge un tool da una definizione {"type": "function", "function": {...}}"""
+        name = definition["function"]["name"]
+        if name in self._tools:
+            logger.warning(f"[TOOLS] {name} registrato due volte, vale l'ultimo")
+        self._tools[name] = {
+            "definition": definition,
+            "handler": handler,
+            "timeout": timeout or self.default_timeout
+        }
+
+    def register_definitions(self, definitions: Iterable[Dict[str, Any]], handlers: Dict[str, ToolHandler],
+                             timeout: Optional[float] = None):
+        """Registra le definizioni che hanno un handler (le altre vengono ignorate)"""
+        for definition in definitions:
+            handler = handlers.get(definition["function"]["name"])
+            if handler:
+                self.register(definition, handler, timeout)
+
+    def load_services(self, modules: Iterable[str] = TOOL_MODULES):
+        """Importa i moduli dei servizi e chiama il loro register_tools (una volta)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        for module_name in modules:
+            try:
+                importlib.import_module(module_name).register_tools(self)
+            except Exception as e:
+                logger.warning(f"[TOOLS] {module_name} non disponibile: {e}")
+        logger.info(f"[TOOLS] {len(self._tools)} tool registrati: {', '.join(self._tools)}")
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        self.load_services()
+        return [tool["definition"] for tool in self._tools.values()]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    # ============== ESECUZIONE ==============
+
+    async def call(self, name: str, arguments: str, context: Optional[Dict[str, Any]] = None) -> Any:
+        """Esegue un tool; errori e timeout tornano come {"error": ...} per il modello"""
+        tool = self._tools.get(name)
+        if tool is None:
+            return {"error": f"Tool sconosciuto: {name}"}
+        self.counters["calls"] += 1
+        started = time.perf_counter()
+        try:
+            kwargs = json.loads(arguments or "{}")
+            handler = tool["handler"]
+            if "context" in inspect.signature(handler).parameters:
+                kwargs["context"] = context or {}
+            result = await asyncio.wait_for(handler(**kwargs), tool["timeout"])
+            logger.info(f"[TOOLS] {name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return result
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            logger.warning(f"[TOOLS] {name} oltre {tool['timeout']}s")
+            return {"error": f"{name}: timeout"}
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"[TOOLS] {name} fallito: {e}")
+            return {"error": f"{name}: {e}"}
+
+    async def run_calls(self, tool_calls, context: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+        """Tutte le chiamate di un turno in parallelo: un messaggio "tool" per chiamata, nello stesso ordine"""
+        results = await asyncio.gather(*(
+            self.call(call.function.name, call.function.arguments, context) for call in tool_calls
+        ))
+        return [
+            {"role": "tool", "tool_call_id": call.id, "content": json.dumps(result, ensure_ascii=False, default=str)}
+            for call, result in zip(tool_calls, results)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "tools": len(self._tools)}
+
+
+# Registro condiviso (servizi caricati al primo uso)
+tool_registry = ToolRegistry()
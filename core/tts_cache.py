@@ -0,0 +1,307 @@
+"""core/tts_cache.py - Cache audio TTS content-addressed (memoria LRU + disco)"""
+
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger("JARVIS.TTSCache")
+
+BASE_DIR = Path(__file__).parent.parent
+
+TTS_CACHE_ENABLED = os.environ.get("TTS_CACHE_ENABLED", "true").lower() != "false"
+TTS_CACHE_DIR = Path(os.environ.get("TTS_CACHE_DIR", str(BASE_DIR / ".cache" / "tts")))
+TTS_CACHE_MEMORY_MB = float(os.environ.get("TTS_CACHE_MEMORY_MB", "32"))
+TTS_CACHE_DISK_MB = float(os.environ.get("TTS_CACHE_DISK_MB", "256"))
+
+
+def make_key(text: str, provider: str, voice: str, rate: str = "", pitch: str = "", fmt: str = "mp3") -> str:
+    """Chiave content-addressed: hash di testo + parametri di sintesi"""
+    raw = "\x1f".join([provider, voice, str(rate), str(pitch), fmt, text.strip()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _OwnerCancelled(Exception):
+    """La sintesi single-flight è stata cancellata: chi la attendeva riprova"""
+
+
+class TTSCache:
+    """
+    Cache a due livelli per l'audio sintetizzato
+    - memoria: LRU limitata in byte
+    - disco: file <chiave>.bin con tetto di dimensione, eviction LRU
+    Richieste concorrenti per la stessa chiave sintetizzano una sola volta.
+    """
+
+    def __init__(self, disk_dir: Optional[Path] = TTS_CACHE_DIR,
+                 max_memory_bytes: int = int(TTS_CACHE_MEMORY_MB * 1024 * 1024),
+                 max_disk_bytes: int = int(TTS_CACHE_DISK_MB * 1024 * 1024)):
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index: Optional["OrderedDict[str, int]"] = None
+        self._disk_bytes = 0
+        self._inflight: Dict[str, Future] = {}
+
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+
+    # ============== MEMORIA ==============
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+            return audio
+
+    def _put_memory(self, key: str, audio: bytes):
+        if len(audio) > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = audio
+            self._memory_bytes += len(audio)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+                self.counters["memory_evictions"] += 1
+
+    # ============== DISCO ==============
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.bin"
+
+    def _load_disk_index(self):
+        """
+        Scansione iniziale della cartella (ordine LRU da mtime). mkdir e glob
+        girano fuori dal lock: un lookup in memoria non attende mai il disco
+        """
+        if self._disk_index is not None:
+            return
+        index = OrderedDict()
+        total = 0
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            entries = [(p.stat().st_mtime, p.stem, p.stat().st_size) for p in self.disk_dir.glob("*.bin")]
+            for _, key, size in sorted(entries):
+                index[key] = size
+                total += size
+        except Exception as e:
+            logger.warning(f"[TTS_CACHE] Disco non disponibile: {e}")
+        with self._lock:
+            # Due thread possono scansionare insieme: vale il primo indice installato
+            if self._disk_index is None:
+                self._disk_index = index
+                self._disk_bytes = total
+
+    def _get_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        self._load_disk_index()
+        with self._lock:
+            if key not in self._disk_index:
+                return None
+            self._disk_index.move_to_end(key)
+        try:
+            path = self._path(key)
+            audio = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk_index.pop(key, 0)
+            return None
+        with self._lock:
+            self.counters["disk_hits"] += 1
+        return audio
+
+    def _put_disk(self, key: str, audio: bytes):
+        if not self.disk_dir or len(audio) > self.max_disk_bytes:
+            return
+        self._load_disk_index()
+        try:
+            path = self._path(key)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(audio)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"[TTS_CACHE] Scrittura fallita: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._disk_bytes -= self._disk_index.pop(key, 0)
+            self._disk_index[key] = len(audio)
+            self._disk_bytes += len(audio)
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk_index) > 1:
+                old_key, size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_key)
+                self.counters["disk_evictions"] += 1
+
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+    # ============== API ==============
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Lookup sincrono (memoria, poi disco con promozione in memoria): nell'event loop usare lookup()"""
+        audio = self._get_memory(key)
+        if audio is None:
+            audio = self._get_disk(key)
+            if audio is not None:
+                self._put_memory(key, audio)
+        return audio
+
+    async def lookup(self, key: str) -> Optional[bytes]:
+        """Lookup dall'event loop: memoria sul posto, disco in un thread"""
+        audio = self._get_memory(key)
+        if audio is not None:
+            return audio
+        audio = await asyncio.to_thread(self._get_disk, key)
+        if audio is not None:
+            self._put_memory(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        """Salva l'audio in entrambi i livelli"""
+        self._put_memory(key, audio)
+        self._put_disk(key, audio)
+
+    def _claim(self, key: str):
+        """Single-flight: (future, owner) - owner=True se tocca a noi sintetizzare"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.counters["misses"] += 1
+            return future, True
+
+    def _release(self, key: str, future: Future):
+        with self._lock:
+            # Solo la propria claim: dopo una cancellazione un waiter può averne già presa una nuova
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    @staticmethod
+    def _resolve(future: Future, audio: Optional[bytes] = None, error: Optional[BaseException] = None):
+        """Completa la future condivisa una volta sola (mai un InvalidStateError nel percorso d'errore)"""
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(audio)
+
+    async def get_or_create(self, key: str, synthesize: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        """
+        Ritorna l'audio dalla cache o lo sintetizza una sola volta
+        (le richieste identiche concorrenti attendono la stessa sintesi)
+        """
+        if not TTS_CACHE_ENABLED:
+            return await synthesize()
+
+        audio = await self.lookup(key)
+        if audio is not None:
+            return audio
+
+        while True:
+            future, owner = self._claim(key)
+            if owner:
+                break
+            try:
+                # shield: un waiter cancellato (client disconnesso) non cancella la future condivisa
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _OwnerCancelled:
+                continue
+
+        try:
+            audio = await synthesize()
+            if audio:
+                self._put_memory(key, audio)
+                await asyncio.to_thread(self._put_disk, key, audio)
+            self._resolve(future, audio)
+            return audio
+        except asyncio.CancelledError:
+            # Perdente di un hedge o client disconnesso: la cancellazione riguarda solo
+            # questa richiesta, i waiter sulla stessa chiave riprovano
+            self._release(key, future)
+            self._resolve(future, error=_OwnerCancelled())
+            raise
+        except BaseException as e:
+            self._resolve(future, error=e)
+            raise
+        finally:
+            self._release(key, future)
+
+    def get_or_create_sync(self, key: str, synthesize: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        """Versione sincrona di get_or_create (per codice non async)"""
+        if not TTS_CACHE_ENABLED:
+            return synthesize()
+
+        audio = self.get(key)
+        if audio is not None:
+            return audio
+
+        while True:
+            future, owner = self._claim(key)
+            if owner:
+                break
+            try:
+                return future.result()
+            except _OwnerCancelled:
+                continue
+
+        try:
+            audio = synthesize()
+            if audio:
+                self.put(key, audio)
+            self._resolve(future, audio)
+            return audio
+        except BaseException as e:
+            self._resolve(future, error=e)
+            raise
+        finally:
+            self._release(key, future)
+
+    def stats(self) -> Dict[str, float]:
+        """Contatori hit/miss e occupazione"""
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_items": len(self._disk_index or {}),
+                "disk_bytes": self._disk_bytes
+            }
+
+
+# Istanza globale condivisa da tutti i percorsi TTS
+tts_cache = TTSCache()
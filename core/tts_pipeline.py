@@ -0,0 +1,101 @@
+"""core/tts_pipeline.py - TTS a frasi in pipeline sullo stream LLM"""
+
+import re
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger("JARVIS.TTSPipeline")
+
+# Fine frase: punteggiatura forte (eventualmente chiusa da virgolette/parentesi)
+# seguita da spazio, oppure un a capo
+_SENTENCE_END = re.compile(r'[.!?…]+["»)\]]*\s+|\n+')
+
+
+class SentenceSplitter:
+    """Accumula i delta dello stream e restituisce le frasi complete"""
+
+    def __init__(self, min_chars: int = 12):
+        # Frasi più corte vengono unite alla successiva ("Sì. Certo, signore.")
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """Aggiunge un delta, ritorna le frasi completate"""
+        self._buffer += delta
+        sentences = []
+        start = 0
+
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Ritorna il testo residuo a fine stream"""
+        tail = self._buffer.strip()
+        self._buffer = ""
+        return tail or None
+
+
+async def synthesize_sentences(
+    deltas: AsyncIterator[str],
+    tts: Callable[[str], Awaitable[Optional[bytes]]],
+    max_pending: int = 3
+) -> AsyncIterator[Tuple[int, str, Optional[bytes]]]:
+    """
+    Sintetizza ogni frase appena completata, mentre lo stream continua
+
+    Args:
+        deltas: stream di frammenti di testo (es. token LLM)
+        tts: funzione async testo → audio (None se fallisce)
+        max_pending: frasi in sintesi contemporaneamente prima di
+            rallentare la lettura dello stream
+
+    Yields:
+        (seq, frase, audio) in ordine di frase, seq da 0
+
+    Gli errori dello stream vengono propagati dopo l'ultima frase.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+
+    async def producer():
+        splitter = SentenceSplitter()
+        try:
+            async for delta in deltas:
+                for sentence in splitter.feed(delta):
+                    await queue.put((sentence, asyncio.create_task(tts(sentence))))
+            tail = splitter.flush()
+            if tail:
+                await queue.put((tail, asyncio.create_task(tts(tail))))
+        finally:
+            await queue.put(None)
+
+    producer_task = asyncio.create_task(producer())
+    seq = 0
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            sentence, task = item
+            audio = await task
+            logger.debug(f"[PIPELINE] #{seq} pronta: {sentence[:40]}")
+            yield seq, sentence, audio
+            seq += 1
+
+        # Propaga eventuali errori dello stream di testo
+        await producer_task
+
+    finally:
+        producer_task.cancel()
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                item[1].cancel()
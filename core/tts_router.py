@@ -0,0 +1,166 @@
+"""core/tts_router.py - Router TTS con richieste hedged tra più provider"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("JARVIS.TTSRouter")
+
+
+class LatencyHistogram:
+    """Finestra mobile delle ultime chiamate: latenze (successi) e fallimenti"""
+
+    def __init__(self, window: int = 100):
+        self._samples = deque(maxlen=window)  # (latency_s, ok)
+
+    def record(self, latency: float, ok: bool):
+        self._samples.append((latency, ok))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentile p (0-1) delle latenze riuscite, None senza dati"""
+        latencies = sorted(latency for latency, ok in self._samples if ok)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(p * len(latencies)))
+        return latencies[index]
+
+    def failure_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+
+class TTSProvider:
+    """Un backend TTS: funzione async testo → audio (None se fallisce)"""
+
+    def __init__(self, name: str, synthesize: Callable[..., Awaitable[Optional[bytes]]],
+                 available: bool = True):
+        self.name = name
+        self.synthesize = synthesize
+        self.available = available
+        self.histogram = LatencyHistogram()
+        self.wins = 0
+        self.hedged = 0
+        self.cancelled = 0
+
+
+class TTSRouter:
+    """
+    Ordina i provider per latenza osservata e, se il primo non risponde
+    entro il suo p90, lancia in parallelo il successivo: vince il primo
+    audio valido, le richieste perdenti vengono cancellate
+    """
+
+    def __init__(self, providers: List[TTSProvider], hedge_percentile: float = 0.9,
+                 default_deadline: float = 1.5, min_deadline: float = 0.3,
+                 max_deadline: float = 5.0, min_samples: int = 5):
+        self.providers = providers
+        self.hedge_percentile = hedge_percentile
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.min_samples = min_samples
+
+    def _score(self, provider: TTSProvider) -> Tuple[int, float]:
+        """Costo atteso: mediana penalizzata dal tasso di errore"""
+        if len(provider.histogram) < self.min_samples:
+            return 1, 0.0  # pochi dati: dopo i provider misurati, nell'ordine configurato
+        p50 = provider.histogram.percentile(0.5)
+        if p50 is None:
+            return 2, float("inf")  # misurato senza alcun successo: in fondo, dopo i non misurati
+        return 0, p50 * (1 + 3 * provider.histogram.failure_rate())
+
+    def ordered(self) -> List[TTSProvider]:
+        """Provider disponibili: misurati dal più veloce, poi i non misurati, infine quelli sempre falliti"""
+        available = [p for p in self.providers if p.available]
+        return sorted(available, key=self._score)
+
+    def deadline(self, provider: TTSProvider) -> float:
+        """Attesa prima di lanciare la richiesta hedged"""
+        if len(provider.histogram) < self.min_samples:
+            return self.default_deadline
+        latency = provider.histogram.percentile(self.hedge_percentile)
+        if latency is None:
+            return self.min_deadline
+        return max(self.min_deadline, min(self.max_deadline, latency))
+
+    async def _call(self, provider: TTSProvider, text: str, options: Dict[str, Any]) -> Optional[bytes]:
+        started = time.perf_counter()
+        try:
+            audio = await provider.synthesize(text, **options)
+        except asyncio.CancelledError:
+            # Perdente di un hedge o richiesta abbandonata: il tempo trascorso è solo un
+            # limite inferiore della latenza, registrarlo abbasserebbe il p50. Non entra nel campione
+            provider.cancelled += 1
+            raise
+        except Exception as e:
+            logger.warning(f"[TTS_ROUTER] {provider.name} errore: {e}")
+            audio = None
+        provider.histogram.record(time.perf_counter() - started, bool(audio))
+        if audio:
+            provider.wins += 1
+        return audio
+
+    async def _first_valid(self, pending: Set[asyncio.Task], timeout: Optional[float]) -> Optional[bytes]:
+        """Primo audio valido tra i task in corso (None a timeout o se falliscono tutti)"""
+        loop = asyncio.get_running_loop()
+        end = None if timeout is None else loop.time() + timeout
+
+        while pending:
+            remaining = None if end is None else end - loop.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                return None
+            for task in done:
+                pending.discard(task)
+                if not task.cancelled() and task.exception() is None and task.result():
+                    return task.result()
+        return None
+
+    async def synthesize(self, text: str, **options) -> Optional[bytes]:
+        """Sintetizza con hedging; options vengono passate a ogni provider"""
+        order = self.ordered()
+        pending: Set[asyncio.Task] = set()
+
+        try:
+            for i, provider in enumerate(order):
+                if i > 0:
+                    provider.hedged += 1
+                    logger.info(f"[TTS_ROUTER] Hedge → {provider.name}")
+                pending.add(asyncio.create_task(self._call(provider, text, options)))
+
+                is_last = i == len(order) - 1
+                audio = await self._first_valid(pending, None if is_last else self.deadline(provider))
+                if audio:
+                    return audio
+            return None
+
+        finally:
+            # Cancella le richieste perdenti
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Latenze (ms), tasso di errore e vittorie per provider"""
+        result = {}
+        for provider in self.providers:
+            p50 = provider.histogram.percentile(0.5)
+            p90 = provider.histogram.percentile(0.9)
+            result[provider.name] = {
+                "available": provider.available,
+                "samples": len(provider.histogram),
+                "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                "p90_ms": round(p90 * 1000) if p90 is not None else None,
+                "failure_rate": round(provider.histogram.failure_rate(), 3),
+                "wins": provider.wins,
+                "hedged": provider.hedged,
+                "cancelled": provider.cancelled
+            }
+        return result
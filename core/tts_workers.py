@@ -0,0 +1,116 @@
+"""core/tts_workers.py - Pool limitato per le chiamate TTS bloccanti"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger("JARVIS.TTSWorkers")
+
+TTS_MAX_WORKERS = int(os.environ.get("TTS_MAX_WORKERS", "4"))
+TTS_MAX_QUEUE = int(os.environ.get("TTS_MAX_QUEUE", "32"))
+
+
+class SynthesisQueueFull(RuntimeError):
+    """Troppe sintesi in attesa: la richiesta viene rifiutata subito"""
+
+
+class SynthesisPool:
+    """
+    Esegue le sintesi bloccanti (client TTS sincroni) su thread dedicati,
+    così una chiamata lenta non blocca l'event loop degli altri utenti
+    """
+
+    def __init__(self, max_workers: int = TTS_MAX_WORKERS, max_queue: int = TTS_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._lock = threading.Lock()
+
+        self.waiting = 0
+        self.active = 0
+        self.counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_queue_depth": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0
+        }
+
+    def _execute(self, call: Callable[[], Any], submitted_at: float, state: Dict[str, bool]):
+        """Gira nel thread worker: aggiorna le metriche attorno alla chiamata"""
+        started_at = time.perf_counter()
+        with self._lock:
+            if state["abandoned"]:
+                # Il chiamante ha rinunciato prima che partisse
+                return None
+            state["started"] = True
+            self.waiting -= 1
+            self.active += 1
+            self.counters["total_wait_ms"] += (started_at - submitted_at) * 1000
+        try:
+            return call()
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.counters["total_run_ms"] += (time.perf_counter() - started_at) * 1000
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Esegue fn(*args, **kwargs) nel pool e ne attende il risultato
+
+        Raises:
+            SynthesisQueueFull: se le richieste in attesa superano max_queue
+        """
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise SynthesisQueueFull(f"{self.waiting} sintesi in coda")
+            self.waiting += 1
+            self.counters["submitted"] += 1
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self.waiting)
+
+        loop = asyncio.get_running_loop()
+        call = partial(fn, *args, **kwargs)
+        state = {"started": False, "abandoned": False}
+        try:
+            result = await loop.run_in_executor(
+                self._executor, self._execute, call, time.perf_counter(), state
+            )
+        except BaseException:
+            with self._lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+                    self.waiting -= 1
+                self.counters["failed"] += 1
+            raise
+
+        with self._lock:
+            self.counters["completed"] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Profondità coda, worker attivi e tempi medi"""
+        with self._lock:
+            done = self.counters["completed"] + self.counters["failed"]
+            return {
+                **self.counters,
+                "max_workers": self.max_workers,
+                "queue_depth": self.waiting,
+                "active": self.active,
+                "avg_wait_ms": round(self.counters["total_wait_ms"] / done, 1) if done else 0.0,
+                "avg_run_ms": round(self.counters["total_run_ms"] / done, 1) if done else 0.0
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Pool condiviso da tutti i percorsi TTS
+tts_pool = SynthesisPool()
@@ -2,8 +2,11 @@
 import pyaudio
 import numpy as np
 import logging
-import keyboard
-from threading import Thread, Event
+from typing import Optional
+
+from core.audio_capture import AudioCapture
+from core.audio_preprocess import preprocess_pcm
+from core.push_to_talk import PTT_SOURCE, KeyboardSource, PushToTalk, build_source
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -11,7 +14,7 @@ logger = logging.getLogger(__name__)
 class WakeWordListener:
     """Ascolta comandi via PTT (tasto premuto) o via wake word ('Jarvis')"""
     
-    def __init__(self, ptt_key='space'):
+    def __init__(self, ptt_key='space', ptt: Optional[PushToTalk] = None):
         self.CHUNK = 2048
         self.FORMAT = 16
         self.CHANNELS = 1
@@ -21,145 +24,145 @@ class WakeWordListener:
         self.PTT_KEY = ptt_key  # Tasto per Push-To-Talk (spazio)
         
         self.pa = pyaudio.PyAudio()
-        self.stream = None
-        self.ptt_active = Event()
+        # Cattura continua in un thread dedicato: nessun buco tra wake word e comando
+        self.capture = AudioCapture(self.pa, self.RATE, self.CHUNK)
+        self._command_start: Optional[int] = None
+        
+        # PTT condivisibile: un WebSocket o una linea GPIO possono chiamare ptt.handle("down"/"up")
+        self._owns_ptt = ptt is None
+        self.ptt = ptt or PushToTalk()
+        self.ptt_active = self.ptt.active
         
         logger.info("[WAKE] Listener inizializzato")
         logger.info(f"[WAKE] Supporta: Wake word 'Jarvis' oppure PTT ({ptt_key})")
         
-        # Avvia listener del tasto PTT in background
-        self._start_ptt_listener()
+        if self._owns_ptt:
+            self._start_ptt_listener()
     
     def _start_ptt_listener(self):
-        """Background thread che ascolta il tasto PTT"""
-        def ptt_handler():
-            logger.info(f"[PTT] Listener attivo per tasto '{self.PTT_KEY}'")
-            while True:
-                try:
-                    if keyboard.is_pressed(self.PTT_KEY):
-                        self.ptt_active.set()
-                        logger.info("[PTT] ✅ Tasto premuto - registrazione avviata")
-                        while keyboard.is_pressed(self.PTT_KEY):
-                            pass
-                        self.ptt_active.clear()
-                        logger.info("[PTT] Tasto rilasciato - registrazione completata")
-                except:
-                    pass
-        
-        thread = Thread(target=ptt_handler, daemon=True)
-        thread.start()
+        """Sorgente PTT a eventi (hook key-down/key-up o evdev): nessun polling del tasto"""
+        source = KeyboardSource(self.PTT_KEY) if PTT_SOURCE == "keyboard" else build_source()
+        if source is not None:
+            self.ptt.add_source(source)
+    
+    def _db(self, audio: np.ndarray) -> float:
+        # dBFS, in float: il quadrato di un int16 va in overflow
+        rms = np.sqrt(np.mean(np.square(audio, dtype=np.float32))) / 32768.0
+        return 20 * np.log10(rms + 1e-10)
     
     def listen_for_wake_word(self, timeout=30):
         """Ascolta la wake word 'Jarvis' oppure attende PTT"""
         logger.info("[WAKE] In ascolto della wake word 'Jarvis' o PTT...")
         
         try:
-            if self.stream is None:
-                self.stream = self.pa.open(
-                    format=self.pa.get_format_from_width(self.FORMAT // 8),
-                    channels=self.CHANNELS,
-                    rate=self.RATE,
-                    input=True,
-                    frames_per_buffer=self.CHUNK,
-                    exception_on_overflow=False
-                )
+            self.capture.start()
+            ring = self.capture.ring
+            cursor = self.capture.position
             
             while True:
-                # Modalità 1: PTT attivo?
+                # Modalità 1: PTT attivo? Il comando parte dalla pressione, pre-roll incluso
                 if self.ptt_active.is_set():
                     logger.info("[WAKE] 🎙️ PTT attivo - procedi direttamente al comando")
+                    self._command_start = self.capture.preroll_start()
                     return True
                 
                 # Modalità 2: Ascolta wake word
-                data = self.stream.read(self.CHUNK, exception_on_overflow=False)
-                audio = np.frombuffer(data, dtype=np.int16)
+                cursor = max(cursor, ring.oldest)
+                audio = self.capture.next_chunk(cursor, timeout=0.1)
+                if audio is None:
+                    continue
                 
-                rms = np.sqrt(np.mean(audio ** 2))
-                db = 20 * np.log10(rms + 1e-10)
+                db = self._db(audio)
                 
                 if db > self.THRESHOLD_DB:
                     logger.debug(f"[WAKE] Audio rilevato (DB: {db:.1f})")
-                    # Accumula buffer
-                    audio_buffer = list(audio)
-                    for _ in range(10):  # Accumula ~20ms
-                        try:
-                            data = self.stream.read(self.CHUNK, exception_on_overflow=False)
-                            audio = np.frombuffer(data, dtype=np.int16)
-                            audio_buffer.extend(audio)
-                        except:
-                            pass
-                    
-                    full_audio = np.array(audio_buffer, dtype=np.int16)
-                    if len(full_audio) > self.RATE // 2:
-                        if self._contains_wake_word(full_audio):
-                            logger.info("[WAKE] ✅ 'Jarvis' riconosciuto!")
-                            return True
+                    # Finestra di ~1.4 s dall'inizio del suono: vista sul ring buffer,
+                    # la cattura prosegue nel suo thread durante l'analisi
+                    window_end = cursor + 11 * self.CHUNK
+                    if not ring.wait(window_end, timeout=2):
+                        continue
+                    full_audio = ring.read(cursor, window_end)
+                    cursor = window_end
+                    if self._contains_wake_word(full_audio):
+                        logger.info("[WAKE] ✅ 'Jarvis' riconosciuto!")
+                        self._command_start = self.capture.preroll_start(window_end)
+                        return True
+                else:
+                    cursor += len(audio)
         
         except Exception as e:
             logger.error(f"[WAKE] Error: {e}")
             return False
     
     def listen_for_command(self, timeout=10):
-        """Ascolta il comando vocale"""
+        """Ascolta il comando vocale (timeout: attesa massima dell'inizio del parlato)"""
         logger.info("[COMMAND] In ascolto del comando...")
         
         try:
-            if self.stream is None:
-                self.stream = self.pa.open(
-                    format=self.pa.get_format_from_width(self.FORMAT // 8),
-                    channels=self.CHANNELS,
-                    rate=self.RATE,
-                    input=True,
-                    frames_per_buffer=self.CHUNK,
-                    exception_on_overflow=False
-                )
-            
-            audio_frames = []
-            silent_chunks = 0
-            max_silent_chunks = int(self.RATE / self.CHUNK * self.SILENCE_DURATION)
-            speech_started = False
-            
-            while True:
-                try:
-                    # Se PTT è premuto, ascolta
-                    if self.ppt_active.is_set() or not speech_started:
-                        data = self.stream.read(self.CHUNK, exception_on_overflow=False)
-                        audio = np.frombuffer(data, dtype=np.int16)
-                        
-                        rms = np.sqrt(np.mean(audio ** 2))
-                        db = 20 * np.log10(rms + 1e-10)
-                        
-                        if db > self.THRESHOLD_DB:
-                            speech_started = True
-                            silent_chunks = 0
-                            audio_frames.append(audio)
-                        else:
-                            if speech_started:
-                                silent_chunks += 1
-                                audio_frames.append(audio)
-                                
-                                # Se PTT è attivo e il tasto è rilasciato, interrompi
-                                if not self.ppt_active.is_set() and silent_chunks > max_silent_chunks:
-                                    logger.info("[COMMAND] Fine comando rilevata")
-                                    break
-                    else:
-                        # PTT non attivo ma speech non iniziato
-                        break
-                
-                except Exception as e:
-                    logger.error(f"[COMMAND] Audio error: {e}")
-                    continue
+            self.capture.start()
+            ring = self.capture.ring
+            command_start = self._command_start
+            if command_start is None:
+                command_start = self.capture.preroll_start()
+            self._command_start = None
+            command_start = max(command_start, ring.oldest)
+            # Margine di 1 s: la registrazione non deve raggiungere la coda del buffer
+            max_samples = ring.capacity - self.RATE
             
-            if audio_frames:
-                full_audio = np.concatenate(audio_frames)
-                return full_audio.tobytes()
+            if self.ptt_active.is_set():
+                # PTT: tutto l'audio dalla pressione (pre-roll incluso) al rilascio, senza polling
+                if not self.ptt.wait_released(timeout=max_samples / self.RATE):
+                    logger.warning("[COMMAND] PTT oltre la capacità del buffer: troncato")
+                end = self.capture.position
+                start = max(command_start, end - max_samples)
+            else:
+                start, end = self._record_until_silence(command_start, max_samples, timeout)
+                if start is None:
+                    return None
             
-            return None
+            # Vista sul ring buffer: la prima copia è la conversione in float del preprocessing
+            clip = preprocess_pcm(ring.read(start, end), self.RATE)
+            return clip.pcm if clip else None
         
         except Exception as e:
             logger.error(f"[COMMAND] Error: {e}")
             return None
     
+    def _record_until_silence(self, command_start, max_samples, timeout):
+        """VAD sui chunk del ring buffer: (inizio, fine) del comando, (None, None) se nessuno parla"""
+        ring = self.capture.ring
+        start = cursor = command_start
+        silent_chunks = 0
+        max_silent_chunks = int(self.RATE / self.CHUNK * self.SILENCE_DURATION)
+        speech_started = False
+        
+        while True:
+            cursor = max(cursor, ring.oldest)
+            audio = self.capture.next_chunk(cursor)
+            if audio is None:
+                continue
+            
+            if self._db(audio) > self.THRESHOLD_DB:
+                if not speech_started:
+                    # Pre-roll prima dell'attacco, senza risalire oltre l'inizio del comando
+                    start = max(command_start, self.capture.preroll_start(cursor))
+                speech_started = True
+                silent_chunks = 0
+            elif speech_started:
+                silent_chunks += 1
+            cursor += len(audio)
+            
+            if not speech_started:
+                if cursor - command_start > timeout * self.RATE:
+                    logger.info("[COMMAND] Nessun comando")
+                    return None, None
+            elif silent_chunks > max_silent_chunks:
+                logger.info("[COMMAND] Fine comando rilevata")
+                return start, cursor
+            elif cursor - start >= max_samples:
+                logger.warning("[COMMAND] Comando oltre la capacità del buffer: troncato")
+                return start, cursor
+    
     def _contains_wake_word(self, audio: np.ndarray) -> bool:
         """Rileva 'Jarvis' con pattern semplice"""
         if len(audio) < self.RATE // 2:
@@ -185,8 +188,8 @@ class WakeWordListener:
     
     def stop(self):
         """Ferma il listener"""
-        if self.stream:
-            self.stream.stop_stream()
-            self.stream.close()
+        self.capture.stop()
+        if self._owns_ptt:
+            self.ptt.stop()
         self.pa.terminate()
         logger.info("[WAKE] Listener fermato")
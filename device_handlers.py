@@ -277,6 +277,19 @@ class DeviceCommandHandler:
             logger.error(f"❌ NOTIFICATIONS error: {e}")
             return {"success": False, "message": f"Errore: {str(e)}", "action_type": "notifications"}
     
+    @staticmethod
+    def extract_contact_name(text: str) -> Optional[str]:
+        """
+        Nome del contatto dopo "a", "di" o "per" ("manda un messaggio a marco" -> "Marco")
+        """
+        words = text.lower().split()
+        for i, word in enumerate(words):
+            if word in ["a", "di", "per"] and i + 1 < len(words):
+                contact = words[i + 1]
+                if contact not in ["whatsapp", "sms", "chiama"]:
+                    return contact.capitalize()
+        return None
+    
     @staticmethod
     async def _find_contact_phone(contact_name: str, device_hub=None) -> Optional[str]:
         """
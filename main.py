@@ -4,19 +4,43 @@ import logging
 import asyncio
 import json
 import io
+import base64
 import re
 import ssl
+import time
+import uuid
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, AsyncIterator, Tuple
 
 import uvicorn
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from openai import OpenAI
-import httpx
+
+from core.llm_gateway import llm_gateway, DEFAULT_MODEL
+from core.conversation_memory import conversation_memory, depends_on_context
+from core.tool_registry import tool_registry
+from core.speculation import speculator
+from core.streaming_stt import StreamingTranscriber, transcribe_pcm, transcribe_wav
+from core.audio_preprocess import preprocess_audio
+from core.intent_engine import IntentEngine
+from core.intent_classifier import intent_classifier
+from core.response_cache import response_cache
+from core.tts_pipeline import synthesize_sentences
+from core.tts_cache import tts_cache, make_key
+from core.phrase_bank import PhraseBank, register_phrases
+from core.tts_workers import tts_pool
+from core.tts_router import TTSRouter, TTSProvider
+from core.speak_edge import generate_tts_bytes
+from core.http_pool import http_clients, OPENAI_ORIGIN
+from core.actions_client import ACTIONS_BASE, VERIFY as ACTIONS_VERIFY
+from services.weather.weather_cache import weather_cache, fetch_current_weather, fetch_weather_at, OPENWEATHER_URL
+from services.weather.weather_prefetch import WeatherPrefetcher
+from services.geolocation.gazetteer import gazetteer
+from utils.helpers import sse_event, audio_header_line
 
 try:
     from google.cloud import texttospeech
@@ -120,76 +144,136 @@ class Message(BaseModel):
     message: str
     audio: bool = True
     device_id: Optional[str] = None
+    stream: bool = False
+    binary: bool = False
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+AUDIO_FORMAT = "mp3"
 
 # ===== INTENT DETECTION =====
 
+# Registration order is priority: the first matching intent wins
+intent_engine = IntentEngine()
+intent_engine.register("weather", ["meteo", "tempo", "pioggia", "temperatura", "caldo", "freddo", "temporale"])
+intent_engine.register("call", ["chiama", "chiamami", "chiamare", "call", "telefona", "telefonare"])
+intent_engine.register("whatsapp", ["whatsapp", "messaggio"])
+intent_engine.register("sms", ["sms"])
+intent_engine.register("notifications", ["notifiche", "notifica"])
+intent_engine.register("greeting", ["ciao", "salve", "buongiorno", "come stai"])
+
+# Local classifier labels → intents handled here
+CLASSIFIER_INTENTS = {
+    "get_weather": "weather",
+    "call": "call",
+    "whatsapp_send": "whatsapp",
+    "sms_send": "sms",
+    "read_notifications": "notifications",
+    "greeting": "greeting"
+}
+
+# Topics the LLM can answer with tools: two of them (or two places) in one request go to function calling
+TOOLS_ENABLED = os.environ.get("TOOLS_ENABLED", "true").lower() == "true"
+tool_topics = IntentEngine()
+tool_topics.register("weather", ["meteo", "tempo", "pioggia", "temperatura", "gradi", "vento", "umidità"])
+tool_topics.register("battery", ["batteria", "carica"])
+
+def needs_tools(text: str) -> bool:
+    """Compound requests ("meteo a Roma e Milano, e la batteria?") that one local handler can't answer"""
+    if not TOOLS_ENABLED:
+        return False
+    topics = tool_topics.scores(text)
+    if len(topics) >= 2:
+        return True
+    return "weather" in topics and len(gazetteer.extract_all(text)) >= 2
+
+# Speculative fetches each final intent can use (the rest are cancelled)
+SPECULATION_KINDS = {
+    "weather": ("weather",),
+    "tools": ("weather", "battery")
+}
+
+def new_session_id() -> str:
+    """Conversation id for a connection that doesn't identify its device"""
+    return f"ws:{uuid.uuid4().hex[:12]}"
+
+def speculation_context(device_id: str) -> Dict[str, Any]:
+    return {"device_id": device_id, "weather_api_key": OPENWEATHER_API_KEY}
+
 async def detect_intent(text: str) -> str:
-    """Detect intent from user text"""
-    text_lower = text.lower()
-    
-    if any(w in text_lower for w in ["meteo", "tempo", "pioggia", "temperatura", "caldo", "freddo"]):
-        return "weather"
-    if any(w in text_lower for w in ["chiama", "call", "telefona"]):
-        return "call"
-    if any(w in text_lower for w in ["whatsapp", "messaggio"]):
-        return "whatsapp"
-    if any(w in text_lower for w in ["sms"]):
-        return "sms"
-    if any(w in text_lower for w in ["notifiche", "notifica"]):
-        return "notifications"
-    if any(w in text_lower for w in ["ciao", "salve", "buongiorno", "come stai"]):
-        return "greeting"
-    
+    """Detect intent from user text (keywords, then local classifier, then LLM)"""
+    match = intent_engine.match(text)
+    if match:
+        return match[0]
+    if intent_classifier.ready:
+        predicted = intent_classifier.predict(text)
+        if predicted and predicted[0] in CLASSIFIER_INTENTS:
+            return CLASSIFIER_INTENTS[predicted[0]]
     return "general"
 
 # ===== WEATHER =====
 
+# Keeps favorites and each device's last GPS fix warm in the cache
+weather_prefetcher = WeatherPrefetcher(OPENWEATHER_API_KEY)
+
+def format_weather(location: str, data: Dict) -> str:
+    temp = data["main"]["temp"]
+    description = data["weather"][0]["description"]
+    humidity = data["main"]["humidity"]
+    return f"A {location}: {description}, {temp}°C, umidità {humidity}%."
+
 async def get_weather(location: str = "Milano") -> str:
-    """Get weather from OpenWeather API"""
+    """Get weather from OpenWeather API (shared TTL cache)"""
     try:
-        async with httpx.AsyncClient() as client:
-            params = {
-                "q": location,
-                "appid": OPENWEATHER_API_KEY,
-                "units": "metric",
-                "lang": "it"
-            }
-            
-            response = await client.get(
-                "https://api.openweathermap.org/data/2.5/weather",
-                params=params,
-                timeout=5.0
-            )
-            data = response.json()
-            
-            if response.status_code == 200:
-                temp = data["main"]["temp"]
-                description = data["weather"][0]["description"]
-                humidity = data["main"]["humidity"]
-                return f"A {location}: {description}, {temp}°C, umidità {humidity}%."
-            return f"Meteo non disponibile."
+        data = await fetch_current_weather(location, OPENWEATHER_API_KEY)
+        
+        if data:
+            return format_weather(location, data)
+        return f"Meteo non disponibile."
+    except Exception as e:
+        logger.error(f"Weather error: {e}")
+        return "Sistema meteo offline."
+
+async def get_weather_at(lat: float, lon: float, label: Optional[str] = None) -> str:
+    """Weather at given coordinates (gazetteer place or device position)"""
+    try:
+        data = await fetch_weather_at(lat, lon, OPENWEATHER_API_KEY)
+        
+        if data:
+            return format_weather(label or data.get("name") or "la tua posizione", data)
+        return f"Meteo non disponibile."
     except Exception as e:
         logger.error(f"Weather error: {e}")
         return "Sistema meteo offline."
 
+def report_device_position(device_id: Optional[str], lat: Optional[float], lon: Optional[float]):
+    """Record a device's GPS fix (sent along with chat messages)"""
+    if lat is None or lon is None:
+        return
+    try:
+        weather_prefetcher.report_position(device_id or PRIMARY_DEVICE_ID, lat, lon)
+    except (TypeError, ValueError):
+        logger.debug(f"Invalid position from {device_id}: {lat}, {lon}")
+
 # ===== DEVICE ACTIONS =====
 
 async def send_device_command(device_id: str, action: str, data: Dict = None) -> Dict:
     """Send command to Android device via HTTP bridge"""
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            payload = {
-                "action": action,
-                "device_id": device_id,
-                "data": data or {}
-            }
-            
-            response = await client.post(
-                f"{DEVICE_SERVER_URL}/command",
-                json=payload
-            )
-            
-            return response.json()
+        client = http_clients.get(DEVICE_SERVER_URL)
+        payload = {
+            "action": action,
+            "device_id": device_id,
+            "data": data or {}
+        }
+        
+        response = await client.post(
+            f"{DEVICE_SERVER_URL}/command",
+            json=payload,
+            timeout=10
+        )
+        
+        return response.json()
     except Exception as e:
         logger.error(f"Device command error: {e}")
         return {"status": "error", "message": str(e)}
@@ -203,11 +287,20 @@ def extract_contact_name(text: str) -> str:
 
 # ===== HANDLERS =====
 
-async def handle_weather(text: str) -> str:
-    """Handle weather requests"""
+async def handle_weather(text: str, device_id: Optional[str] = None) -> str:
+    """Handle weather requests (gazetteer city, else device position, then Milano)"""
+    place = gazetteer.extract(text)
+    if place:
+        return await get_weather_at(place.lat, place.lon, place.name)
+    
     location = "Milano"
     if " a " in text.lower():
+        # Not in the offline gazetteer: let OpenWeather resolve the name
         location = text.lower().split(" a ")[-1].strip().title()
+    elif device_id:
+        position = weather_prefetcher.position(device_id)
+        if position:
+            return await get_weather_at(*position)
     return await get_weather(location)
 
 async def handle_call(text: str, device_id: str) -> str:
@@ -266,49 +359,119 @@ async def handle_greeting() -> str:
 
 # ===== GET RESPONSE =====
 
-async def get_response(user_input: str, device_id: Optional[str] = None) -> str:
+FALLBACK_REPLY = "Scuso, sistema momentaneamente offline."
+
+async def route_response(user_input: str, device_id: str, session_id: str) -> AsyncIterator[str]:
+    """
+    Local intents in one chunk, GPT token by token (with the session conversation as context).
+    device_id receives the device commands, session_id keys conversation and speculation
+    """
+    # Start likely fetches (weather, battery) while the intent is still being resolved
+    speculator.observe(session_id, user_input, speculation_context(device_id))
+    
+    if needs_tools(user_input):
+        speculator.resolve(session_id, SPECULATION_KINDS["tools"])
+        try:
+            yield await llm_gateway.run_tools(
+                conversation_memory.build_messages(session_id, SYSTEM_PROMPT, user_input),
+                tool_registry,
+                model=DEFAULT_MODEL,
+                max_tokens=120,
+                context={**speculation_context(device_id), "session_id": session_id}
+            )
+            return
+        except Exception as e:
+            logger.warning(f"Tool calling failed, using local handlers: {e}")
+    
+    intent = await detect_intent(user_input)
+    speculator.resolve(session_id, SPECULATION_KINDS.get(intent, ()))
+    
+    if intent == "weather":
+        yield await handle_weather(user_input, device_id)
+    elif intent == "call":
+        yield await handle_call(user_input, device_id)
+    elif intent == "whatsapp":
+        parts = user_input.split(None, 1)
+        yield await handle_whatsapp(parts[1] if len(parts) > 1 else "", device_id)
+    elif intent == "sms":
+        parts = user_input.split(None, 1)
+        yield await handle_sms(parts[1] if len(parts) > 1 else "", device_id)
+    elif intent == "notifications":
+        yield await handle_notifications(device_id)
+    elif intent == "greeting":
+        yield await handle_greeting()
+    else:
+        # Follow-ups that lean on earlier turns ("e domani?") depend on the conversation:
+        # they are never answered from, nor stored in, the response cache
+        messages = conversation_memory.build_messages(session_id, SYSTEM_PROMPT, user_input)
+        contextual = depends_on_context(messages)
+        cached = None if contextual else response_cache.get(user_input, scope="main")
+        if cached:
+            yield cached
+            return
+        
+        started = time.perf_counter()
+        async for msg_type, content in llm_gateway.stream(
+            messages,
+            model=DEFAULT_MODEL,
+            max_tokens=50
+        ):
+            if msg_type == "delta":
+                yield content
+            elif msg_type == "done" and not contextual:
+                # Only complete replies are cached (never errors or partial streams)
+                response_cache.put(user_input, content.strip(), (time.perf_counter() - started) * 1000, scope="main")
+
+async def stream_response(user_input: str, device_id: Optional[str] = None,
+                          session_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Stream JARVIS response and remember the exchange for the session (the device by default)"""
+    device_id = device_id or PRIMARY_DEVICE_ID
+    session_id = session_id or device_id
+    parts = []
+    async for delta in route_response(user_input, device_id, session_id):
+        parts.append(delta)
+        yield delta
+    conversation_memory.add_exchange(session_id, user_input, "".join(parts).strip())
+
+async def get_response(user_input: str, device_id: Optional[str] = None,
+                       session_id: Optional[str] = None) -> str:
     """Get JARVIS response"""
     try:
-        intent = await detect_intent(user_input)
-        device_id = device_id or PRIMARY_DEVICE_ID
-        
-        if intent == "weather":
-            return await handle_weather(user_input)
-        elif intent == "call":
-            return await handle_call(user_input, device_id)
-        elif intent == "whatsapp":
-            parts = user_input.split(None, 1)
-            return await handle_whatsapp(parts[1] if len(parts) > 1 else "", device_id)
-        elif intent == "sms":
-            parts = user_input.split(None, 1)
-            return await handle_sms(parts[1] if len(parts) > 1 else "", device_id)
-        elif intent == "notifications":
-            return await handle_notifications(device_id)
-        elif intent == "greeting":
-            return await handle_greeting()
-        else:
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_input}
-                ],
-                temperature=0.7,
-                max_tokens=50
-            )
-            return response.choices[0].message.content.strip()
+        parts = [delta async for delta in stream_response(user_input, device_id, session_id)]
+        return "".join(parts).strip()
     
     except Exception as e:
         logger.error(f"Response error: {e}")
-        return "Scuso, sistema momentaneamente offline."
+        return FALLBACK_REPLY
+
+# ===== CANNED PHRASES =====
+
+# Fixed replies, pre-rendered at startup and served with zero TTS latency
+register_phrases(
+    "Buongiorno, signore.",
+    "Buongiorno, signore. Come posso assistervi?",
+    "Chi devo chiamare?",
+    "Chi devo contattare su WhatsApp?",
+    "Chi devo contattare?",
+    "Nessuna notifica non letta.",
+    "Errore lettura notifiche.",
+    "Meteo non disponibile.",
+    "Sistema meteo offline.",
+    FALLBACK_REPLY
+)
 
 # ===== TEXT TO SPEECH =====
 
 async def text_to_speech_google(text: str) -> Optional[bytes]:
-    """Google TTS - Italian"""
+    """Google TTS - Italian (cached)"""
     if not google_tts_client:
         return None
     
+    key = make_key(text, "google", "it-IT-Neural2-A", fmt="mp3")
+    return await tts_cache.get_or_create(key, lambda: _synthesize_google(text))
+
+async def _synthesize_google(text: str) -> Optional[bytes]:
+    """Google TTS request"""
     try:
         synthesis_input = texttospeech.SynthesisInput(text=text)
         voice = texttospeech.VoiceSelectionParams(
@@ -319,7 +482,8 @@ async def text_to_speech_google(text: str) -> Optional[bytes]:
             audio_encoding=texttospeech.AudioEncoding.MP3
         )
         
-        response = google_tts_client.synthesize_speech(
+        response = await tts_pool.run(
+            google_tts_client.synthesize_speech,
             input=synthesis_input,
             voice=voice,
             audio_config=audio_config
@@ -331,14 +495,16 @@ async def text_to_speech_google(text: str) -> Optional[bytes]:
         logger.error(f"Google TTS error: {e}")
         return None
 
-async def text_to_speech(text: str) -> Optional[bytes]:
-    """TTS with fallback (Google → OpenAI)"""
-    google_audio = await text_to_speech_google(text)
-    if google_audio:
-        return google_audio
-    
+async def text_to_speech_openai(text: str) -> Optional[bytes]:
+    """OpenAI TTS - onyx (cached)"""
+    key = make_key(text, "openai", "onyx", rate="1.0", fmt="mp3")
+    return await tts_cache.get_or_create(key, lambda: _synthesize_openai(text))
+
+async def _synthesize_openai(text: str) -> Optional[bytes]:
+    """OpenAI TTS request"""
     try:
-        response = openai_client.audio.speech.create(
+        response = await tts_pool.run(
+            openai_client.audio.speech.create,
             model="tts-1-hd",
             voice="onyx",
             input=text,
@@ -350,16 +516,46 @@ async def text_to_speech(text: str) -> Optional[bytes]:
         logger.error(f"TTS error: {e}")
         return None
 
+# Providers race each other: the next one is hedged in after the
+# current one's recent p90 latency, first valid audio wins
+tts_router = TTSRouter([
+    TTSProvider("google", text_to_speech_google, available=google_tts_client is not None),
+    TTSProvider("openai", text_to_speech_openai),
+    TTSProvider("edge", generate_tts_bytes)
+])
+
+async def text_to_speech(text: str) -> Optional[bytes]:
+    """TTS: phrase bank, then hedged Google / OpenAI / Edge"""
+    canned = phrase_bank.get(text)
+    if canned:
+        return canned
+    
+    return await tts_router.synthesize(text)
+
+# Canned phrases are rendered by one fixed provider, never through the hedged
+# router: every clip in the bank has the voice its signature names
+# (a phrase that provider fails to render is synthesized live instead)
+phrase_bank = PhraseBank(
+    "main",
+    text_to_speech_google if google_tts_client else text_to_speech_openai,
+    signature="google:it-IT-Neural2-A" if google_tts_client else "openai:onyx"
+)
+
 async def speech_to_text(audio_file) -> Optional[str]:
     """Whisper for transcription"""
     try:
         audio_data = await audio_file.read()
-        response = openai_client.audio.transcriptions.create(
-            model="whisper-1",
-            file=("audio.wav", io.BytesIO(audio_data), "audio/wav"),
-            language="it"
-        )
-        return response.text.strip()
+        try:
+            # Mono, 16 kHz, silence trimmed: smaller upload, no round trip for empty clips.
+            # Decode + resampling run in a worker thread, off the event loop
+            clip = await asyncio.to_thread(preprocess_audio, audio_data)
+        except ValueError:
+            # Async shared client: the event loop is not blocked during the upload
+            return await transcribe_wav(audio_data)
+        if clip is None:
+            return None
+        # Ogg/Opus at speech bitrate instead of WAV (~32 KB per second)
+        return await transcribe_pcm(clip.pcm)
     except Exception as e:
         logger.error(f"Whisper error: {e}")
         return None
@@ -383,9 +579,54 @@ async def health():
         "mode": "production",
         "protocol": "HTTPS" if USE_HTTPS else "HTTP",
         "tts": "Google (Italiano)" if google_tts_client else "OpenAI",
+        "tts_cache": tts_cache.stats(),
+        "weather_cache": weather_cache.stats(),
+        "weather_prefetch": weather_prefetcher.stats(),
+        "response_cache": response_cache.stats(),
+        "llm": llm_gateway.stats(),
+        "conversation_memory": conversation_memory.stats(),
+        "tools": tool_registry.stats(),
+        "speculation": speculator.stats(),
+        "phrase_bank_hits": phrase_bank.hits,
+        "tts_pool": tts_pool.stats(),
+        "tts_providers": tts_router.stats(),
         "device_server": DEVICE_SERVER_URL
     }
 
+async def chat_with_voice_stream(user_msg: str, data: Message) -> AsyncIterator[str]:
+    """SSE stream: 'delta' events while generating, then one 'done' event"""
+    parts = []
+    try:
+        async for delta in stream_response(user_msg, data.device_id):
+            parts.append(delta)
+            yield sse_event("delta", {"delta": delta})
+        reply = "".join(parts).strip()
+    except Exception as e:
+        logger.error(f"Response error: {e}")
+        reply = "".join(parts).strip() or FALLBACK_REPLY
+    
+    done = {"response": reply, "status": "text_only"}
+    if data.audio:
+        audio_bytes = await text_to_speech(reply)
+        if audio_bytes:
+            done["status"] = "ok"
+            done["audio_base64"] = base64.b64encode(audio_bytes).decode()
+    
+    yield sse_event("done", done)
+
+async def chat_with_voice_binary(reply: str) -> AsyncIterator[bytes]:
+    """Chunked body: one JSON header line, then the raw audio bytes"""
+    audio_bytes = await text_to_speech(reply)
+    
+    header = {"response": reply, "status": "ok" if audio_bytes else "text_only"}
+    if audio_bytes:
+        header["format"] = AUDIO_FORMAT
+        header["audio_bytes"] = len(audio_bytes)
+    
+    yield audio_header_line(header)
+    if audio_bytes:
+        yield audio_bytes
+
 @app.post("/api/chat-with-voice")
 async def chat_with_voice(data: Message):
     """Chat with voice response"""
@@ -393,13 +634,28 @@ async def chat_with_voice(data: Message):
     if not user_msg or len(user_msg) < 2:
         return {"error": "Messaggio troppo breve."}
     
+    report_device_position(data.device_id, data.lat, data.lon)
+    
+    if data.stream:
+        return StreamingResponse(
+            chat_with_voice_stream(user_msg, data),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
     reply = await get_response(user_msg, data.device_id)
+    
+    if data.binary:
+        return StreamingResponse(
+            chat_with_voice_binary(reply),
+            media_type="application/octet-stream"
+        )
+    
     audio_bytes = await text_to_speech(reply)
     
     if not audio_bytes:
         return {"response": reply, "status": "text_only"}
     
-    import base64
     audio_base64 = base64.b64encode(audio_bytes).decode()
     
     return {
@@ -410,13 +666,85 @@ async def chat_with_voice(data: Message):
 
 # ===== WEBSOCKETS =====
 
+async def _send_audio_ws(websocket: WebSocket, header: Dict[str, Any], audio_bytes: bytes, binary: bool):
+    """
+    Send audio as JSON header frame + raw binary frame (negotiated binary mode)
+    or, for old clients, inline as audio_base64
+    """
+    if binary:
+        await websocket.send_json({
+            **header,
+            "audio_binary": True,
+            "audio_bytes": len(audio_bytes),
+            "format": AUDIO_FORMAT
+        })
+        await websocket.send_bytes(audio_bytes)
+    else:
+        await websocket.send_json({
+            **header,
+            "audio_base64": base64.b64encode(audio_bytes).decode()
+        })
+
+async def _stream_reply_ws(websocket: WebSocket, user_input: str, device_id: str, session_id: str) -> str:
+    """Forward reply deltas as {"status": "delta"} frames, return full reply"""
+    parts = []
+    try:
+        async for delta in stream_response(user_input, device_id, session_id):
+            parts.append(delta)
+            await websocket.send_json({"status": "delta", "delta": delta})
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        logger.error(f"Response error: {e}")
+    return "".join(parts).strip() or FALLBACK_REPLY
+
+async def _pipeline_reply_ws(websocket: WebSocket, user_input: str, device_id: str, session_id: str,
+                             send_deltas: bool, binary: bool) -> Tuple[str, int]:
+    """
+    Sentence-pipelined TTS: each sentence is synthesized while the next
+    one is still generating and sent as an ordered "audio_chunk" frame.
+    Returns (full reply, number of audio chunks sent).
+    """
+    parts = []
+    chunks = 0
+    send_lock = asyncio.Lock()
+    
+    async def deltas():
+        async for delta in stream_response(user_input, device_id, session_id):
+            parts.append(delta)
+            if send_deltas:
+                async with send_lock:
+                    await websocket.send_json({"status": "delta", "delta": delta})
+            yield delta
+    
+    try:
+        async for seq, sentence, audio_bytes in synthesize_sentences(deltas(), text_to_speech):
+            if not audio_bytes:
+                continue
+            async with send_lock:
+                await _send_audio_ws(websocket, {
+                    "status": "audio_chunk",
+                    "seq": seq,
+                    "text": sentence
+                }, audio_bytes, binary)
+            chunks += 1
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        logger.error(f"Response error: {e}")
+    
+    return "".join(parts).strip() or FALLBACK_REPLY, chunks
+
 @app.websocket("/ws/jarvis")
 async def websocket_jarvis(websocket: WebSocket):
     """WebSocket for real-time chat"""
     await websocket.accept()
     logger.info("🌐 Connected")
     
+    # Clients that don't name a device (browser tabs) get a conversation of their own
+    connection_session = new_session_id()
     device_id = PRIMARY_DEVICE_ID
+    session_id = connection_session
     
     await websocket.send_json({
         "status": "connected",
@@ -431,7 +759,21 @@ async def websocket_jarvis(websocket: WebSocket):
                 msg = json.loads(data)
                 user_input = (msg.get("message") or "").strip()
                 return_audio = msg.get("audio", True)
-                device_id = msg.get("device_id", PRIMARY_DEVICE_ID)
+                stream = msg.get("stream", False)
+                audio_chunks = return_audio and msg.get("audio_chunks", False)
+                binary = msg.get("binary", False)
+                device_id = msg.get("device_id") or PRIMARY_DEVICE_ID
+                session_id = msg.get("device_id") or connection_session
+                
+                location = msg.get("location")
+                if isinstance(location, dict):
+                    report_device_position(device_id, location.get("lat"), location.get("lon"))
+                
+                partial = msg.get("partial")
+                if isinstance(partial, str):
+                    # Interim transcript from the client: start likely fetches before the final text
+                    speculator.observe(session_id, partial, speculation_context(device_id))
+                    continue
                 
                 if not user_input or len(user_input) < 2:
                     continue
@@ -439,7 +781,15 @@ async def websocket_jarvis(websocket: WebSocket):
                 logger.info(f"📝 Input: {user_input}")
                 await websocket.send_json({"status": "processing"})
                 
-                reply = await get_response(user_input, device_id)
+                chunks_sent = 0
+                if audio_chunks:
+                    reply, chunks_sent = await _pipeline_reply_ws(
+                        websocket, user_input, device_id, session_id, stream, binary
+                    )
+                elif stream:
+                    reply = await _stream_reply_ws(websocket, user_input, device_id, session_id)
+                else:
+                    reply = await get_response(user_input, device_id, session_id)
                 
                 response_data = {
                     "response": reply,
@@ -447,13 +797,16 @@ async def websocket_jarvis(websocket: WebSocket):
                     "has_audio": False
                 }
                 
-                if return_audio:
+                if chunks_sent:
+                    # Audio already delivered sentence by sentence
+                    response_data["has_audio"] = True
+                    response_data["audio_chunks"] = chunks_sent
+                elif return_audio:
                     audio_bytes = await text_to_speech(reply)
                     if audio_bytes:
-                        import base64
-                        audio_base64 = base64.b64encode(audio_bytes).decode()
-                        response_data["audio_base64"] = audio_base64
                         response_data["has_audio"] = True
+                        await _send_audio_ws(websocket, response_data, audio_bytes, binary)
+                        continue
                 
                 await websocket.send_json(response_data)
             except json.JSONDecodeError:
@@ -461,6 +814,74 @@ async def websocket_jarvis(websocket: WebSocket):
     except:
         logger.info("🌐 Disconnected")
 
+@app.websocket("/ws/audio")
+async def websocket_audio(websocket: WebSocket):
+    """
+    Streaming voice: binary PCM16 mono frames in, {"status": "partial"} transcripts
+    while the user speaks, then {"status": "final"} and the reply as on /ws/jarvis.
+    Text frames: {"type": "start", "sample_rate": 16000, "device_id": ..., "binary": bool}
+    and {"type": "stop"} to end the utterance without waiting for the VAD
+    """
+    await websocket.accept()
+    device_id = PRIMARY_DEVICE_ID
+    session_id = new_session_id()
+    sample_rate = 16000
+    binary = False
+    
+    async def on_partial(text: str):
+        # Interim transcript: to the client and to the speculative prefetch
+        speculator.observe(session_id, text, speculation_context(device_id))
+        await websocket.send_json({"status": "partial", "text": text})
+    
+    transcriber = StreamingTranscriber(sample_rate, on_partial=on_partial)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            ended = False
+            if message.get("bytes"):
+                ended = transcriber.feed(message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except json.JSONDecodeError:
+                    continue
+                if control.get("type") == "start":
+                    if control.get("device_id"):
+                        device_id = session_id = control["device_id"]
+                    sample_rate = int(control.get("sample_rate", sample_rate))
+                    binary = control.get("binary", binary)
+                    await transcriber.cancel()
+                    transcriber = StreamingTranscriber(sample_rate, on_partial=on_partial)
+                    continue
+                ended = control.get("type") == "stop"
+            
+            # A "stop" after the VAD already closed the utterance: nothing left to transcribe
+            if not ended or not transcriber.has_speech:
+                continue
+            
+            user_input = await transcriber.finish()
+            transcriber = StreamingTranscriber(sample_rate, on_partial=on_partial)
+            await websocket.send_json({"status": "final", "text": user_input})
+            if len(user_input) < 2:
+                continue
+            
+            reply = await get_response(user_input, device_id, session_id)
+            response_data = {"response": reply, "transcript": user_input, "status": "ok", "has_audio": False}
+            audio_bytes = await text_to_speech(reply)
+            if audio_bytes:
+                response_data["has_audio"] = True
+                await _send_audio_ws(websocket, response_data, audio_bytes, binary)
+            else:
+                await websocket.send_json(response_data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await transcriber.cancel()
+        logger.info("🎙️ Audio socket closed")
+
 # ===== STARTUP =====
 
 @app.on_event("startup")
@@ -468,10 +889,35 @@ async def startup():
     logger.info("=" * 70)
     logger.info("🤖 JARVIS v4.1.0 - PRODUCTION HTTPS")
     logger.info("💬 Chat + Voice + Device Control")
-    logger.info("🎙️ TTS: Google (100% Italiano) + OpenAI fallback")
+    logger.info("🎙️ TTS: Google (100% Italiano) + OpenAI + Edge (hedged)")
     logger.info(f"🔒 Protocol: {'HTTPS' if USE_HTTPS else 'HTTP'}")
     logger.info(f"📱 Device Server: {DEVICE_SERVER_URL}")
     logger.info("=" * 70)
+    
+    # Render canned phrases in background (doesn't delay startup)
+    app.state.phrase_bank_task = asyncio.create_task(phrase_bank.warm())
+    
+    # Load (or train on first run) the local intent classifier off the event loop
+    app.state.intent_classifier_task = asyncio.create_task(asyncio.to_thread(intent_classifier.load))
+    
+    # Service packages register their function-calling tools
+    tool_registry.load_services()
+    
+    # Open TCP+TLS to upstreams now, keep them warm while idle
+    app.state.prewarm_task = asyncio.gather(
+        http_clients.prewarm([OPENAI_ORIGIN, OPENWEATHER_URL, DEVICE_SERVER_URL]),
+        http_clients.prewarm([ACTIONS_BASE], verify=ACTIONS_VERIFY)
+    )
+    http_clients.start_rewarm()
+    
+    # Refresh hot weather locations ahead of expiry
+    weather_prefetcher.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await weather_prefetcher.stop()
+    await conversation_memory.aclose()
+    await http_clients.aclose()
 
 # ===== MAIN =====
 
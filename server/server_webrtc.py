@@ -11,9 +11,15 @@ from io import BytesIO
 from aiohttp import web
 import aiofiles
 
-from core.jarvis_ai import llm_stream
-from core.speak_edge import speak_edge_sync
+from core.llm_gateway import llm_stream
+from core.speak_edge import generate_tts_bytes, stream_tts_cached
+from core.phrase_bank import PhraseBank, register_phrases
 from config import OPENAI_API_KEY, HOST, PORT, USE_HTTPS
+from utils.helpers import audio_header_line
+from core.http_pool import http_clients, OPENAI_ORIGIN
+from core.streaming_stt import StreamingTranscriber
+from core.audio_preprocess import preprocess_audio, preprocess_pcm
+from core.audio_encoder import encode_upload
 
 # ============================================================================
 # SETUP APP
@@ -21,6 +27,12 @@ from config import OPENAI_API_KEY, HOST, PORT, USE_HTTPS
 
 app = web.Application()
 
+# Risposte fisse: pre-renderizzate all'avvio
+FALLBACK_NOT_UNDERSTOOD = "Mi dispiace, non ho capito bene. Ripeti signore."
+FALLBACK_TECH_ERROR = "Si è verificato un errore tecnico."
+
+register_phrases(FALLBACK_NOT_UNDERSTOOD, FALLBACK_TECH_ERROR)
+
 # ============================================================================
 # HELPER - AUDIO PROCESSING
 # ============================================================================
@@ -38,16 +50,33 @@ def wav_to_pcm(wav_bytes):
         return None, None
 
 
-async def transcribe_audio_with_whisper(audio_bytes: bytes) -> str:
+def prepare_upload(audio_bytes: bytes):
+    """
+    Audio pronto per Whisper: mono, 16 kHz, senza silenzio iniziale e finale,
+    codificato in Ogg/Opus se disponibile. Ritorna (byte, nome file); None se
+    la clip è solo silenzio; l'originale se il formato non si decodifica
+    """
+    if audio_bytes[:4] == b'RIFF':
+        frames, params = wav_to_pcm(audio_bytes)
+        if frames is not None:
+            clip = preprocess_pcm(frames, params.framerate, params.sampwidth, params.nchannels)
+            return encode_upload(clip.pcm) if clip else None
+    try:
+        clip = preprocess_audio(audio_bytes)
+    except ValueError:
+        return audio_bytes, "audio.wav"
+    return encode_upload(clip.pcm) if clip else None
+
+
+async def transcribe_audio_with_whisper(audio_bytes: bytes, filename: str = "audio.wav") -> str:
     """Trascrivi audio con Whisper"""
     try:
-        from openai import AsyncOpenAI
+        # Client condiviso: niente handshake TCP+TLS a ogni frase
+        client = http_clients.openai()
         
-        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-        
-        # Converti a WAV corretto
+        # Whisper riconosce il formato dall'estensione
         audio_file = BytesIO(audio_bytes)
-        audio_file.name = "audio.wav"
+        audio_file.name = filename
         
         # Whisper API
         transcript = await client.audio.transcriptions.create(
@@ -69,49 +98,90 @@ async def get_jarvis_response(text: str) -> str:
     """Ottieni risposta JARVIS"""
     try:
         if "[ERRORE" in text or "[SILENZIO]" in text:
-            return "Mi dispiace, non ho capito bene. Ripeti signore."
+            return FALLBACK_NOT_UNDERSTOOD
         
         response_text = ""
         async for msg_type, content in llm_stream(text):
             if msg_type == "delta":
                 response_text += content
         
-        return response_text.strip() if response_text.strip() else "Si è verificato un errore tecnico."
+        return response_text.strip() if response_text.strip() else FALLBACK_TECH_ERROR
         
     except Exception as e:
         print(f"[LLM] Errore: {e}")
-        return "Si è verificato un errore tecnico."
+        return FALLBACK_TECH_ERROR
 
 
-async def generate_tts_response(text: str) -> str:
-    """Genera TTS e ritorna base64"""
+async def generate_tts_audio(text: str) -> bytes:
+    """Genera TTS e ritorna i byte audio (MP3)"""
+    canned = phrase_bank.get(text)
+    if canned:
+        return canned
+    
     try:
         print(f"[TTS] Generando audio: {text[:50]}...")
         
-        # Usa versione sync
-        audio_file = speak_edge_sync(text)
+        # Edge TTS in memoria (niente file temporanei)
+        audio_bytes = await generate_tts_bytes(text)
         
-        if not audio_file or not Path(audio_file).exists():
-            print("[TTS] ❌ Audio file not created")
-            return ""
+        if not audio_bytes:
+            print("[TTS] ❌ Audio non generato")
+            return b""
         
-        # Leggi e converti a base64
-        async with aiofiles.open(audio_file, 'rb') as f:
-            audio_bytes = await f.read()
-        
-        audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-        
-        # Pulizia
-        try:
-            os.remove(audio_file)
-        except:
-            pass
-        
-        return audio_base64
+        return audio_bytes
         
     except Exception as e:
         print(f"[TTS] Errore: {e}")
-        return ""
+        return b""
+
+
+async def tts_audio_chunks(text: str):
+    """Chunk audio da inoltrare subito al client (frase fissa o stream Edge)"""
+    canned = phrase_bank.get(text)
+    if canned:
+        yield canned
+        return
+    
+    try:
+        async for chunk in stream_tts_cached(text):
+            yield chunk
+    except Exception as e:
+        print(f"[TTS] Errore stream: {e}")
+
+
+phrase_bank = PhraseBank(
+    "webrtc",
+    generate_tts_audio,
+    signature="edge:it-IT-DiegoNeural:+0%:-12Hz"
+)
+
+
+async def generate_tts_response(text: str) -> str:
+    """Genera TTS e ritorna base64 (client legacy)"""
+    audio_bytes = await generate_tts_audio(text)
+    return base64.b64encode(audio_bytes).decode('utf-8') if audio_bytes else ""
+
+
+def wants_binary(request) -> bool:
+    """Il client ha negoziato la risposta binaria? (?binary=1 o Accept)"""
+    if request.query.get('binary') in ('1', 'true'):
+        return True
+    return 'application/octet-stream' in request.headers.get('Accept', '')
+
+
+async def send_binary_response(request, header: dict, audio_chunks):
+    """
+    Body chunked: header JSON su una riga, poi i byte audio grezzi
+    inoltrati man mano che la sintesi li produce
+    """
+    response = web.StreamResponse(headers={'Content-Type': 'application/octet-stream'})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    await response.write(audio_header_line({**header, 'format': 'mp3'}))
+    async for chunk in audio_chunks:
+        await response.write(chunk)
+    await response.write_eof()
+    return response
 
 
 # ============================================================================
@@ -155,8 +225,15 @@ async def process_audio(request):
         # STEP 1: TRASCRIVI
         # ============================================================================
         
-        print("[WHISPER] Trascrizione...")
-        user_text = await transcribe_audio_with_whisper(audio_data)
+        # Decodifica, resampling e Opus in un thread: l'event loop resta libero per gli altri client
+        upload = await asyncio.to_thread(prepare_upload, audio_data)
+        if upload is None:
+            # Solo silenzio: nessuna chiamata a Whisper né all'LLM
+            user_text = "[SILENZIO]"
+        else:
+            upload_bytes, filename = upload
+            print(f"[WHISPER] Trascrizione ({len(audio_data)} → {len(upload_bytes)} bytes, {filename})...")
+            user_text = await transcribe_audio_with_whisper(upload_bytes, filename)
         print(f"[WHISPER] → {user_text}")
         
         # ============================================================================
@@ -171,6 +248,13 @@ async def process_audio(request):
         # STEP 3: TTS
         # ============================================================================
         
+        if wants_binary(request):
+            return await send_binary_response(request, {
+                'status': 'success',
+                'transcript': user_text,
+                'response': response_text
+            }, tts_audio_chunks(response_text))
+        
         audio_base64 = await generate_tts_response(response_text)
         
         # ============================================================================
@@ -193,6 +277,60 @@ async def process_audio(request):
         }, status=500)
 
 
+async def audio_socket(request):
+    """
+    Voce in streaming: frame binari PCM16 mono in ingresso, trascrizioni
+    parziali {"type": "partial"} mentre l'utente parla, poi {"type": "final"}
+    e la risposta. Messaggi di testo: {"type": "start", "sample_rate": 16000}
+    e {"type": "stop"} per chiudere l'enunciato senza aspettare il VAD
+    """
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    sample_rate = 16000
+    
+    async def on_partial(text: str):
+        await ws.send_json({'type': 'partial', 'text': text})
+    
+    transcriber = StreamingTranscriber(sample_rate, on_partial=on_partial)
+    try:
+        async for msg in ws:
+            ended = False
+            if msg.type == web.WSMsgType.BINARY:
+                ended = transcriber.feed(msg.data)
+            elif msg.type == web.WSMsgType.TEXT:
+                try:
+                    control = json.loads(msg.data)
+                except json.JSONDecodeError:
+                    continue
+                if control.get('type') == 'start':
+                    sample_rate = int(control.get('sample_rate', sample_rate))
+                    await transcriber.cancel()
+                    transcriber = StreamingTranscriber(sample_rate, on_partial=on_partial)
+                    continue
+                ended = control.get('type') == 'stop'
+            
+            # Stop arrivato dopo la fine rilevata dal VAD: niente da trascrivere né da rispondere
+            if not ended or not transcriber.has_speech:
+                continue
+            
+            user_text = await transcriber.finish()
+            transcriber = StreamingTranscriber(sample_rate, on_partial=on_partial)
+            print(f"[STT] → {user_text}")
+            await ws.send_json({'type': 'final', 'text': user_text})
+            
+            response_text = await get_jarvis_response(user_text or "[SILENZIO]")
+            await ws.send_json({
+                'type': 'response',
+                'transcript': user_text,
+                'response': response_text,
+                'audio': await generate_tts_response(response_text)
+            })
+    finally:
+        await transcriber.cancel()
+    
+    return ws
+
+
 async def health(request):
     """Health check"""
     return web.json_response({'status': 'ok'})
@@ -204,6 +342,7 @@ async def health(request):
 
 app.router.add_get('/', index)
 app.router.add_post('/process_audio', process_audio)
+app.router.add_get('/ws/audio', audio_socket)
 app.router.add_get('/health', health)
 
 # ============================================================================
@@ -244,11 +383,19 @@ async def main():
     print("=" * 80)
     print(f"📱 Accedi: {protocol.lower()}://localhost:{PORT}\n")
     
+    # Frasi fisse renderizzate in background
+    phrase_task = asyncio.create_task(phrase_bank.warm())
+    
+    # Connessione a OpenAI aperta subito e tenuta calda
+    prewarm_task = asyncio.create_task(http_clients.prewarm([OPENAI_ORIGIN]))
+    http_clients.start_rewarm()
+    
     try:
         await asyncio.Event().wait()
     except KeyboardInterrupt:
         print("\n[SERVER] Shutdown...")
     finally:
+        await http_clients.aclose()
         await runner.cleanup()
 
 
@@ -1,11 +1,13 @@
 import asyncio
 import logging
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import json
-from typing import Optional
+from typing import Optional, AsyncIterator
 from core.jarvis_ai import JarvisAI
 from services.device_hub import DeviceHub
+from services.weather.weather_api import WeatherAPI, WEATHER_BATCH_MAX
+from utils.helpers import sse_event
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +16,23 @@ class APIServer:
         self.app = app
         self.jarvis = JarvisAI()
         self.device_hub = DeviceHub()
+        self.weather = WeatherAPI()
         self.jarvis.set_device_hub(self.device_hub)
         
         self._setup_routes()
     
+    async def _command_stream(self, command: str, device_id: str) -> AsyncIterator[str]:
+        """SSE: un evento 'delta' per frammento, poi 'done' con la risposta completa"""
+        parts = []
+        async for delta in self.jarvis.process_input_stream(command, device_id=device_id):
+            parts.append(delta)
+            yield sse_event("delta", {"delta": delta})
+        yield sse_event("done", {
+            "status": "ok",
+            "device_id": device_id,
+            "response": "".join(parts)
+        })
+    
     def _setup_routes(self):
         """Setup tutti gli endpoint"""
         
@@ -99,11 +114,36 @@ class APIServer:
                 )
         
         # ===== METEO =====
+        # Registrata prima di /api/weather/{city}, altrimenti "batch" verrebbe preso come città
+        @self.app.get("/api/weather/batch")
+        async def get_weather_batch(cities: str, units: str = "metric", deadline: float = None):
+            """Meteo di più città (cities=Roma,Milano,...), risultati parziali oltre la deadline"""
+            names = [c for c in cities.split(",") if c.strip()]
+            if not names:
+                return JSONResponse(
+                    {"status": "error", "message": "Nessuna città indicata"},
+                    status_code=400
+                )
+            if len(names) > WEATHER_BATCH_MAX:
+                return JSONResponse(
+                    {"status": "error", "message": f"Massimo {WEATHER_BATCH_MAX} città per richiesta"},
+                    status_code=400
+                )
+            try:
+                kwargs = {"deadline": deadline} if deadline else {}
+                return await self.weather.get_weather_many(names, units=units, **kwargs)
+            except Exception as e:
+                logger.error(f"Weather batch error: {e}")
+                return JSONResponse(
+                    {"status": "error", "message": str(e)},
+                    status_code=500
+                )
+        
         @self.app.get("/api/weather/{city}")
         async def get_weather(city: str):
             """Ottiene il meteo per una città"""
             try:
-                result = await self.jarvis._handle_weather(f"meteo {city}")
+                result = await self.weather.get_weather(city)
                 return result
             except Exception as e:
                 logger.error(f"Weather error: {e}")
@@ -114,8 +154,8 @@ class APIServer:
         
         # ===== COMANDI VOCALI =====
         @self.app.post("/api/command/text")
-        async def text_command(command: str, device_id: str = None):
-            """Processa un comando testuale"""
+        async def text_command(command: str, device_id: str = None, stream: bool = False):
+            """Processa un comando testuale (stream=true per risposta SSE)"""
             try:
                 if not device_id:
                     devices = self.device_hub.list_devices()
@@ -127,8 +167,19 @@ class APIServer:
                             status_code=400
                         )
                 
-                result = await self.jarvis.process_command(command, device_id)
-                return result
+                if stream:
+                    return StreamingResponse(
+                        self._command_stream(command, device_id),
+                        media_type="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+                    )
+                
+                reply = await self.jarvis.process_input(command, device_id=device_id)
+                return {
+                    "status": "ok",
+                    "device_id": device_id,
+                    "response": reply
+                }
             except Exception as e:
                 logger.error(f"Command error: {e}")
                 return JSONResponse(
@@ -175,6 +226,17 @@ class APIServer:
                     
                     elif msg_type == "command":
                         logger.warning(f"[WS] Device sent command (unexpected)")
+                    
+                    elif msg_type == "chat":
+                        # Risposta in streaming: frame "delta" poi "reply" finale
+                        parts = []
+                        async for delta in self.jarvis.process_input_stream(msg.get("message", ""), device_id=device_id):
+                            parts.append(delta)
+                            await websocket.send_json({"type": "delta", "delta": delta})
+                        await websocket.send_json({
+                            "type": "reply",
+                            "response": "".join(parts)
+                        })
             
             except WebSocketDisconnect:
                 if device_id:
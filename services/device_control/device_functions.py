@@ -0,0 +1,33 @@
+"""services/device_control/device_functions.py - Tool del device per il function calling"""
+
+from core.actions_client import PRIMARY_DEVICE_ID, device_battery
+from core.speculation import speculator
+
+
+def get_device_function_definitions():
+    """Ritorna definizioni funzioni per GPT function calling"""
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "get_battery_status",
+                "description": "Livello e stato della batteria del telefono dell'utente",
+                "parameters": {"type": "object", "properties": {}}
+            }
+        }
+    ]
+
+
+def register_tools(registry):
+    """Registra i tool del device nel registro condiviso (core.tool_registry)"""
+    
+    async def get_battery_status(context):
+        device_id = context.get("device_id") or PRIMARY_DEVICE_ID
+        # Già richiesta in anticipo (nella sessione della conversazione) se la frase parlava di batteria
+        session_id = context.get("session_id") or device_id
+        speculative = await speculator.take(session_id, "battery", device_id)
+        return speculative if speculative is not None else await device_battery(device_id)
+    
+    registry.register_definitions(get_device_function_definitions(), {
+        "get_battery_status": get_battery_status
+    })
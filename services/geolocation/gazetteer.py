@@ -0,0 +1,141 @@
+"""services/geolocation/gazetteer.py - Gazetteer offline: estrae e normalizza le località da una frase"""
+
+import os
+import gzip
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger("JARVIS.Gazetteer")
+
+# TSV compresso: nome, lat, lon, paese, alias separati da | (* = parola comune).
+# Si può puntare a un elenco completo dei comuni con lo stesso formato
+GAZETTEER_PATH = Path(os.environ.get(
+    "GAZETTEER_PATH", str(Path(__file__).parent / "data" / "gazetteer.tsv.gz")
+))
+
+# Una forma "comune" (Prato, Fermo, Alba...) vale come località solo dopo una preposizione
+PREPOSITIONS = {
+    "a", "ad", "di", "da", "in", "per", "su", "verso", "tra", "fra",
+    "al", "del", "dal", "nel", "sul", "vicino", "zona"
+}
+
+
+class Place(NamedTuple):
+    name: str
+    lat: float
+    lon: float
+    country: str
+
+
+def fold(text: str) -> List[str]:
+    """Token senza accenti né maiuscole: "L'Aquila" -> ["l", "aquila"]"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    chars = []
+    for c in decomposed:
+        if unicodedata.combining(c):
+            continue
+        chars.append(c if c.isalnum() else " ")
+    return "".join(chars).casefold().split()
+
+
+class Gazetteer:
+    """
+    Trie di token su nomi, alias e forme senza accenti. L'estrazione scorre
+    la frase una volta sola prendendo il match più lungo a ogni posizione
+    """
+
+    _END = ""  # chiave del nodo terminale: (indice località, forma comune)
+
+    def __init__(self, path: Path = GAZETTEER_PATH):
+        self.path = Path(path)
+        self._places: List[Place] = []
+        self._trie: Dict[str, dict] = {}
+        self._by_name: Dict[Tuple[str, ...], int] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    # ============== CARICAMENTO ==============
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                opener = gzip.open if self.path.suffix == ".gz" else open
+                with opener(self.path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if line.startswith("#") or not line.strip():
+                            continue
+                        self._add_row(line.rstrip("\n").split("\t"))
+                logger.info(f"[GAZETTEER] {len(self._places)} località caricate")
+            except Exception as e:
+                logger.error(f"[GAZETTEER] Caricamento fallito ({self.path}): {e}")
+            self._loaded = True
+
+    def _add_row(self, fields: List[str]):
+        raw_name, lat, lon, country = fields[:4]
+        aliases = fields[4].split("|") if len(fields) > 4 and fields[4] else []
+        index = len(self._places)
+        self._places.append(Place(raw_name.lstrip("*"), float(lat), float(lon), country))
+
+        for form in [raw_name] + aliases:
+            common = form.startswith("*")
+            tokens = tuple(fold(form.lstrip("*")))
+            if not tokens:
+                continue
+            self._by_name.setdefault(tokens, index)
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(self._END, (index, common))
+
+    # ============== RICERCA ==============
+
+    def lookup(self, name: str) -> Optional[Place]:
+        """Località per nome o alias esatto (accenti e maiuscole ignorati)"""
+        self._ensure_loaded()
+        index = self._by_name.get(tuple(fold(name)))
+        return self._places[index] if index is not None else None
+
+    def extract_all(self, text: str) -> List[Place]:
+        """Località citate nella frase, in ordine, senza sovrapposizioni"""
+        self._ensure_loaded()
+        tokens = fold(text)
+        found: List[Place] = []
+        i = 0
+        while i < len(tokens):
+            match = None
+            node = self._trie
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if self._END in node:
+                    match = (j, node[self._END])
+
+            if match:
+                end, (index, common) = match
+                if not common or (i > 0 and tokens[i - 1] in PREPOSITIONS):
+                    found.append(self._places[index])
+                    i = end
+                    continue
+            i += 1
+        return found
+
+    def extract(self, text: str) -> Optional[Place]:
+        """Prima località citata nella frase"""
+        places = self.extract_all(text)
+        return places[0] if places else None
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._places)
+
+
+# Istanza condivisa (dati caricati al primo uso)
+gazetteer = Gazetteer()
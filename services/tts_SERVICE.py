@@ -2,6 +2,11 @@ import logging
 from typing import Optional
 from openai import OpenAI
 
+from core.tts_cache import tts_cache, make_key
+from core.tts_workers import tts_pool
+from core.tts_router import TTSRouter, TTSProvider
+from core.speak_edge import generate_tts_bytes
+
 try:
     from google.cloud import texttospeech
     GOOGLE_TTS_AVAILABLE = True
@@ -24,12 +29,25 @@ class TTSService:
                 logger.info("✅ Google TTS available")
             except Exception as e:
                 logger.warning(f"Google TTS unavailable: {e}")
+        
+        # Google / OpenAI / Edge in corsa: hedge dopo il p90 del provider corrente
+        self.router = TTSRouter([
+            TTSProvider("google", lambda text, voice: self.text_to_speech_google(text),
+                        available=self.google_client is not None),
+            TTSProvider("openai", self.text_to_speech_openai),
+            TTSProvider("edge", lambda text, voice: generate_tts_bytes(text))
+        ])
     
     async def text_to_speech_google(self, text: str) -> Optional[bytes]:
-        """Usa Google TTS (italiano puro)"""
+        """Usa Google TTS (italiano puro), con cache"""
         if not self.google_client:
             return None
         
+        key = make_key(text, "google", "it-IT-Neural2-A", fmt="mp3")
+        return await tts_cache.get_or_create(key, lambda: self._synthesize_google(text))
+    
+    async def _synthesize_google(self, text: str) -> Optional[bytes]:
+        """Richiesta a Google TTS"""
         try:
             synthesis_input = texttospeech.SynthesisInput(text=text)
             voice = texttospeech.VoiceSelectionParams(
@@ -40,7 +58,8 @@ class TTSService:
                 audio_encoding=texttospeech.AudioEncoding.MP3
             )
             
-            response = self.google_client.synthesize_speech(
+            response = await tts_pool.run(
+                self.google_client.synthesize_speech,
                 input=synthesis_input,
                 voice=voice,
                 audio_config=audio_config
@@ -54,15 +73,19 @@ class TTSService:
             return None
     
     async def text_to_speech(self, text: str, voice: str = "onyx") -> Optional[bytes]:
-        """TTS con fallback (Google → OpenAI)"""
-        # Prova Google prima
-        google_audio = await self.text_to_speech_google(text)
-        if google_audio:
-            return google_audio
-        
-        # Fallback OpenAI
+        """TTS con hedging tra Google, OpenAI ed Edge (voice = voce OpenAI)"""
+        return await self.router.synthesize(text, voice=voice)
+    
+    async def text_to_speech_openai(self, text: str, voice: str = "onyx") -> Optional[bytes]:
+        """Usa OpenAI TTS, con cache"""
+        key = make_key(text, "openai", voice, rate="1.0", fmt="mp3")
+        return await tts_cache.get_or_create(key, lambda: self._synthesize_openai(text, voice))
+    
+    async def _synthesize_openai(self, text: str, voice: str) -> Optional[bytes]:
+        """Richiesta a OpenAI TTS"""
         try:
-            response = self.openai.audio.speech.create(
+            response = await tts_pool.run(
+                self.openai.audio.speech.create,
                 model="tts-1-hd",
                 voice=voice,
                 input=text,
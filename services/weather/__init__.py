@@ -1,3 +1,3 @@
 # services/weather/__init__.py
 # Pacchetto pulito: nessuna importazione a lato per evitare errori
-__all__ = ["weather_api"]
+__all__ = ["weather_api", "weather_cache", "weather_prefetch"]
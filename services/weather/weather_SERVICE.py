@@ -1,8 +1,9 @@
 import logging
-import httpx
 import asyncio
 from typing import Dict, Optional
 
+from services.weather.weather_cache import fetch_current_weather
+
 logger = logging.getLogger("JARVIS.Weather")
 
 class WeatherService:
@@ -13,28 +14,19 @@ class WeatherService:
         self.base_url = "https://api.openweathermap.org/data/2.5/weather"
     
     async def get_weather(self, location: str = "Milano") -> str:
-        """Ottieni meteo per una città"""
+        """Ottieni meteo per una città (cache condivisa)"""
         try:
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "q": location,
-                    "appid": self.api_key,
-                    "units": "metric",
-                    "lang": "it"
-                }
-                
-                response = await client.get(self.base_url, params=params, timeout=5.0)
-                data = response.json()
+            data = await fetch_current_weather(location, self.api_key)
+            
+            if data:
+                temp = data["main"]["temp"]
+                description = data["weather"][0]["description"]
+                feels_like = data["main"]["feels_like"]
+                humidity = data["main"]["humidity"]
                 
-                if response.status_code == 200:
-                    temp = data["main"]["temp"]
-                    description = data["weather"][0]["description"]
-                    feels_like = data["main"]["feels_like"]
-                    humidity = data["main"]["humidity"]
-                    
-                    return f"A {location}: {description}, {temp}°C. Sensazione: {feels_like}°C, umidità {humidity}%."
-                else:
-                    return f"Meteo non disponibile per {location}."
+                return f"A {location}: {description}, {temp}°C. Sensazione: {feels_like}°C, umidità {humidity}%."
+            else:
+                return f"Meteo non disponibile per {location}."
         
         except Exception as e:
             logger.error(f"Weather error: {e}")
@@ -1,10 +1,31 @@
 
+import os
+import time
+import asyncio
 import logging
-import aiohttp
-from typing import Dict, Any, Optional
+import httpx
+from typing import Dict, Any, List, Optional, Set
+
+from .weather_cache import (
+    weather_cache, fetch_current_weather, fetch_weather_at, normalize_location, WeatherUpstreamError
+)
 
 logger = logging.getLogger(__name__)
 
+# Richieste batch: città per richiesta, chiamate parallele e tempo massimo
+WEATHER_BATCH_MAX = int(os.environ.get("WEATHER_BATCH_MAX", "10"))
+WEATHER_BATCH_CONCURRENCY = int(os.environ.get("WEATHER_BATCH_CONCURRENCY", "4"))
+WEATHER_BATCH_DEADLINE = float(os.environ.get("WEATHER_BATCH_DEADLINE", "4.0"))
+
+# Fetch di batch oltre la deadline: proseguono in background per riempire la cache
+_background_fetches: Set[asyncio.Task] = set()
+
+
+def _fetch_done(task: asyncio.Task):
+    _background_fetches.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.debug(f"[WEATHER] Fetch in background fallita: {task.exception()}")
+
 class WeatherAPI:
     """API per ottenere dati meteo da OpenWeatherMap"""
     
@@ -15,7 +36,6 @@ class WeatherAPI:
         """
         self.api_key = api_key
         self.base_url = "https://api.openweathermap.org/data/2.5/weather"
-        self.session = None
     
     async def get_weather(self, city: str, units: str = "metric", lang: str = "it") -> Dict[str, Any]:
         """
@@ -29,70 +49,72 @@ class WeatherAPI:
         Returns:
             Dict con status e dati meteo
         """
+        # Cache condivisa: chiamata upstream solo se il dato è scaduto
+        return await self._query(city, fetch_current_weather(city, self.api_key, units=units, lang=lang))
+    
+    async def get_weather_at(self, lat: float, lon: float, label: str = None,
+                             units: str = "metric", lang: str = "it") -> Dict[str, Any]:
+        """
+        Come get_weather, per coordinate (es. località risolta dal gazetteer)
+        
+        Args:
+            label: Nome da usare nei log e nei messaggi d'errore
+        """
+        label = label or f"{lat:.2f},{lon:.2f}"
+        return await self._query(label, fetch_weather_at(lat, lon, self.api_key, units=units, lang=lang))
+    
+    async def _query(self, city: str, request) -> Dict[str, Any]:
+        """Esegue la richiesta meteo e la converte nel formato di risposta"""
         try:
-            # Crea sessione se non esiste
-            if self.session is None:
-                self.session = aiohttp.ClientSession()
-            
-            # Parametri query
-            params = {
-                "q": city,
-                "appid": self.api_key,
-                "units": units,
-                "lang": lang
-            }
-            
             logger.info(f"[WEATHER] Requesting: {city}")
             
-            async with self.session.get(self.base_url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    
-                    # Estrai i dati rilevanti
-                    weather_data = {
-                        "city": data.get("name"),
-                        "country": data.get("sys", {}).get("country"),
-                        "temperature": data.get("main", {}).get("temp"),
-                        "feels_like": data.get("main", {}).get("feels_like"),
-                        "temp_min": data.get("main", {}).get("temp_min"),
-                        "temp_max": data.get("main", {}).get("temp_max"),
-                        "pressure": data.get("main", {}).get("pressure"),
-                        "humidity": data.get("main", {}).get("humidity"),
-                        "wind_speed": data.get("wind", {}).get("speed"),
-                        "wind_deg": data.get("wind", {}).get("deg"),
-                        "clouds": data.get("clouds", {}).get("all"),
-                        "description": data.get("weather", [{}])[0].get("main", ""),
-                        "details": data.get("weather", [{}])[0].get("description", ""),
-                        "visibility": data.get("visibility", 0) / 1000 if data.get("visibility") else 0,  # Converti in km
-                        "rain": data.get("rain", {}).get("1h", 0),
-                        "snow": data.get("snow", {}).get("1h", 0),
-                        "sunrise": data.get("sys", {}).get("sunrise"),
-                        "sunset": data.get("sys", {}).get("sunset"),
-                        "timezone": data.get("timezone")
-                    }
-                    
-                    logger.info(f"[WEATHER] ✅ Got weather for {city}: {weather_data['temperature']}°C")
-                    
-                    return {
-                        "status": "success",
-                        "data": weather_data
-                    }
+            data = await request
+            
+            if data is not None:
+                # Estrai i dati rilevanti
+                weather_data = {
+                    "city": data.get("name"),
+                    "country": data.get("sys", {}).get("country"),
+                    "temperature": data.get("main", {}).get("temp"),
+                    "feels_like": data.get("main", {}).get("feels_like"),
+                    "temp_min": data.get("main", {}).get("temp_min"),
+                    "temp_max": data.get("main", {}).get("temp_max"),
+                    "pressure": data.get("main", {}).get("pressure"),
+                    "humidity": data.get("main", {}).get("humidity"),
+                    "wind_speed": data.get("wind", {}).get("speed"),
+                    "wind_deg": data.get("wind", {}).get("deg"),
+                    "clouds": data.get("clouds", {}).get("all"),
+                    "description": data.get("weather", [{}])[0].get("main", ""),
+                    "details": data.get("weather", [{}])[0].get("description", ""),
+                    "visibility": data.get("visibility", 0) / 1000 if data.get("visibility") else 0,  # Converti in km
+                    "rain": data.get("rain", {}).get("1h", 0),
+                    "snow": data.get("snow", {}).get("1h", 0),
+                    "sunrise": data.get("sys", {}).get("sunrise"),
+                    "sunset": data.get("sys", {}).get("sunset"),
+                    "timezone": data.get("timezone")
+                }
                 
-                elif resp.status == 404:
-                    logger.warning(f"[WEATHER] ❌ City not found: {city}")
-                    return {
-                        "status": "error",
-                        "response": f"❌ Città non trovata: {city}"
-                    }
+                logger.info(f"[WEATHER] ✅ Got weather for {city}: {weather_data['temperature']}°C")
                 
-                else:
-                    logger.error(f"[WEATHER] Error {resp.status}: {await resp.text()}")
-                    return {
-                        "status": "error",
-                        "response": f"❌ Errore API: {resp.status}"
-                    }
-        
-        except asyncio.TimeoutError:
+                return {
+                    "status": "success",
+                    "data": weather_data
+                }
+            
+            logger.warning(f"[WEATHER] ❌ City not found: {city}")
+            return {
+                "status": "error",
+                "response": f"❌ Città non trovata: {city}"
+            }
+        
+        except WeatherUpstreamError as e:
+            logger.error(f"[WEATHER] Error {e.status}: {e}")
+            return {
+                "status": "error",
+                "response": f"❌ Errore API: {e.status}"
+            }
+        
+        except (asyncio.TimeoutError, httpx.TimeoutException):
             logger.error(f"[WEATHER] Timeout")
             return {
                 "status": "error",
@@ -106,11 +128,70 @@ class WeatherAPI:
                 "response": f"❌ Errore: {str(e)}"
             }
     
+    async def get_weather_many(self, cities: List[str], units: str = "metric", lang: str = "it",
+                               concurrency: int = WEATHER_BATCH_CONCURRENCY,
+                               deadline: float = WEATHER_BATCH_DEADLINE) -> Dict[str, Any]:
+        """
+        Meteo di più città in parallelo (confronto tra città)
+        
+        Args:
+            cities: Nomi delle città (duplicati ignorati, max WEATHER_BATCH_MAX)
+            concurrency: Chiamate upstream contemporanee
+            deadline: Secondi massimi (> 0); le città non pronte finiscono in "pending"
+        
+        Returns:
+            Dict con status ("success" o "partial"), results per città
+            (risultato di get_weather + latency_ms e cached) e pending
+        """
+        if deadline <= 0:
+            raise ValueError(f"deadline deve essere positiva: {deadline}")
+        
+        unique: Dict[str, str] = {}
+        for city in cities:
+            if city and city.strip():
+                unique.setdefault(normalize_location(city), city.strip())
+        names = list(unique.values())[:WEATHER_BATCH_MAX]
+        
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        started = time.perf_counter()
+        
+        async def timed(city: str, cached: bool) -> Dict[str, Any]:
+            t0 = time.perf_counter()
+            result = await self.get_weather(city, units, lang)
+            result["latency_ms"] = round((time.perf_counter() - t0) * 1000)
+            result["cached"] = cached
+            return result
+        
+        async def one(city: str) -> Dict[str, Any]:
+            if weather_cache.peek(city, units, lang) is not None:
+                # Dato in cache: nessuno slot di concorrenza da occupare
+                return await timed(city, True)
+            async with semaphore:
+                return await timed(city, False)
+        
+        tasks = {asyncio.create_task(one(city)): city for city in names}
+        done, pending = await asyncio.wait(tasks, timeout=deadline) if tasks else (set(), set())
+        
+        # Le città oltre la deadline non vengono cancellate (anche quelle ancora in coda
+        # sul semaforo): finiscono in background e riempiono comunque la cache
+        for task in pending:
+            _background_fetches.add(task)
+            task.add_done_callback(_fetch_done)
+        
+        results = {tasks[task]: task.result() for task in done}
+        pending_cities = [tasks[task] for task in pending]
+        if pending_cities:
+            logger.warning(f"[WEATHER] Batch: {len(pending_cities)} città oltre la deadline ({deadline}s)")
+        
+        return {
+            "status": "partial" if pending_cities else "success",
+            "results": results,
+            "pending": pending_cities,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000)
+        }
+    
     async def close(self):
-        """Chiudi la sessione"""
-        if self.session:
-            await self.session.close()
-            self.session = None
+        """Compatibilità: le connessioni sono del pool condiviso (core.http_pool)"""
     
     async def format_weather(self, city: str) -> str:
         """
@@ -0,0 +1,269 @@
+"""services/weather/weather_cache.py - Cache TTL condivisa per OpenWeatherMap (single-flight, stale-while-error)"""
+
+import os
+import time
+import asyncio
+import datetime
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.http_pool import http_clients
+
+logger = logging.getLogger("JARVIS.WeatherCache")
+
+OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+WEATHER_CACHE_TTL = float(os.environ.get("WEATHER_CACHE_TTL", "600"))
+WEATHER_STALE_TTL = float(os.environ.get("WEATHER_STALE_TTL", "3600"))
+WEATHER_CACHE_MAX = int(os.environ.get("WEATHER_CACHE_MAX", "256"))
+
+# Piano free di OpenWeatherMap: 1000 chiamate/giorno
+WEATHER_DAILY_QUOTA = int(os.environ.get("WEATHER_DAILY_QUOTA", "1000"))
+WEATHER_INTERACTIVE_RESERVE = int(os.environ.get("WEATHER_INTERACTIVE_RESERVE", "200"))
+
+CacheKey = Tuple[str, str, str]
+
+
+class WeatherUpstreamError(RuntimeError):
+    """Risposta non valida da OpenWeatherMap (status diverso da 200/404)"""
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"OpenWeatherMap {status}: {message}".strip(": "))
+        self.status = status
+
+
+class WeatherQuota:
+    """
+    Chiamate upstream del giorno (UTC). Le richieste interattive non vengono
+    mai bloccate; il prefetch si ferma quando restano solo le chiamate riservate
+    """
+
+    def __init__(self, daily_limit: int = WEATHER_DAILY_QUOTA, reserve: int = WEATHER_INTERACTIVE_RESERVE):
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+        self._day = None
+        self.used = 0
+        self.used_by_prefetch = 0
+
+    def _roll(self):
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        if today != self._day:
+            self._day = today
+            self.used = 0
+            self.used_by_prefetch = 0
+
+    def consume(self, prefetch: bool = False):
+        self._roll()
+        self.used += 1
+        if prefetch:
+            self.used_by_prefetch += 1
+
+    def remaining(self) -> int:
+        self._roll()
+        return max(0, self.daily_limit - self.used)
+
+    def allows_prefetch(self) -> bool:
+        return self.remaining() > self.reserve
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "daily_limit": self.daily_limit,
+            "used": self.used,
+            "used_by_prefetch": self.used_by_prefetch,
+            "remaining": self.remaining()
+        }
+
+
+def normalize_location(location: str) -> str:
+    """Forma canonica della località: "  Forlì " e "forli" sono la stessa chiave"""
+    folded = unicodedata.normalize("NFKD", location or "")
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return " ".join(folded.replace(",", " ").split()).casefold()
+
+
+class WeatherCache:
+    """
+    Dati meteo per (località, unità, lingua) con scadenza TTL.
+    Le richieste concorrenti per la stessa chiave condividono una sola
+    chiamata upstream; se l'upstream fallisce si serve il dato scaduto
+    (entro stale_ttl) invece dell'errore
+    """
+
+    def __init__(self, ttl: float = WEATHER_CACHE_TTL, stale_ttl: float = WEATHER_STALE_TTL,
+                 max_entries: int = WEATHER_CACHE_MAX):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        # chiave -> (dati o None se città inesistente, timestamp fetch)
+        self._entries: "OrderedDict[CacheKey, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "stale_served": 0,
+            "upstream_calls": 0,
+            "prefetched": 0,
+            "errors": 0
+        }
+
+    @staticmethod
+    def make_key(location: str, units: str = "metric", lang: str = "it") -> CacheKey:
+        return normalize_location(location), units, lang
+
+    def _lookup(self, key: CacheKey, max_age: float):
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > max_age:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def peek(self, location: str, units: str = "metric", lang: str = "it") -> Optional[Dict[str, Any]]:
+        """Dato fresco in cache, senza chiamate upstream né conteggi"""
+        entry = self._lookup(self.make_key(location, units, lang), self.ttl)
+        return entry[0] if entry else None
+
+    def expires_in(self, location: str, units: str = "metric", lang: str = "it") -> Optional[float]:
+        """Secondi alla scadenza del dato (negativo se scaduto, None se assente)"""
+        entry = self._entries.get(self.make_key(location, units, lang))
+        if entry is None:
+            return None
+        return self.ttl - (time.monotonic() - entry[1])
+
+    def _store(self, key: CacheKey, data: Optional[Dict[str, Any]]):
+        self._entries[key] = (data, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _fetch(self, key: CacheKey, fetch: Callable[[], Awaitable[Optional[Dict[str, Any]]]]):
+        self.counters["upstream_calls"] += 1
+        try:
+            data = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+        self._store(key, data)
+        return data
+
+    def busy(self) -> bool:
+        """True se ci sono chiamate upstream in corso"""
+        return bool(self._inflight)
+
+    async def get_or_fetch(self, location: str, fetch: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+                           units: str = "metric", lang: str = "it",
+                           prefetch: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Dati meteo dalla cache o da fetch() (None = località inesistente)
+
+        Args:
+            prefetch: rinnova il dato anche se ancora fresco (refresh in background,
+                escluso dai contatori di hit rate)
+
+        Raises:
+            Exception: l'errore di fetch(), solo se non c'è un dato scaduto da servire
+        """
+        key = self.make_key(location, units, lang)
+        if not prefetch:
+            entry = self._lookup(key, self.ttl)
+            if entry is not None:
+                self.counters["hits"] += 1
+                return entry[0]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.counters["prefetched" if prefetch else "misses"] += 1
+            task = asyncio.create_task(self._fetch(key, fetch))
+            # l'errore viene già gestito dai chiamanti (evita il warning se rinunciano tutti)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        elif not prefetch:
+            self.counters["coalesced"] += 1
+
+        try:
+            # shield: se un chiamante rinuncia, gli altri aspettano ancora la stessa chiamata
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.counters["errors"] += 1
+            stale = self._lookup(key, self.stale_ttl)
+            if stale is None:
+                raise
+            self.counters["stale_served"] += 1
+            logger.warning(f"[WEATHER_CACHE] Upstream KO per '{location}', servo dato scaduto ({e})")
+            return stale[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Contatori e hit rate (hit + richieste accodate a una chiamata in corso)"""
+        requests = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+        served = self.counters["hits"] + self.counters["coalesced"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_rate": round(served / requests, 3) if requests else 0.0
+        }
+
+
+# Cache e quota condivise da tutti i percorsi meteo del processo
+weather_cache = WeatherCache()
+weather_quota = WeatherQuota()
+
+
+def coords_location(lat: float, lon: float) -> str:
+    """Chiave di località per coordinate (~1 km: fix GPS vicini condividono il dato)"""
+    return f"@{lat:.2f},{lon:.2f}"
+
+
+async def _fetch_openweather(query: Dict[str, Any], api_key: str, units: str, lang: str,
+                             prefetch: bool = False) -> Optional[Dict[str, Any]]:
+    client = http_clients.get(OPENWEATHER_URL)
+    params = {
+        **query,
+        "appid": api_key,
+        "units": units,
+        "lang": lang
+    }
+    weather_quota.consume(prefetch)
+    response = await client.get(OPENWEATHER_URL, params=params, timeout=5.0)
+    if response.status_code == 200:
+        return response.json()
+    if response.status_code == 404:
+        return None
+    raise WeatherUpstreamError(response.status_code, response.text[:200])
+
+
+async def fetch_current_weather(location: str, api_key: str, units: str = "metric",
+                                lang: str = "it", prefetch: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Risposta JSON di OpenWeatherMap "current weather", passando dalla cache
+
+    Returns:
+        Il JSON della risposta, None se la località non esiste
+
+    Raises:
+        WeatherUpstreamError, httpx.HTTPError: upstream non raggiungibile e nessun dato scaduto
+    """
+    return await weather_cache.get_or_fetch(
+        location,
+        lambda: _fetch_openweather({"q": location}, api_key, units, lang, prefetch),
+        units=units,
+        lang=lang,
+        prefetch=prefetch
+    )
+
+
+async def fetch_weather_at(lat: float, lon: float, api_key: str, units: str = "metric",
+                           lang: str = "it", prefetch: bool = False) -> Optional[Dict[str, Any]]:
+    """Come fetch_current_weather, per coordinate (es. ultimo fix GPS del device)"""
+    return await weather_cache.get_or_fetch(
+        coords_location(lat, lon),
+        lambda: _fetch_openweather({"lat": lat, "lon": lon}, api_key, units, lang, prefetch),
+        units=units,
+        lang=lang,
+        prefetch=prefetch
+    )
@@ -42,3 +42,62 @@ def get_weather_function_definitions():
             }
         }
     ]
+
+
+# ============== TOOL ==============
+
+DETAIL_FIELDS = {
+    "humidity": ["humidity"],
+    "uv": [],  # non presente nel meteo corrente di OpenWeather
+    "wind": ["wind_speed", "wind_deg"],
+    "visibility": ["visibility"],
+    "pressure": ["pressure"]
+}
+
+
+def register_tools(registry):
+    """Registra i tool meteo nel registro condiviso (core.tool_registry)"""
+    from .weather_api import WeatherAPI
+    from services.geolocation.gazetteer import gazetteer
+    
+    clients = {}
+    
+    def weather_client(context) -> WeatherAPI:
+        # Chiave configurata dal chiamante (context["weather_api_key"]): stesso account e
+        # stessa quota del resto dell'app; la chiave di default solo se manca
+        api_key = (context or {}).get("weather_api_key")
+        if api_key not in clients:
+            clients[api_key] = WeatherAPI(api_key) if api_key else WeatherAPI()
+        return clients[api_key]
+    
+    async def lookup_weather(city: str, context):
+        # Stessa chiave (coordinate del gazetteer) scaldata dalla speculazione e da handle_weather
+        weather = weather_client(context)
+        place = gazetteer.lookup(city)
+        if place:
+            return await weather.get_weather_at(place.lat, place.lon, label=place.name)
+        return await weather.get_weather(city)
+    
+    async def get_current_weather(context, city: str):
+        result = await lookup_weather(city, context)
+        if result["status"] != "success":
+            return {"error": result["response"]}
+        data = result["data"]
+        return {k: data[k] for k in ("city", "country", "temperature", "feels_like", "humidity", "details")}
+    
+    async def get_weather_details(context, city: str, detail_type: str = "all"):
+        result = await lookup_weather(city, context)
+        if result["status"] != "success":
+            return {"error": result["response"]}
+        data = result["data"]
+        if detail_type not in DETAIL_FIELDS:
+            return data
+        fields = DETAIL_FIELDS[detail_type]
+        if not fields:
+            return {"city": data["city"], "error": f"Dettaglio non disponibile: {detail_type}"}
+        return {"city": data["city"], **{k: data[k] for k in fields}}
+    
+    registry.register_definitions(get_weather_function_definitions(), {
+        "get_current_weather": get_current_weather,
+        "get_weather_details": get_weather_details
+    })
@@ -0,0 +1,163 @@
+"""services/weather/weather_prefetch.py - Refresh in background del meteo per le località "calde" dei device"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .weather_cache import (
+    weather_cache, weather_quota, fetch_current_weather, fetch_weather_at, coords_location
+)
+
+logger = logging.getLogger("JARVIS.WeatherPrefetch")
+
+WEATHER_PREFETCH_ENABLED = os.environ.get("WEATHER_PREFETCH_ENABLED", "true").lower() == "true"
+# Città preferite per tutti i device, separate da virgola
+WEATHER_FAVORITES = [c.strip() for c in os.environ.get("WEATHER_FAVORITES", "Milano").split(",") if c.strip()]
+# Rinnova quando mancano meno di LEAD secondi alla scadenza
+WEATHER_PREFETCH_LEAD = float(os.environ.get("WEATHER_PREFETCH_LEAD", "120"))
+WEATHER_PREFETCH_INTERVAL = float(os.environ.get("WEATHER_PREFETCH_INTERVAL", "30"))
+WEATHER_PREFETCH_JITTER = float(os.environ.get("WEATHER_PREFETCH_JITTER", "0.5"))
+# Un fix GPS più vecchio di così non viene più rinnovato
+WEATHER_POSITION_MAX_AGE = float(os.environ.get("WEATHER_POSITION_MAX_AGE", str(6 * 3600)))
+
+# ("city", nome) oppure ("coords", "lat,lon")
+HotLocation = Tuple[str, str]
+
+
+class WeatherPrefetcher:
+    """
+    Tiene calde in cache le località di ogni device (preferite + ultimo fix GPS),
+    rinnovandole prima della scadenza con jitter. Cede sempre il passo alle
+    richieste interattive: niente refresh mentre c'è una chiamata upstream in
+    corso, e stop quando la quota giornaliera scende alla riserva interattiva
+    """
+
+    def __init__(self, api_key: str, favorites: Iterable[str] = WEATHER_FAVORITES,
+                 lead: float = WEATHER_PREFETCH_LEAD, interval: float = WEATHER_PREFETCH_INTERVAL,
+                 jitter: float = WEATHER_PREFETCH_JITTER):
+        self.api_key = api_key
+        self.favorites: List[str] = list(favorites)
+        self.lead = lead
+        self.interval = interval
+        self.jitter = jitter
+
+        self._device_favorites: Dict[str, List[str]] = {}
+        self._positions: Dict[str, Tuple[float, float, float]] = {}  # device -> (lat, lon, ts)
+        self._task: Optional[asyncio.Task] = None
+
+        self.counters = {
+            "refreshed": 0,
+            "failed": 0,
+            "skipped_busy": 0,
+            "skipped_quota": 0
+        }
+
+    # ============== LOCALITÀ ==============
+
+    def set_favorites(self, device_id: str, cities: Iterable[str]):
+        """Città preferite di un device (oltre a quelle globali)"""
+        self._device_favorites[device_id] = [c.strip() for c in cities if c and c.strip()]
+
+    def report_position(self, device_id: str, lat: float, lon: float):
+        """Ultimo fix GPS inviato dal device"""
+        self._positions[device_id] = (float(lat), float(lon), time.monotonic())
+
+    def position(self, device_id: str) -> Optional[Tuple[float, float]]:
+        """Ultimo fix GPS ancora valido del device"""
+        entry = self._positions.get(device_id)
+        if entry is None or time.monotonic() - entry[2] > WEATHER_POSITION_MAX_AGE:
+            return None
+        return entry[0], entry[1]
+
+    def hot_locations(self) -> Set[HotLocation]:
+        hot: Set[HotLocation] = {("city", c) for c in self.favorites}
+        for cities in self._device_favorites.values():
+            hot.update(("city", c) for c in cities)
+        for device_id in list(self._positions):
+            pos = self.position(device_id)
+            if pos is None:
+                del self._positions[device_id]
+                continue
+            hot.add(("coords", f"{pos[0]},{pos[1]}"))
+        return hot
+
+    # ============== REFRESH ==============
+
+    def _expires_in(self, location: HotLocation) -> Optional[float]:
+        kind, value = location
+        if kind == "coords":
+            lat, lon = map(float, value.split(","))
+            return weather_cache.expires_in(coords_location(lat, lon))
+        return weather_cache.expires_in(value)
+
+    def _due(self, location: HotLocation) -> bool:
+        expires = self._expires_in(location)
+        if expires is None:
+            return True
+        # Jitter sulla soglia: i refresh non scadono tutti nello stesso giro
+        return expires <= self.lead * (1 + random.uniform(0, self.jitter))
+
+    async def _refresh(self, location: HotLocation):
+        kind, value = location
+        try:
+            if kind == "coords":
+                lat, lon = map(float, value.split(","))
+                await fetch_weather_at(lat, lon, self.api_key, prefetch=True)
+            else:
+                await fetch_current_weather(value, self.api_key, prefetch=True)
+            self.counters["refreshed"] += 1
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.debug(f"[WEATHER_PREFETCH] Refresh {value} fallito: {e}")
+
+    async def run_once(self):
+        """Un giro di refresh: una località alla volta, solo se c'è margine"""
+        for location in self.hot_locations():
+            if not self._due(location):
+                continue
+            if not weather_quota.allows_prefetch():
+                self.counters["skipped_quota"] += 1
+                return
+            if weather_cache.busy():
+                # Una richiesta interattiva è in volo: riprova al prossimo giro
+                self.counters["skipped_busy"] += 1
+                return
+            await self._refresh(location)
+
+    async def _loop(self):
+        # Primo giro sfasato, così più processi non partono insieme
+        await asyncio.sleep(random.uniform(0, self.interval * self.jitter))
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"[WEATHER_PREFETCH] Errore: {e}")
+            await asyncio.sleep(self.interval * (1 + random.uniform(-self.jitter, self.jitter) / 2))
+
+    def start(self):
+        """Avvia il refresh in background (dentro l'event loop dell'app)"""
+        if not WEATHER_PREFETCH_ENABLED or not self.api_key:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"[WEATHER_PREFETCH] Attivo ({len(self.hot_locations())} località)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "hot_locations": len(self.hot_locations()),
+            "devices_with_position": len(self._positions),
+            "quota": weather_quota.stats()
+        }
@@ -0,0 +1,47 @@
+"""
+test_audio_preprocess.py - JARVIS Preprocessing audio (taglio del silenzio)
+Esegui: python tests/test_audio_preprocess.py
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.audio_preprocess import TARGET_RATE, prepare
+
+
+def voiced(seconds: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * TARGET_RATE)) / TARGET_RATE
+    phase = 2 * np.pi * 150 * t
+    return (amplitude * sum(np.sin(k * phase) / k for k in range(1, 8))).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (0.001 * rng.standard_normal(int(seconds * TARGET_RATE))).astype(np.float32)
+
+
+def test_speech_only_clip_is_kept():
+    # PTT rilasciato subito dopo aver parlato: nessun silenzio attorno
+    clip = prepare(voiced(1.0), TARGET_RATE)
+    assert clip is not None
+    assert clip.duration_ms >= 960
+
+
+def test_padded_clip_is_trimmed():
+    clip = prepare(np.concatenate([silence(0.5), voiced(1.0), silence(0.5)]), TARGET_RATE)
+    assert clip is not None
+    assert 1000 <= clip.duration_ms < 1500
+
+
+def test_silence_is_dropped():
+    assert prepare(silence(2.0), TARGET_RATE) is None
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✅ {name}")
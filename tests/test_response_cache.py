@@ -0,0 +1,54 @@
+"""
+test_response_cache.py - JARVIS Cache semantica delle risposte
+Esegui: python tests/test_response_cache.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.response_cache import SemanticResponseCache
+
+PARAPHRASES = [
+    ("Mi spieghi come funziona la fotosintesi clorofilliana?", "Spiegami come funziona la fotosintesi clorofilliana"),
+    ("Dimmi chi ha dipinto la Gioconda", "Chi ha dipinto la Gioconda?"),
+    ("Qual è la differenza tra un virus e un batterio?", "Che differenza c'è tra un virus e un batterio?"),
+    ("Raccontami una barzelletta sui carabinieri", "Raccontami una barzelletta sui carabinieri per favore"),
+]
+
+NEAR_MISSES = [
+    ("Quanto fa 2 più 2?", "Quanto fa 2 più 3?"),
+    ("Qual è la capitale della Francia?", "Qual è la capitale della Spagna?"),
+    ("Chi ha scritto i Promessi Sposi?", "Chi ha scritto la Divina Commedia?"),
+    ("quanti abitanti ha milano", "quanti abitanti ha torino"),
+    ("Come si cucina la carbonara?", "Come si cucina l'amatriciana?"),
+]
+
+
+def test_paraphrases_hit():
+    for stored, asked in PARAPHRASES:
+        cache = SemanticResponseCache(max_entries=16)
+        cache.put(stored, "risposta", 800)
+        assert cache.get(asked) == "risposta", asked
+        assert cache.counters["hits_semantic"] == 1
+
+
+def test_near_misses_do_not_hit():
+    for stored, asked in NEAR_MISSES:
+        cache = SemanticResponseCache(max_entries=16)
+        cache.put(stored, "risposta", 800)
+        assert cache.get(asked) is None, asked
+
+
+def test_scopes_are_separate():
+    cache = SemanticResponseCache(max_entries=16)
+    cache.put("Chi ha dipinto la Gioconda?", "Leonardo", 800, scope="main")
+    assert cache.get("Chi ha dipinto la Gioconda?", scope="main") == "Leonardo"
+    assert cache.get("Chi ha dipinto la Gioconda?", scope="jarvis_ai") is None
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✅ {name}")
@@ -0,0 +1,69 @@
+"""
+test_tts_cache.py - JARVIS Cache TTS (single-flight)
+Esegui: python tests/test_tts_cache.py
+"""
+import sys
+import asyncio
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.tts_cache import TTSCache
+
+
+def make_cache() -> TTSCache:
+    return TTSCache(disk_dir=Path(tempfile.mkdtemp()))
+
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    async def run():
+        cache = make_cache()
+        calls = []
+
+        async def synthesize():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return b"audio"
+
+        owner = asyncio.create_task(cache.get_or_create("k", synthesize))
+        await asyncio.sleep(0.01)
+        w1 = asyncio.create_task(cache.get_or_create("k", synthesize))
+        w2 = asyncio.create_task(cache.get_or_create("k", synthesize))
+        await asyncio.sleep(0.01)
+        w1.cancel()
+        results = await asyncio.gather(owner, w1, w2, return_exceptions=True)
+        assert results[0] == b"audio"
+        assert isinstance(results[1], asyncio.CancelledError)
+        assert results[2] == b"audio"
+        assert len(calls) == 1
+    asyncio.run(run())
+
+
+def test_cancelled_owner_lets_waiters_retry():
+    async def run():
+        cache = make_cache()
+
+        async def slow():
+            await asyncio.sleep(1)
+            return b"slow"
+
+        async def fast():
+            await asyncio.sleep(0.02)
+            return b"fast"
+
+        owner = asyncio.create_task(cache.get_or_create("k", slow))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_create("k", fast))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        assert await waiter == b"fast"
+        assert owner.cancelled()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✅ {name}")
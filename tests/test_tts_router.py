@@ -0,0 +1,49 @@
+"""
+test_tts_router.py - JARVIS Router TTS (hedging e ordinamento)
+Esegui: python tests/test_tts_router.py
+"""
+import sys
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.tts_router import TTSProvider, TTSRouter
+
+
+def make_provider(name: str, delay: float, audio=b"audio") -> TTSProvider:
+    async def synthesize(text, **options):
+        await asyncio.sleep(delay)
+        return audio
+    return TTSProvider(name, synthesize)
+
+
+def test_cancelled_hedge_loser_is_not_a_sample():
+    async def run():
+        slow = make_provider("slow", 0.5)
+        fast = make_provider("fast", 0.01)
+        router = TTSRouter([slow, fast], default_deadline=0.05)
+        assert await router.synthesize("ciao") == b"audio"
+        await asyncio.sleep(0)
+        assert len(slow.histogram) == 0
+        assert slow.cancelled == 1
+        assert len(fast.histogram) == 1
+    asyncio.run(run())
+
+
+def test_always_failing_provider_is_ranked_last():
+    broken = make_provider("broken", 0, audio=None)
+    fresh = make_provider("fresh", 0)
+    fast = make_provider("fast", 0)
+    router = TTSRouter([broken, fresh, fast], min_samples=2)
+    for _ in range(2):
+        broken.histogram.record(0.01, False)
+        fast.histogram.record(0.2, True)
+    assert [p.name for p in router.ordered()] == ["fast", "fresh", "broken"]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"✅ {name}")
@@ -0,0 +1,18 @@
+"""utils/helpers.py - Funzioni di supporto condivise"""
+
+import json
+from typing import Any, Dict
+
+
+def sse_event(event: str, payload: Dict[str, Any]) -> str:
+    """Formatta un evento Server-Sent Events (text/event-stream)"""
+    data = json.dumps(payload, ensure_ascii=False)
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def audio_header_line(payload: Dict[str, Any]) -> bytes:
+    """
+    Header JSON su una riga che precede i byte audio grezzi
+    nei body binari (client: leggi fino al primo '\\n', il resto è audio)
+    """
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"